@@ -0,0 +1,218 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.utils.function_calling import convert_to_openai_function
+from langchain.agents import create_openai_functions_agent
+from langchain.tools import Tool
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+from services.cassette import CASSETTE_DIR, RecordingChatModel
+from services.compression import compress_for_question, estimate_tokens
+from services.prompt_cache import (
+    CONTEXT_CACHE,
+    PrefixCachedChatModel,
+    with_context_cache,
+)
+from services.rate_limit import BackoffCallbackHandler, BucketRateLimiter, get_bucket
+from services.sufficiency import (
+    RESEARCH_TIME_BUDGET,
+    SufficiencyAgent,
+    SufficiencyExecutor,
+)
+from tools import research_tool, search_tool, wiki_tool, save_tool
+
+# Static prefix of every agent request: kept apart from the question so
+# the model can reuse it across steps and runs
+RESEARCH_SYSTEM_PROMPT = """You are a helpful research assistant. Use the available tools to gather information and answer questions thoroughly.
+
+Available tools:
+- combined_research: Search the web and Wikipedia at the same time
+- web_search: Search the web for current information
+- wikipedia: Search Wikipedia for encyclopedic information
+- save_text_to_file: Save your research to a file
+
+When you have gathered sufficient information, provide a comprehensive answer with proper formatting."""
+
+
+def compressed_tool(tool):
+    """Wrap a search tool so its observations are compressed before reaching the scratchpad"""
+    run = getattr(tool, "func", None) or tool.api_wrapper.run
+    return Tool(
+        name=tool.name,
+        description=tool.description,
+        func=lambda query: compress_for_question(run(query), query),
+    )
+
+
+def build_llm(api_key, model_name="gemini-2.5-flash", temperature=0.7):
+    gemini_bucket = get_bucket("gemini")
+    # The subclass only differs once an executor attaches a context cache
+    chat_model = PrefixCachedChatModel if CONTEXT_CACHE else ChatGoogleGenerativeAI
+    llm = chat_model(
+        model=model_name,
+        temperature=temperature,
+        google_api_key=api_key,
+        # Retries are handled below so every attempt goes through the shared bucket
+        max_retries=1,
+        rate_limiter=BucketRateLimiter(gemini_bucket),
+        callbacks=[BackoffCallbackHandler(gemini_bucket)],
+    )
+    # Calls are only written down while a run is being recorded
+    return RecordingChatModel(inner=llm) if CASSETTE_DIR else llm
+
+
+def build_agent_executor(
+    api_key,
+    model_name="gemini-2.5-flash",
+    temperature=0.7,
+    max_iterations=10,
+    verbose=True,
+    llm=None,
+    compress=True,
+):
+    """Build the research AgentExecutor shared by the Streamlit apps and batch runner"""
+    if llm is None:
+        llm = build_llm(api_key, model_name, temperature)
+
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", RESEARCH_SYSTEM_PROMPT),
+            ("human", "Question: {input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ]
+    )
+
+    tools = [research_tool, search_tool, wiki_tool]
+    if compress:
+        tools = [compressed_tool(tool) for tool in tools]
+    tools.append(save_tool)
+
+    functions = [convert_to_openai_function(tool) for tool in tools]
+    # Forced final answers are plain prompts without the agent's cached prefix
+    answer_llm = llm
+    if CONTEXT_CACHE:
+        llm = with_context_cache(llm, api_key, RESEARCH_SYSTEM_PROMPT, functions)
+
+    agent = create_openai_functions_agent(
+        llm=llm, tools=tools, prompt=prompt
+    ).with_retry(
+        # A rate-limited step is retried in place instead of failing the run;
+        # the bucket's pause supplies the jittered exponential backoff
+        retry_if_exception_type=(ResourceExhausted, ServiceUnavailable),
+        wait_exponential_jitter=False,
+        stop_after_attempt=4,
+    )
+
+    return SufficiencyExecutor(
+        # Retries only wrap invoke, so plan each step with invoke; tokens still
+        # reach astream_events through the chat model's streaming callbacks
+        agent=SufficiencyAgent(
+            runnable=agent,
+            stream_runnable=False,
+            answer_llm=answer_llm,
+            prompt_tokens=estimate_tokens(
+                RESEARCH_SYSTEM_PROMPT + json.dumps(functions)
+            ),
+        ),
+        tools=tools,
+        verbose=verbose,
+        handle_parsing_errors=True,
+        max_iterations=max_iterations,
+        max_execution_time=RESEARCH_TIME_BUDGET,
+        return_intermediate_steps=True,
+    )
+
+
+class AgentPool:
+    """Process-wide pool of LLM clients and agent executors.
+
+    Executors are keyed by (api key, model, temperature, max_iterations) and
+    share one LLM client, and with it one open connection, per (api key,
+    model, temperature). Both maps are bounded and evict the least recently
+    used entry. Builds run on a background thread, so warm() can start one
+    ahead of the first research request without blocking the page.
+    """
+
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self._llms = OrderedDict()
+        self._executors = OrderedDict()
+        self._lock = threading.Lock()
+        self._builder = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="agent-warmup"
+        )
+
+    @staticmethod
+    def _key(api_key, *settings):
+        # Never keep raw API keys around as dictionary keys
+        return (hashlib.sha256(api_key.encode()).hexdigest()[:16], *settings)
+
+    def _put(self, pool, key, value):
+        pool[key] = value
+        pool.move_to_end(key)
+        while len(pool) > self.max_size:
+            pool.popitem(last=False)
+
+    def get_llm(self, api_key, model_name, temperature):
+        key = self._key(api_key, model_name, float(temperature))
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is not None:
+                self._llms.move_to_end(key)
+                return llm
+        llm = build_llm(api_key, model_name, temperature)
+        with self._lock:
+            # Another thread may have built the same client meanwhile
+            llm = self._llms.get(key, llm)
+            self._put(self._llms, key, llm)
+        return llm
+
+    def _build(self, api_key, model_name, temperature, max_iterations):
+        llm = self.get_llm(api_key, model_name, temperature)
+        return build_agent_executor(
+            api_key, model_name, temperature, max_iterations, llm=llm
+        )
+
+    def warm(self, api_key, model_name, temperature, max_iterations):
+        """Start building an executor in the background and return its future"""
+        key = self._key(api_key, model_name, float(temperature), int(max_iterations))
+        with self._lock:
+            future = self._executors.get(key)
+            if future is not None:
+                self._executors.move_to_end(key)
+                return future
+            future = self._builder.submit(
+                self._build, api_key, model_name, temperature, max_iterations
+            )
+            self._put(self._executors, key, future)
+        return future
+
+    def get(self, api_key, model_name, temperature, max_iterations):
+        """Return a pooled executor, building it if needed"""
+        future = self.warm(api_key, model_name, temperature, max_iterations)
+        try:
+            return future.result()
+        except Exception:
+            # Drop failed builds so the next request retries
+            key = self._key(
+                api_key, model_name, float(temperature), int(max_iterations)
+            )
+            with self._lock:
+                if self._executors.get(key) is future:
+                    del self._executors[key]
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "llm_clients": len(self._llms),
+                "executors": len(self._executors),
+                "max_size": self.max_size,
+            }
+
+
+agent_pool = AgentPool()
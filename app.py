@@ -1,13 +1,17 @@
 import streamlit as st
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.agents import create_openai_functions_agent, AgentExecutor
-from tools import search_tool, wiki_tool, save_tool
+from services.history import history_store
+from services.warmup import warm_agent
 from dotenv import load_dotenv
 import os
+import sys
 from datetime import datetime
+from functools import partial
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from components.footer import footer
 from components.header import header
+from components.history import history, history_owner
+from components.waterfall import waterfall
+from services.exports import render_entry
 from styles.styles import load_css
 
 load_dotenv()
@@ -23,13 +27,14 @@ st.set_page_config(
 load_css()
 
 
-if "history" not in st.session_state:
-    st.session_state.history = []
 if "agent_executor" not in st.session_state:
     st.session_state.agent_executor = None
 
+session_id = get_script_run_ctx().session_id
+# History belongs to the signed-in user, or to a token kept in the page URL
+session_history = history_store.for_owner(history_owner())
+
 
-@st.cache_resource
 def initialize_agent(
     api_key, model_name="gemini-2.5-flash", temperature=0.7, max_iterations=10
 ):
@@ -37,45 +42,9 @@ def initialize_agent(
         return None
 
     try:
-        llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            temperature=temperature,
-            google_api_key=api_key,
-        )
-
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    """You are a helpful research assistant. Use the available tools to gather information and answer questions thoroughly.
-
-Available tools:
-- web_search: Search the web for current information
-- wikipedia: Search Wikipedia for encyclopedic information
-- save_text_to_file: Save your research to a file
-
-Question: {input}
+        from agent import agent_pool
 
-When you have gathered sufficient information, provide a comprehensive answer with proper formatting.""",
-                ),
-                MessagesPlaceholder(variable_name="agent_scratchpad"),
-            ]
-        )
-
-        tools = [search_tool, wiki_tool, save_tool]
-
-        agent = create_openai_functions_agent(llm=llm, tools=tools, prompt=prompt)
-
-        agent_executor = AgentExecutor(
-            agent=agent,
-            tools=tools,
-            verbose=True,
-            handle_parsing_errors=True,
-            max_iterations=max_iterations,
-            return_intermediate_steps=True,
-        )
-
-        return agent_executor
+        return agent_pool.get(api_key, model_name, temperature, max_iterations)
     except Exception as e:
         st.error(f"Error initializing agent: {e}")
         return None
@@ -86,7 +55,10 @@ header()
 
 api_key = os.getenv("GOOGLE_API_KEY", "")
 
-if not api_key:
+# With a job service configured the page only submits and displays research
+service_url = os.getenv("RESEARCH_SERVICE_URL", "")
+
+if not api_key and not service_url:
     st.warning("⚠️ Google API Key not found in environment variables.")
     api_key = st.text_input(
         "Please enter your Google API Key:",
@@ -99,11 +71,9 @@ if not api_key:
 
 
 
-if st.session_state.agent_executor is None:
-    with st.spinner("Initializing AI Agent..."):
-        st.session_state.agent_executor = initialize_agent(
-            api_key, model_name="gemini-2.5-flash", temperature=0.7, max_iterations=10
-        )
+# Load and build the agent in the background while the user types their question
+if not service_url:
+    warm_agent(api_key, "gemini-2.5-flash", 0.7, 10)
 
 
 query = st.text_area(
@@ -113,6 +83,11 @@ query = st.text_area(
     key="query_input",
 )
 
+deep_mode = st.checkbox(
+    "🧭 Deep research",
+    help="Split broad questions into sub-questions researched in parallel",
+)
+
 
 col = st.columns([1])[0]
 with col:
@@ -122,56 +97,192 @@ with col:
 
 
 if research_button and query:
-    if st.session_state.agent_executor is None:
+    # Heavy modules load on the first research request, not on page load
+    from services.metrics import track_run
+    from services.rate_limit import is_rate_limit_error
+    from services.spill import session_memory, spill_store
+
+    if service_url:
+        # Thin client: the service's workers cache, coalesce and run the agent
+        from services.job_client import ResearchServiceClient
+    else:
+        from agent import agent_pool
+        from services.cache import normalize_query
+        from services.pipeline import research_pipeline
+        from services.semantic_cache import answer_cache
+        from services.singleflight import research_flight
+
+        with st.spinner("Initializing AI Agent..."):
+            st.session_state.agent_executor = initialize_agent(
+                api_key,
+                model_name="gemini-2.5-flash",
+                temperature=0.7,
+                max_iterations=10,
+            )
+
+    if not service_url and st.session_state.agent_executor is None:
         st.error("❌ Agent initialization failed. Please check your API key.")
     else:
         with st.spinner("🔍 Researching... This may take a moment..."):
             try:
-                result = st.session_state.agent_executor.invoke({"input": query})
+                st.markdown("### 📊 Research Results")
+                result_box = st.empty()
+                steps_box = st.expander("🔧 View Tool Calls & Process")
+                step_count = [0]
+
+                def show_text(text):
+                    result_box.markdown(
+                        f'<div class="research-box">{text}</div>',
+                        unsafe_allow_html=True,
+                    )
 
-                output_text = result.get("output", "No output generated")
+                def show_tool_start(name, tool_input):
+                    step_count[0] += 1
+                    steps_box.markdown(f"**Step {step_count[0]}: {name}**")
+                    steps_box.code(f"Input: {tool_input}", language="text")
+
+                def show_tool_end(name, observation):
+                    steps_box.text(f"Output: {str(observation)[:300]}...")
+                    steps_box.divider()
+
+                def keep(result):
+                    # Large observations go to disk; only previews stay in memory
+                    return spill_store.spill_result(
+                        {
+                            "input": query,
+                            "output": result.get("output", ""),
+                            "intermediate_steps": result.get(
+                                "intermediate_steps", []
+                            ),
+                        }
+                    )
 
-                st.success("✅ Research Complete!")
+                # Answers are only reused, or shared, between runs with these settings
+                settings = ("gemini-2.5-flash", 0.7, 10, deep_mode)
 
-                st.markdown("### 📊 Research Results")
+                with track_run(query) as run_metrics:
+                    cached = (
+                        None if service_url else answer_cache.lookup(query, settings)
+                    )
+                    if cached:
+                        result = cached["result"]
+                        for action, observation in result.get(
+                            "intermediate_steps", []
+                        ):
+                            show_tool_start(action.tool, action.tool_input)
+                            show_tool_end(action.tool, observation)
+                    elif service_url:
+                        client = ResearchServiceClient(
+                            service_url,
+                            tenant=os.getenv("RESEARCH_SERVICE_TENANT", "streamlit"),
+                        )
+                        result = keep(
+                            client.research(
+                                query,
+                                on_text=show_text,
+                                on_tool_start=show_tool_start,
+                                on_tool_end=show_tool_end,
+                                model_name="gemini-2.5-flash",
+                                temperature=0.7,
+                                max_iterations=10,
+                                deep=deep_mode,
+                            )
+                        )
+                    else:
+                        display = dict(
+                            on_text=show_text,
+                            on_tool_start=show_tool_start,
+                            on_tool_end=show_tool_end,
+                            config={"callbacks": [run_metrics.handler]},
+                        )
+
+                        # Shared with identical runs in other sessions, so it
+                        # only uses what is passed in; the display belongs to
+                        # whichever session leads
+                        def run_research(llm, agent_executor, display):
+                            result = keep(
+                                research_pipeline(
+                                    query,
+                                    llm,
+                                    agent_executor,
+                                    deep=deep_mode,
+                                    **display,
+                                )
+                            )
+                            if result["output"]:
+                                answer_cache.store(query, result, settings)
+                            return result
+
+                        # Identical questions already running elsewhere share that run
+                        run_key = (normalize_query(query), *settings)
+                        if research_flight.in_flight(run_key):
+                            st.info("⏳ Joining identical research already in progress...")
+                        result, shared = research_flight.do(
+                            run_key,
+                            run_research,
+                            agent_pool.get_llm(api_key, "gemini-2.5-flash", 0.7),
+                            st.session_state.agent_executor,
+                            display,
+                        )
+                        if shared:
+                            for action, observation in result.get(
+                                "intermediate_steps", []
+                            ):
+                                show_tool_start(action.tool, action.tool_input)
+                                show_tool_end(action.tool, observation)
 
-                st.markdown(
-                    f'<div class="research-box">{output_text}</div>',
-                    unsafe_allow_html=True,
-                )
+                output_text = result.get("output", "No output generated")
+                show_text(output_text)
+                if not step_count[0]:
+                    steps_box.caption("No tools were called for this query.")
+                with steps_box:
+                    waterfall(run_metrics)
+
+                if cached:
+                    st.success(
+                        f"⚡ Answered from a similar earlier question: "
+                        f"\"{cached['query']}\" ({cached['similarity']:.0%} match)"
+                    )
+                else:
+                    st.success("✅ Research Complete!")
+
+                session_history.add(query, output_text)
 
-                if result.get("intermediate_steps"):
-                    with st.expander("🔧 View Tool Calls & Process"):
-                        for i, step in enumerate(result["intermediate_steps"], 1):
-                            action, observation = step
-                            st.markdown(f"**Step {i}: {action.tool}**")
-                            st.code(f"Input: {action.tool_input}", language="text")
-                            st.text(f"Output: {str(observation)[:300]}...")
-                            st.divider()
-
-                st.session_state.history.append(
-                    {
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "query": query,
-                        "result": output_text,
-                    }
-                )
-                
                 if st.session_state.get("clear_query", False):
                     st.session_state["query_input"] = ""
                     st.session_state["clear_query"] = False
 
                
+                # The file is only built when the button is clicked
                 st.download_button(
                     label="💾 Download Results as TXT",
-                    data=output_text,
+                    data=partial(
+                        render_entry,
+                        {
+                            "query": query,
+                            "result": output_text,
+                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        },
+                    ),
                     file_name=f"research_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
                     mime="text/plain",
+                    on_click="ignore",
                     use_container_width=True,
                 )
 
+                # Kept so the result survives reruns such as a download click,
+                # and dropped once Streamlit discards the session
+                if "session_memory_handle" not in st.session_state:
+                    st.session_state.session_memory_handle = session_memory.handle(
+                        session_id
+                    )
+                session_memory.put(session_id, "last_result", result)
+                st.caption(
+                    f"Session memory: {session_memory.usage(session_id) / 1024:.1f} KB"
+                )
+
             except Exception as e:
-                if "429" in str(e):
+                if is_rate_limit_error(e):
                     st.warning(
                         "⚠️ Rate limit exceeded. Please wait a minute and try again."
                     )
@@ -181,9 +292,35 @@ if research_button and query:
                         import traceback
 
                         st.code(traceback.format_exc())
-                    
+else:
+    spill = sys.modules.get("services.spill")
+    last_result = spill and spill.session_memory.get(session_id, "last_result")
+    if last_result:
+        st.markdown("### 📊 Research Results")
+        st.markdown(
+            f'<div class="research-box">{last_result["output"]}</div>',
+            unsafe_allow_html=True,
+        )
+        with st.expander("🔧 View Tool Calls & Process"):
+            for i, (action, observation) in enumerate(
+                last_result["intermediate_steps"], 1
+            ):
+                st.markdown(f"**Step {i}: {action.tool}**")
+                st.code(f"Input: {action.tool_input}", language="text")
+                st.text(f"Output: {str(observation)[:300]}...")
+        st.download_button(
+            label="💾 Download Results as TXT",
+            data=partial(
+                render_entry,
+                {"query": last_result["input"], "result": last_result["output"]},
+            ),
+            file_name=f"research_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            mime="text/plain",
+            on_click="ignore",
+            use_container_width=True,
+        )
 
-if st.session_state.history:
+if session_history.count():
     st.divider()
 
 
@@ -192,27 +329,11 @@ if st.session_state.history:
         st.subheader("📜 Research History")
     with col2:
         if st.button("🗑️ Clear History", use_container_width=True):
-            st.session_state.history = []
+            session_history.clear()
             st.success("✅ History cleared!")
             st.rerun()
 
-    for i, item in enumerate(reversed(st.session_state.history), 1):
-        with st.container():
-            st.markdown('<div class="history-item">', unsafe_allow_html=True)
-            st.markdown(f"**🕐 {item['timestamp']}**")
-            st.markdown(f"**❓ Query:** {item['query']}")
-
-            with st.expander("View Full Result"):
-                st.markdown(item["result"])
-
-                st.download_button(
-                    label="💾 Download This Result",
-                    data=item["result"],
-                    file_name=f"research_{item['timestamp'].replace(':', '-').replace(' ', '_')}.txt",
-                    mime="text/plain",
-                    key=f"download_history_{i}",
-                )
-            st.markdown("</div>", unsafe_allow_html=True)
+    history(session_history)
 
 
 footer()
\ No newline at end of file
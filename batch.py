@@ -0,0 +1,244 @@
+"""Headless batch research runner.
+
+Reads queries from a JSONL file, runs each one through the research
+pipeline the pages use (routing, deep research, compression and cassette
+recording) and streams results to an output JSONL file. Re-running with the
+same output file skips queries that already completed successfully.
+
+    python batch.py queries.jsonl -o results.jsonl --workers 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from services.metrics import track_run
+from services.pipeline import research_pipeline
+
+
+def read_queries(path, id_field="id", query_field="query"):
+    """Yield (id, query, error) for each line of a JSONL file, skipping blank lines.
+
+    A line that cannot be read yields its error instead of a query, so it
+    gets an error record without stopping the run.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                yield f"line-{line_no}", "", f"Malformed input on line {line_no}: {e}"
+                continue
+            query = record.get(query_field) or record.get("input")
+            if not query:
+                print(
+                    f"Skipping line {line_no}: no '{query_field}' field",
+                    file=sys.stderr,
+                )
+                continue
+            yield str(record.get(id_field, f"line-{line_no}")), query, None
+
+
+def completed_ids(path):
+    """Return ids that already have a successful result in the output file"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run
+                continue
+            if not record.get("error"):
+                done.add(record["id"])
+    return done
+
+
+def serialize_steps(intermediate_steps):
+    return [
+        {
+            "tool": action.tool,
+            "tool_input": action.tool_input,
+            "observation": str(observation),
+        }
+        for action, observation in intermediate_steps
+    ]
+
+
+def end_with_newline(path):
+    """Terminate a last line left unfinished by an interrupted run, so the
+    next record appended starts on a line of its own"""
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        llm,
+        agent_executor,
+        output_path,
+        workers=4,
+        max_concurrency=None,
+        deep=False,
+    ):
+        self.llm = llm
+        self.agent_executor = agent_executor
+        self.deep = deep
+        self.output_path = output_path
+        self.workers = workers
+        # Caps in-flight agent runs no matter how many worker threads exist
+        self.concurrency = threading.BoundedSemaphore(max_concurrency or workers)
+        self._write_lock = threading.Lock()
+        self.succeeded = 0
+        self.failed = 0
+        end_with_newline(output_path)
+
+    def run_one(self, query_id, query, error=None):
+        started_at = datetime.now().isoformat(timespec="seconds")
+        start = time.perf_counter()
+        record = {"id": query_id, "query": query, "started_at": started_at}
+        run_metrics = None
+        try:
+            if error:
+                raise ValueError(error)
+            with self.concurrency, track_run(query, export=False) as run_metrics:
+                result = research_pipeline(
+                    query,
+                    self.llm,
+                    self.agent_executor,
+                    deep=self.deep,
+                    config={"callbacks": [run_metrics.handler]},
+                )
+            record["output"] = result.get("output", "")
+            record["intermediate_steps"] = serialize_steps(
+                result.get("intermediate_steps", [])
+            )
+            record["error"] = None
+        except Exception as e:
+            record["output"] = ""
+            record["intermediate_steps"] = []
+            record["error"] = str(e)
+        record["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        if run_metrics is not None:
+            record["metrics"] = run_metrics.to_dict()
+        self.write(record)
+        return record
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._write_lock:
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                f.write(line)
+            if record["error"]:
+                self.failed += 1
+            else:
+                self.succeeded += 1
+            status = "✗ " + record["error"][:80] if record["error"] else "✓"
+            print(
+                f"[{self.succeeded + self.failed}] {record['id']} "
+                f"{record['elapsed_seconds']:.1f}s {status}",
+                file=sys.stderr,
+            )
+
+    def run(self, queries):
+        # Bound the submission queue so huge input files are read lazily
+        pending = threading.BoundedSemaphore(self.workers * 2)
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for query_id, query, error in queries:
+                pending.acquire()
+                future = pool.submit(self.run_one, query_id, query, error)
+                future.add_done_callback(lambda _: pending.release())
+            pool.shutdown(wait=True)
+        except KeyboardInterrupt:
+            print("Interrupted, waiting for running queries...", file=sys.stderr)
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run research queries from a JSONL file"
+    )
+    parser.add_argument("input", help="JSONL file with one query per line")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=None,
+        help="Maximum agent runs in flight at once (defaults to --workers)",
+    )
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--query-field", default="query")
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--max-iterations", type=int, default=10)
+    parser.add_argument(
+        "--deep", action="store_true", help="Research each query in deep mode"
+    )
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY", "")
+    if not api_key:
+        parser.error("GOOGLE_API_KEY is not set")
+
+    from agent import build_agent_executor, build_llm
+
+    llm = build_llm(api_key, args.model, args.temperature)
+    agent_executor = build_agent_executor(
+        api_key,
+        model_name=args.model,
+        temperature=args.temperature,
+        max_iterations=args.max_iterations,
+        verbose=False,
+    )
+
+    done = completed_ids(args.output)
+    if done:
+        print(f"Resuming: {len(done)} queries already completed", file=sys.stderr)
+    queries = (
+        entry
+        for entry in read_queries(args.input, args.id_field, args.query_field)
+        if entry[0] not in done
+    )
+
+    runner = BatchRunner(
+        llm,
+        agent_executor,
+        args.output,
+        workers=args.workers,
+        max_concurrency=args.max_concurrency,
+        deep=args.deep,
+    )
+    try:
+        runner.run(queries)
+    except KeyboardInterrupt:
+        return 130
+    print(
+        f"Done: {runner.succeeded} succeeded, {runner.failed} failed", file=sys.stderr
+    )
+    return 1 if runner.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Deterministic local stand-ins for Gemini, DuckDuckGo and Wikipedia"""
+
+import hashlib
+import json
+import random
+import time
+from types import SimpleNamespace
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, FunctionMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+def _sleep(latency, jitter, seed):
+    if latency <= 0:
+        return
+    # Jitter is seeded by the request so runs are reproducible
+    spread = random.Random(seed).uniform(-jitter, jitter) if jitter else 0.0
+    time.sleep(max(0.0, latency * (1 + spread)))
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that follows a scripted sequence of tool calls.
+
+    script is a list of (tool_name, tool_input) pairs. Step n of a run is
+    decided by how many tool results are already in the prompt, so one
+    instance can serve many concurrent runs. Once the script is exhausted,
+    or when called without tools, the model returns a final answer.
+    """
+
+    script: list = [("web_search", "{query}"), ("wikipedia", "{query}")]
+    latency: float = 0.0
+    jitter: float = 0.0
+    answer_tokens: int = 50
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        # The question is the first human message; a system prompt may precede it
+        question = next(
+            (str(m.content) for m in messages if m.type == "human"),
+            str(messages[0].content),
+        )
+        step = sum(isinstance(m, FunctionMessage) for m in messages)
+        _sleep(self.latency, self.jitter, f"{question}|{step}")
+
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        # Without tool declarations (a plain prompt) the model can only answer
+        if step < len(self.script) and kwargs.get("functions"):
+            tool, tool_input = self.script[step]
+            message = AIMessage(
+                content="",
+                additional_kwargs={
+                    "function_call": {
+                        "name": tool,
+                        "arguments": json.dumps(
+                            {"__arg1": tool_input.format(query=_digest(question))}
+                        ),
+                    }
+                },
+                usage_metadata={
+                    "input_tokens": prompt_tokens,
+                    "output_tokens": 10,
+                    "total_tokens": prompt_tokens + 10,
+                },
+            )
+        else:
+            message = AIMessage(
+                content=" ".join(["answer"] * self.answer_tokens),
+                usage_metadata={
+                    "input_tokens": prompt_tokens,
+                    "output_tokens": self.answer_tokens,
+                    "total_tokens": prompt_tokens + self.answer_tokens,
+                },
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeDDGS:
+    """Drop-in for duckduckgo_search.DDGS returning generated results"""
+
+    def __init__(self, latency=0.0, jitter=0.0, results=5):
+        self.latency = latency
+        self.jitter = jitter
+        self.results = results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def text(self, query, max_results=5):
+        _sleep(self.latency, self.jitter, query)
+        key = _digest(query)
+        return [
+            {
+                "title": f"Result {i} for {key}",
+                "body": f"Generated snippet {i} about {query}. " * 5,
+                "href": f"https://example.com/{key}/{i}",
+            }
+            for i in range(1, min(max_results, self.results) + 1)
+        ]
+
+
+class _PageError(Exception):
+    pass
+
+
+class _DisambiguationError(Exception):
+    pass
+
+
+class FakeWikipediaClient:
+    """Stands in for the wikipedia module used by WikipediaAPIWrapper"""
+
+    exceptions = SimpleNamespace(
+        PageError=_PageError, DisambiguationError=_DisambiguationError
+    )
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+
+    def search(self, query, results=3):
+        _sleep(self.latency, self.jitter, f"search|{query}")
+        key = _digest(query)
+        return [f"Article {key} {i}" for i in range(1, results + 1)]
+
+    def page(self, title, auto_suggest=False):
+        _sleep(self.latency, self.jitter, f"page|{title}")
+        summary = f"{title} is a generated article used for benchmarking. " * 20
+        return SimpleNamespace(
+            title=title,
+            summary=summary,
+            content=summary,
+            url=f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}",
+        )
@@ -0,0 +1,80 @@
+"""Import-time profile of the app's startup and first-research paths.
+
+Runs each import set in a fresh interpreter with `python -X importtime`
+and reports its total cost and the slowest modules.
+
+    python -m benchmarks.imports
+    python -m benchmarks.imports agent services.router --top 20
+"""
+
+import argparse
+import subprocess
+import sys
+
+# What a page render imports, and what the first research request adds
+IMPORT_SETS = {
+    "page load": [
+        "streamlit",
+        "dotenv",
+        "services.history",
+        "services.warmup",
+        "components.footer",
+        "components.header",
+        "components.history",
+        "components.waterfall",
+        "styles.styles",
+    ],
+    "first research": [
+        "agent",
+        "services.metrics",
+        "services.rate_limit",
+        "services.router",
+        "services.semantic_cache",
+        "services.streaming",
+    ],
+}
+
+
+def profile(modules):
+    """Return [(module, self_us, cumulative_us)] for importing modules"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report(label, modules, top):
+    rows = profile(modules)
+    # Top-level entries are the ones not indented under another import
+    total = sum(cumulative for name, _, cumulative in rows if name in modules)
+    print(f"\n{label}: {total / 1e6:.2f}s ({len(rows)} modules)")
+    print(f"  {'cumulative ms':>14}{'self ms':>10}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: -r[2])[:top]:
+        print(f"  {cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", help="Profile these modules instead")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    sets = {"custom": args.modules} if args.modules else IMPORT_SETS
+    for label, modules in sets.items():
+        report(label, modules, args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
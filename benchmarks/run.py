@@ -0,0 +1,143 @@
+"""Offline benchmark of the research pipeline's orchestration overhead.
+
+Runs the real agent executor and tools against deterministic local fakes
+of Gemini, DuckDuckGo and Wikipedia, at several concurrency levels, and
+reports throughput, latency percentiles and peak memory.
+
+    python -m benchmarks.run --concurrency 1,4,16 --requests 100
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure the modules before they are imported: isolated cache, no throttling
+os.environ["TOOL_CACHE_PATH"] = os.path.join(
+    tempfile.mkdtemp(prefix="research-bench-"), "tool_cache.sqlite3"
+)
+for backend in ("GEMINI", "DDGS", "WIKIPEDIA"):
+    os.environ.setdefault(f"RATE_LIMIT_{backend}", "1000000,1000000")
+
+import tools  # noqa: E402
+from agent import build_agent_executor  # noqa: E402
+from benchmarks.fakes import FakeChatModel, FakeDDGS, FakeWikipediaClient  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def install_fakes(args):
+    tools.ddgs_factory = lambda: FakeDDGS(args.search_latency, args.jitter)
+    tools._ddgs_clients.__dict__.clear()
+    tools.api_wrapper.wiki_client = FakeWikipediaClient(args.wiki_latency, args.jitter)
+
+
+def make_scenarios(args):
+    script = [(tool, "{query}") for tool in args.script.split(",") if tool]
+    llm = FakeChatModel(script=script, latency=args.llm_latency, jitter=args.jitter)
+    executor = build_agent_executor(
+        "benchmark", max_iterations=len(script) + 2, verbose=False, llm=llm
+    )
+    return {
+        "agent": lambda query: executor.invoke({"input": query}),
+        "search": tools.safe_search,
+        "combined": tools.combined_research,
+    }
+
+
+def run_level(func, concurrency, requests, repeat_queries):
+    queries = [
+        f"benchmark query {i % repeat_queries if repeat_queries else i}"
+        for i in range(requests)
+    ]
+    tools.tool_cache.clear()
+
+    def timed(query):
+        start = time.perf_counter()
+        func(query)
+        return time.perf_counter() - start
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, queries))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "throughput": requests / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenarios",
+        default="agent,search,combined",
+        help="Comma-separated: agent, search, combined",
+    )
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.02)
+    parser.add_argument("--wiki-latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.0, help="e.g. 0.2 for ±20%%")
+    parser.add_argument(
+        "--script",
+        default="web_search,wikipedia",
+        help="Tool calls the fake LLM makes before answering",
+    )
+    parser.add_argument(
+        "--repeat-queries",
+        type=int,
+        default=0,
+        help="Cycle through this many distinct queries to exercise caches",
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON lines")
+    args = parser.parse_args(argv)
+
+    install_fakes(args)
+    scenarios = make_scenarios(args)
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    if not args.json:
+        print(
+            f"{'scenario':<10}{'conc':>6}{'reqs':>7}{'req/s':>10}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak MB':>10}"
+        )
+    for name in args.scenarios.split(","):
+        for level in levels:
+            stats = run_level(
+                scenarios[name], level, args.requests, args.repeat_queries
+            )
+            if args.json:
+                print(json.dumps({"scenario": name, **stats}))
+            else:
+                print(
+                    f"{name:<10}{level:>6}{stats['requests']:>7}"
+                    f"{stats['throughput']:>10.1f}{stats['p50'] * 1000:>10.1f}"
+                    f"{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}"
+                    f"{stats['peak_mb']:>10.2f}"
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import re
+import uuid
+from functools import partial
+
+import streamlit as st
+
+from services.exports import EXPORT_FORMATS, export_entry, export_history
+
+PAGE_SIZE = 10
+
+# Query parameter holding an anonymous visitor's history token
+OWNER_PARAM = "history"
+
+
+def history_owner() -> str:
+    """Stable owner id for this visitor's history.
+
+    A signed-in user (st.login) owns history by account. Anyone else gets
+    a random token kept in the page URL, so a reload, a bookmark or an app
+    restart finds the same history.
+    """
+    owner = st.session_state.get("history_owner")
+    if owner is None:
+        user = st.user
+        if user.get("is_logged_in") and user.get("email"):
+            owner = f"user:{user['email']}"
+        else:
+            token = st.query_params.get(OWNER_PARAM, "")
+            # Only tokens this function issued; never another owner's id
+            if not re.fullmatch(r"[0-9a-f]{32}", token):
+                token = uuid.uuid4().hex
+            owner = token
+        st.session_state.history_owner = owner
+    if not owner.startswith("user:") and st.query_params.get(OWNER_PARAM) != owner:
+        st.query_params[OWNER_PARAM] = owner
+    return owner
+
+
+def history(store, key="history"):
+    """Render one page of the persistent research history with search and paging"""
+    search = st.text_input(
+        "🔎 Search history", key=f"{key}_search", placeholder="Search past research"
+    )
+
+    page_key = f"{key}_page"
+    if st.session_state.get(f"{key}_last_search") != search:
+        st.session_state[f"{key}_last_search"] = search
+        st.session_state[page_key] = 0
+
+    total = store.count(search)
+    if not total:
+        st.caption("No research matches your search.")
+        return
+
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    page = min(st.session_state.get(page_key, 0), pages - 1)
+
+    for item in store.page(page, PAGE_SIZE, search):
+        with st.container():
+            st.markdown('<div class="history-item">', unsafe_allow_html=True)
+            st.markdown(f"**🕐 {item['timestamp']}**")
+            st.markdown(f"**❓ Query:** {item['query']}")
+
+            with st.expander("View Full Result"):
+                entry = store.get(item["id"])
+                st.markdown(entry["result"])
+
+                # Built only when clicked, so reruns don't carry the file
+                st.download_button(
+                    label="💾 Download This Result",
+                    data=partial(export_entry, store, item["id"], "txt"),
+                    file_name=f"research_{item['timestamp'].replace(':', '-').replace(' ', '_')}.txt",
+                    mime="text/plain",
+                    on_click="ignore",
+                    key=f"{key}_download_{item['id']}",
+                )
+            st.markdown("</div>", unsafe_allow_html=True)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("← Newer", disabled=page == 0, key=f"{key}_prev"):
+            st.session_state[page_key] = page - 1
+            st.rerun()
+    with col2:
+        st.caption(f"Page {page + 1} of {pages} · {total} entries")
+    with col3:
+        if st.button("Older →", disabled=page >= pages - 1, key=f"{key}_next"):
+            st.session_state[page_key] = page + 1
+            st.rerun()
+
+    # Bulk export of every entry matching the search, generated on click
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        export_format = st.selectbox(
+            "Export format",
+            list(EXPORT_FORMATS),
+            format_func=lambda fmt: (
+                "ZIP of Markdown files" if fmt == "zip" else fmt.upper()
+            ),
+            key=f"{key}_export_format",
+            label_visibility="collapsed",
+        )
+    with col2:
+        extension, mime = EXPORT_FORMATS[export_format]
+        st.download_button(
+            label=f"⬇️ Export {total} entries",
+            data=partial(export_history, store, export_format, search),
+            file_name=f"research_history.{extension}",
+            mime=mime,
+            on_click="ignore",
+            use_container_width=True,
+            key=f"{key}_export",
+        )
@@ -0,0 +1,81 @@
+import html
+
+import streamlit as st
+
+# Kept with the component so it renders on pages that don't load styles.css
+WATERFALL_CSS = """
+.waterfall-row {
+    display: flex;
+    align-items: center;
+    gap: 8px;
+    font-size: 12px;
+    margin: 2px 0;
+}
+
+.waterfall-label {
+    width: 160px;
+    overflow: hidden;
+    text-overflow: ellipsis;
+    white-space: nowrap;
+}
+
+.waterfall-track {
+    flex: 1;
+    background-color: #f0f2f6;
+    border-radius: 4px;
+    height: 12px;
+}
+
+.waterfall-bar {
+    height: 12px;
+    border-radius: 4px;
+}
+
+.waterfall-bar.llm {
+    background-color: #4CAF50;
+}
+
+.waterfall-bar.tool {
+    background-color: #2196F3;
+}
+
+.waterfall-time {
+    width: 60px;
+    text-align: right;
+}
+"""
+
+
+def waterfall(run):
+    """Render the timing waterfall of a run's LLM and tool calls"""
+    summary = run.to_dict()
+    total = summary["duration"] or 1e-9
+    counters = summary["counters"]
+
+    st.markdown(
+        f"**⏱️ Timing:** {summary['duration']:.2f}s total · "
+        f"{summary['llm_calls']} LLM calls · {summary['tool_calls']} tool calls · "
+        f"{summary['prompt_tokens']} prompt / {summary['completion_tokens']} completion tokens · "
+        f"{summary['prefix_bytes_saved'] / 1024:.1f} KB prompt prefix reused · "
+        f"{counters.get('cache_hits', 0)} cache hits · "
+        f"{counters.get('prefetch_hits', 0)}/{counters.get('prefetch_issued', 0)} prefetches used · "
+        f"{counters.get('retries', 0)} retries"
+    )
+
+    rows = []
+    for span in summary["spans"]:
+        left = span["start"] / total * 100
+        width = max(span["duration"] / total * 100, 0.5)
+        label = html.escape(f"{span['kind']}: {span['name']}")
+        rows.append(
+            f'<div class="waterfall-row">'
+            f'<span class="waterfall-label" title="{label}">{label}</span>'
+            f'<div class="waterfall-track"><div class="waterfall-bar {span["kind"]}" '
+            f'style="margin-left: {left:.2f}%; width: {width:.2f}%;"></div></div>'
+            f'<span class="waterfall-time">{span["duration"]:.2f}s</span>'
+            f"</div>"
+        )
+    if rows:
+        st.markdown(
+            f"<style>{WATERFALL_CSS}</style>" + "".join(rows), unsafe_allow_html=True
+        )
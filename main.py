@@ -1,11 +1,15 @@
 import streamlit as st
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.agents import create_openai_functions_agent, AgentExecutor
-from tools import search_tool, wiki_tool, save_tool
+from services.history import history_store
+from services.warmup import warm_agent
+from components.history import history, history_owner
+from components.waterfall import waterfall
+from services.exports import render_entry
 from dotenv import load_dotenv
 import os
+import sys
 from datetime import datetime
+from functools import partial
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # Load environment variables
 load_dotenv()
@@ -48,11 +52,13 @@ st.markdown(
 )
 
 # Initialize session state
-if "history" not in st.session_state:
-    st.session_state.history = []
 if "agent_executor" not in st.session_state:
     st.session_state.agent_executor = None
 
+session_id = get_script_run_ctx().session_id
+# History belongs to the signed-in user, or to a token kept in the page URL
+session_history = history_store.for_owner(history_owner())
+
 # Sidebar
 with st.sidebar:
     st.title("⚙️ Settings")
@@ -91,72 +97,96 @@ with st.sidebar:
         help="Maximum number of tool calls the agent can make",
     )
 
+    # Deep research mode
+    deep_mode = st.toggle(
+        "Deep Research",
+        help="Split broad questions into sub-questions researched in parallel",
+    )
+
     st.divider()
 
     # Tools info
     st.subheader("🛠️ Available Tools")
     st.markdown("""
+    - 🔀 **Combined Research**: Web and Wikipedia in parallel
     - 🌐 **Web Search**: Search current information
     - 📚 **Wikipedia**: Encyclopedia lookup
     - 💾 **Save to File**: Save research results
     """)
 
+    # Requests waiting on each backend's rate limiter, once it has been loaded
+    rate_limit = sys.modules.get("services.rate_limit")
+    depths = rate_limit.queue_depths() if rate_limit else {}
+    if depths:
+        st.caption(
+            "Queued requests: "
+            + " · ".join(f"{name} {depth}" for name, depth in depths.items())
+        )
+
+    # Memory held for this session's results, against the shared budget
+    spill = sys.modules.get("services.spill")
+    if spill:
+        memory = spill.session_memory.stats()
+        st.caption(
+            f"Session memory: {spill.session_memory.usage(session_id) / 1024:.1f} KB"
+            f" · all sessions {memory['bytes'] / 2**20:.1f}"
+            f" of {memory['budget'] / 2**20:.0f} MB"
+        )
+
     st.divider()
 
     # Clear history button
     if st.button("🗑️ Clear History"):
-        st.session_state.history = []
+        session_history.clear()
         st.rerun()
 
 
 # Initialize agent
-def initialize_agent(api_key, model_name, temperature):
+def initialize_agent(api_key, model_name, temperature, max_iterations):
     if not api_key:
         return None
 
     try:
-        llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            temperature=temperature,
-            google_api_key=api_key,
-        )
-
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "human",
-                    """You are a helpful research assistant. Use the available tools to gather information and answer questions thoroughly.
+        from agent import agent_pool
 
-Available tools:
-- web_search: Search the web for current information
-- wikipedia: Search Wikipedia for encyclopedic information
-- save_text_to_file: Save your research to a file
-
-Question: {input}
-
-When you have gathered sufficient information, provide a comprehensive answer.""",
-                ),
-                MessagesPlaceholder(variable_name="agent_scratchpad"),
-            ]
-        )
-
-        tools = [search_tool, wiki_tool, save_tool]
+        return agent_pool.get(api_key, model_name, temperature, max_iterations)
+    except Exception as e:
+        st.error(f"Error initializing agent: {e}")
+        return None
 
-        agent = create_openai_functions_agent(llm=llm, tools=tools, prompt=prompt)
 
-        agent_executor = AgentExecutor(
-            agent=agent,
-            tools=tools,
-            verbose=True,
-            handle_parsing_errors=True,
-            max_iterations=max_iterations,
-            return_intermediate_steps=True,
+def show_result(result, run_metrics=None):
+    """Render a research result with its tool calls and a download button"""
+    # Result container
+    with st.container():
+        st.markdown("### 📊 Research Results")
+        st.markdown(
+            f'<div class="research-box">{result.get("output", "No output generated")}</div>',
+            unsafe_allow_html=True,
         )
 
-        return agent_executor
-    except Exception as e:
-        st.error(f"Error initializing agent: {e}")
-        return None
+    # Show intermediate steps and the timing waterfall
+    with st.expander("🔧 View Tool Calls"):
+        for i, step in enumerate(result.get("intermediate_steps", []), 1):
+            action, observation = step
+            st.markdown(f"**Step {i}: {action.tool}**")
+            st.code(f"Input: {action.tool_input}")
+            st.text(f"Output: {str(observation)[:200]}...")
+            st.divider()
+        if run_metrics is not None:
+            waterfall(run_metrics)
+
+    # Download button; the file is only built when it is clicked
+    st.download_button(
+        label="💾 Download Results",
+        data=partial(
+            render_entry,
+            {"query": result.get("input", ""), "result": result.get("output", "")},
+        ),
+        file_name=f"research_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+        mime="text/plain",
+        on_click="ignore",
+    )
 
 
 # Main content
@@ -165,16 +195,18 @@ st.markdown(
     "Ask me anything and I'll research it for you using web search and Wikipedia!"
 )
 
+# With a job service configured the page only submits and displays research
+service_url = os.getenv("RESEARCH_SERVICE_URL", "")
+
 # Check if API key is provided
-if not api_key:
+if not api_key and not service_url:
     st.warning("⚠️ Please enter your Google API Key in the sidebar to get started.")
     st.info("Get your API key from: https://makersuite.google.com/app/apikey")
 else:
-    # Initialize agent if not already done
-    if st.session_state.agent_executor is None:
-        st.session_state.agent_executor = initialize_agent(
-            api_key, model_name, temperature
-        )
+    # Start building the pooled agent for the current settings in the
+    # background; a settings change reuses the pooled LLM client
+    if not service_url:
+        warm_agent(api_key, model_name, temperature, max_iterations)
 
     # Query input
     query = st.text_area(
@@ -196,7 +228,24 @@ else:
 
     # Research execution
     if research_button and query:
-        if st.session_state.agent_executor is None:
+        # Heavy modules load on the first research request, not on page load
+        from services.metrics import track_run
+        from services.spill import session_memory, spill_store
+
+        if service_url:
+            # Thin client: the service's workers cache, coalesce and run the agent
+            from services.job_client import ResearchServiceClient
+        else:
+            from agent import agent_pool
+            from services.cache import normalize_query
+            from services.pipeline import research_pipeline
+            from services.semantic_cache import answer_cache
+            from services.singleflight import research_flight
+
+            st.session_state.agent_executor = initialize_agent(
+                api_key, model_name, temperature, max_iterations
+            )
+        if not service_url and st.session_state.agent_executor is None:
             st.error("Agent initialization failed. Please check your API key.")
         else:
             with st.spinner("🔍 Researching... This may take a moment..."):
@@ -204,8 +253,60 @@ else:
                     # Create progress placeholder
                     progress_placeholder = st.empty()
 
-                    # Run the agent
-                    result = st.session_state.agent_executor.invoke({"input": query})
+                    # Answers are only reused, or shared, between runs with these settings
+                    settings = (model_name, temperature, max_iterations, deep_mode)
+
+                    # Reuse the answer to a near-identical earlier question
+                    with track_run(query) as run_metrics:
+                        cached = (
+                            None
+                            if service_url
+                            else answer_cache.lookup(query, settings)
+                        )
+                        if cached:
+                            result = cached["result"]
+                        elif service_url:
+                            client = ResearchServiceClient(
+                                service_url,
+                                tenant=os.getenv("RESEARCH_SERVICE_TENANT", "streamlit"),
+                            )
+                            # Large observations go to disk; only previews stay in memory
+                            result = spill_store.spill_result(
+                                client.research(
+                                    query,
+                                    model_name=model_name,
+                                    temperature=temperature,
+                                    max_iterations=max_iterations,
+                                    deep=deep_mode,
+                                )
+                            )
+                        else:
+                            config = {"callbacks": [run_metrics.handler]}
+
+                            # Shared with identical runs in other sessions, so
+                            # it only uses what is passed in
+                            def run_research(llm, agent_executor):
+                                result = research_pipeline(
+                                    query,
+                                    llm,
+                                    agent_executor,
+                                    deep=deep_mode,
+                                    config=config,
+                                )
+                                # Large observations go to disk; only previews stay in memory
+                                result = spill_store.spill_result(result)
+                                if result.get("output"):
+                                    answer_cache.store(query, result, settings)
+                                return result
+
+                            # Identical questions already running elsewhere share that run
+                            run_key = (normalize_query(query), *settings)
+                            result, _ = research_flight.do(
+                                run_key,
+                                run_research,
+                                agent_pool.get_llm(api_key, model_name, temperature),
+                                st.session_state.agent_executor,
+                            )
 
                     # Clear progress
                     progress_placeholder.empty()
@@ -213,65 +314,34 @@ else:
                     # Display results
                     st.success("✅ Research Complete!")
 
-                    # Result container
-                    with st.container():
-                        st.markdown("### 📊 Research Results")
-                        st.markdown(
-                            f'<div class="research-box">{result.get("output", "No output generated")}</div>',
-                            unsafe_allow_html=True,
-                        )
+                    # Save to history
+                    session_history.add(query, result.get("output", ""))
 
-                    # Show intermediate steps
-                    if result.get("intermediate_steps"):
-                        with st.expander("🔧 View Tool Calls"):
-                            for i, step in enumerate(result["intermediate_steps"], 1):
-                                action, observation = step
-                                st.markdown(f"**Step {i}: {action.tool}**")
-                                st.code(f"Input: {action.tool_input}")
-                                st.text(f"Output: {str(observation)[:200]}...")
-                                st.divider()
+                    show_result(result, run_metrics)
 
-                    # Save to history
-                    st.session_state.history.append(
-                        {
-                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "query": query,
-                            "result": result.get("output", ""),
-                        }
-                    )
-
-                    # Download button
-                    st.download_button(
-                        label="💾 Download Results",
-                        data=result.get("output", ""),
-                        file_name=f"research_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                        mime="text/plain",
-                    )
+                    # Kept so the result survives reruns such as a download click,
+                    # and dropped once Streamlit discards the session
+                    if "session_memory_handle" not in st.session_state:
+                        st.session_state.session_memory_handle = session_memory.handle(
+                            session_id
+                        )
+                    session_memory.put(session_id, "last_result", result)
 
                 except Exception as e:
                     st.error(f"❌ Error during research: {e}")
                     with st.expander("View Error Details"):
                         st.code(str(e))
+    else:
+        spill = sys.modules.get("services.spill")
+        last_result = spill and spill.session_memory.get(session_id, "last_result")
+        if last_result:
+            show_result(last_result)
 
 # Display history
-if st.session_state.history:
+if session_history.count():
     st.divider()
     st.subheader("📜 Research History")
-
-    for i, item in enumerate(reversed(st.session_state.history), 1):
-        with st.expander(f"{item['timestamp']} - {item['query'][:50]}..."):
-            st.markdown(f"**Query:** {item['query']}")
-            st.markdown(f"**Result:**")
-            st.markdown(item["result"])
-
-            # Download individual result
-            st.download_button(
-                label="💾 Download",
-                data=item["result"],
-                file_name=f"research_{i}.txt",
-                mime="text/plain",
-                key=f"download_{i}",
-            )
+    history(session_history)
 
 # Footer
 st.divider()
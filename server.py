@@ -0,0 +1,242 @@
+"""Research job service.
+
+Accepts research queries over HTTP, queues them in SQLite and runs them on
+a pool of worker processes. Clients poll a job or stream its progress as
+server-sent events:
+
+    python server.py --workers 4 --port 8000
+    curl -X POST localhost:8000/jobs -H "X-Tenant: acme" \\
+         -d '{"query": "What is the importance of Sri Lanka in global trade?"}'
+    curl localhost:8000/jobs/<id>
+    curl -N localhost:8000/jobs/<id>/events
+
+Use --fake to run against the local fakes from benchmarks/ (no API key or
+network needed) and --quotas tenants.json to set per-tenant limits, e.g.
+{"default": {"max_concurrent": 2, "max_queued": 50}, "acme": {"max_concurrent": 4}}.
+"""
+
+import argparse
+import json
+import multiprocessing
+import re
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from services.jobs import JOBS_PATH, PRIORITIES, JobStore, QuotaExceeded, worker_main
+
+JOB_PATH = re.compile(r"^/jobs/([0-9a-f]{32})(/events)?$")
+
+# Settings a client may pass along with its query
+JOB_SETTINGS = ("model_name", "temperature", "max_iterations", "deep")
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    store = None
+    quotas = {}
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _tenant(self):
+        return self.headers.get("X-Tenant") or "default"
+
+    def _public(self, job):
+        return {k: v for k, v in job.items() if k != "worker"}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            return self._send_json(200, {"status": "ok"})
+        if url.path == "/stats":
+            # Counts of the caller's own jobs only
+            return self._send_json(200, self.store.stats(self._tenant()))
+
+        match = JOB_PATH.match(url.path)
+        job = match and self.store.get(match.group(1))
+        if not job or job["tenant"] != self._tenant():
+            return self._send_json(404, {"error": "Job not found"})
+        if not match.group(2):
+            return self._send_json(200, self._public(job))
+        try:
+            after = int(parse_qs(url.query).get("after", ["0"])[0])
+        except ValueError:
+            return self._send_json(400, {"error": "after must be an event id"})
+        self._stream_events(job["id"], after)
+
+    def _stream_events(self, job_id, after):
+        """Send the job's events as server-sent events until it finishes"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        last_write = time.monotonic()
+        try:
+            while True:
+                events = self.store.events(job_id, after)
+                for seq, event_type, data in events:
+                    message = f"id: {seq}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+                    self.wfile.write(message.encode("utf-8"))
+                    after = seq
+                    if event_type in ("done", "error", "cancelled"):
+                        self.wfile.flush()
+                        return
+                if events:
+                    self.wfile.flush()
+                    last_write = time.monotonic()
+                elif time.monotonic() - last_write > 15:
+                    # Comment line keeps proxies from closing an idle stream
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+                    last_write = time.monotonic()
+                time.sleep(0.1)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/jobs":
+            return self._send_json(404, {"error": "Not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": "Body must be JSON"})
+
+        query = str(body.get("query", "")).strip()
+        priority = body.get("priority", "normal")
+        if not query:
+            return self._send_json(400, {"error": "query is required"})
+        if priority not in PRIORITIES:
+            return self._send_json(
+                400, {"error": f"priority must be one of {', '.join(PRIORITIES)}"}
+            )
+        settings = {key: body[key] for key in JOB_SETTINGS if key in body}
+        try:
+            job = self.store.submit(
+                self._tenant(), query, settings, priority, self.quotas
+            )
+        except QuotaExceeded as e:
+            return self._send_json(429, {"error": str(e)})
+        self._send_json(202, {"id": job["id"], "status": job["status"]})
+
+    def do_DELETE(self):
+        match = JOB_PATH.match(urlparse(self.path).path)
+        job = match and not match.group(2) and self.store.get(match.group(1))
+        if not job or job["tenant"] != self._tenant():
+            return self._send_json(404, {"error": "Job not found"})
+        self._send_json(200, {"cancelled": self.store.cancel(job["id"])})
+
+
+class WorkerPool:
+    """Keeps a fixed number of worker processes alive, requeueing the jobs of any that die"""
+
+    def __init__(self, store, size, path, quotas, fake):
+        self.store = store
+        self.size = size
+        self.args = (path, quotas, fake)
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = []
+        self.stopping = False
+        self._lock = threading.Lock()
+
+    def _start(self):
+        process = self.context.Process(target=worker_main, args=self.args, daemon=True)
+        process.start()
+        return process
+
+    def start(self):
+        self.processes = [self._start() for _ in range(self.size)]
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(1.0)
+            with self._lock:
+                if self.stopping:
+                    return
+                for i, process in enumerate(self.processes):
+                    if not process.is_alive():
+                        requeued = self.store.requeue(process.pid)
+                        print(
+                            f"Worker {process.pid} exited, requeued {requeued} jobs",
+                            file=sys.stderr,
+                        )
+                        self.processes[i] = self._start()
+
+    def stop(self, timeout=5.0):
+        """Terminate the workers and wait for them to exit"""
+        with self._lock:
+            # Keeps the watcher from starting replacements for stopped workers
+            self.stopping = True
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the research job service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--db", default=JOBS_PATH)
+    parser.add_argument("--quotas", help="JSON file with per-tenant limits")
+    parser.add_argument(
+        "--fake", action="store_true", help="Use local fake LLM and search backends"
+    )
+    args = parser.parse_args(argv)
+
+    quotas = {}
+    if args.quotas:
+        with open(args.quotas, encoding="utf-8") as f:
+            quotas = json.load(f)
+
+    store = JobStore(args.db)
+    # Jobs left running by a previous server have no worker any more
+    requeued = store.requeue()
+    if requeued:
+        print(f"Requeued {requeued} interrupted jobs", file=sys.stderr)
+
+    pool = WorkerPool(store, args.workers, args.db, quotas, args.fake)
+    pool.start()
+
+    JobHandler.store = store
+    JobHandler.quotas = quotas
+    server = ThreadingHTTPServer((args.host, args.port), JobHandler)
+    server.daemon_threads = True
+    # docker stop and systemd send SIGTERM; unwind so the workers are stopped too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(
+        f"Research service on http://{args.host}:{args.port} "
+        f"with {args.workers} workers",
+        file=sys.stderr,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from services.metrics import record
+from services.singleflight import SingleFlight
+
+CACHE_PATH = os.getenv("TOOL_CACHE_PATH", ".cache/tool_cache.sqlite3")
+
+# Seconds a cached result stays fresh, per tool
+DEFAULT_TTLS = {
+    "web_search": 60 * 60,
+    "wikipedia": 7 * 24 * 60 * 60,
+}
+
+# Seconds an empty or failed result is kept, so a backend that had nothing,
+# or was briefly down, is asked again soon
+NEGATIVE_TTL = 60
+
+# Tool results that mean nothing was found
+EMPTY_RESULTS = (
+    "No search results found",
+    "No good Wikipedia Search Result",
+    "Search error",
+)
+
+
+def is_empty_result(value: str) -> bool:
+    return str(value).startswith(EMPTY_RESULTS)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different spellings share a cache key"""
+    query = re.sub(r"\s+", " ", str(query)).strip().lower()
+    return query.rstrip("?!. ")
+
+
+class ResultCache:
+    """Disk-backed tool result cache with per-tool TTLs and LRU eviction.
+
+    Empty results expire after negative_ttl seconds instead of the tool's TTL.
+    """
+
+    def __init__(
+        self,
+        path=CACHE_PATH,
+        max_entries=5000,
+        ttls=None,
+        default_ttl=60 * 60,
+        negative_ttl=NEGATIVE_TTL,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._flights = SingleFlight("tool")
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                tool TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                negative INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (tool, key)
+            )""")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}
+        if "negative" not in columns:
+            self._conn.execute(
+                "ALTER TABLE results ADD COLUMN negative INTEGER NOT NULL DEFAULT 0"
+            )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)"
+        )
+        self._size = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def ttl_for(self, tool: str, negative=False) -> float:
+        if negative:
+            return min(self.negative_ttl, self.ttls.get(tool, self.default_ttl))
+        return self.ttls.get(tool, self.default_ttl)
+
+    def get(self, tool: str, query: str):
+        """Return the cached result for a query, or None if missing or expired"""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created, negative FROM results"
+                " WHERE tool = ? AND key = ?",
+                (tool, key),
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl_for(tool, row[2]):
+                if row is not None:
+                    self._conn.execute(
+                        "DELETE FROM results WHERE tool = ? AND key = ?", (tool, key)
+                    )
+                    self._size -= 1
+                self.misses[tool] += 1
+                record("cache_misses")
+                return None
+
+            self._conn.execute(
+                "UPDATE results SET accessed = ? WHERE tool = ? AND key = ?",
+                (now, tool, key),
+            )
+            self.hits[tool] += 1
+            record("cache_hits")
+            return row[0]
+
+    def contains(self, tool: str, query: str) -> bool:
+        """Whether a fresh result is cached, without counting a hit or miss"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created, negative FROM results WHERE tool = ? AND key = ?",
+                (tool, normalize_query(query)),
+            ).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl_for(tool, row[1])
+
+    def in_flight(self, tool: str, query: str) -> bool:
+        return self._flights.in_flight((tool, normalize_query(query)))
+
+    def set(self, tool: str, query: str, value: str) -> None:
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            existed = self._conn.execute(
+                "SELECT 1 FROM results WHERE tool = ? AND key = ?", (tool, key)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (tool, key, value, now, now, is_empty_result(value)),
+            )
+            if not existed:
+                self._size += 1
+            if self._size > self.max_entries:
+                self._evict(self._size - self.max_entries)
+
+    def _evict(self, count: int) -> None:
+        # Drop the least recently used rows across all tools
+        self._conn.execute(
+            """DELETE FROM results WHERE rowid IN (
+                SELECT rowid FROM results ORDER BY accessed LIMIT ?
+            )""",
+            (count,),
+        )
+        self._size -= count
+        self.evictions += count
+
+    def get_or_compute(self, tool: str, query: str, compute) -> str:
+        """Return a cached result, or call compute() and cache what it returns.
+
+        Concurrent misses for the same query share a single compute() call.
+        """
+        value = self.get(tool, query)
+        if value is None:
+
+            def fill():
+                result = compute()
+                self.set(tool, query, result)
+                return result
+
+            value, _ = self._flights.do((tool, normalize_query(query)), fill)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._size = 0
+
+    def stats(self) -> dict:
+        return {
+            "size": self._size,
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+        }
+
+
+tool_cache = ResultCache()
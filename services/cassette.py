@@ -0,0 +1,447 @@
+"""Record and replay full research runs.
+
+Recording captures every LLM request and response and every tool result of
+a run, with their timings, into a small gzipped JSON lines cassette.
+Replaying re-executes the run from the cassette with no network access,
+either at the recorded pace or as fast as the CPU allows, so orchestration
+overhead can be profiled and prompt or tool changes regression-tested:
+
+    python -m services.cassette record "What is the importance of Sri Lanka in global trade?" -o run.cassette.gz
+    python -m services.cassette replay run.cassette.gz --time-scale 0
+
+Set CASSETTE_DIR to record every run of the pages and the job service.
+"""
+
+import argparse
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessageChunk,
+    message_chunk_to_message,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from services.cache import normalize_query
+
+CASSETTE_DIR = os.getenv("CASSETTE_DIR", "")
+CASSETTE_VERSION = 1
+
+_active = contextvars.ContextVar("cassette", default=None)
+
+
+class CassetteMiss(LookupError):
+    """A replayed run made a call the cassette has no answer for"""
+
+
+class ReplayedError(Exception):
+    """A tool error that happened while the cassette was recorded"""
+
+
+def _request_key(messages, kwargs) -> str:
+    # Message ids and metadata differ between runs; only what the model sees counts
+    payload = [[m.type, m.content, m.additional_kwargs] for m in messages]
+    data = json.dumps([payload, kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:24]
+
+
+def _load_message(data):
+    return messages_from_dict([data])[0]
+
+
+def _as_chunk(message) -> AIMessageChunk:
+    # Models without native streaming yield their whole reply as one AIMessage
+    if isinstance(message, AIMessageChunk):
+        return message
+    return AIMessageChunk(
+        content=message.content,
+        additional_kwargs=message.additional_kwargs,
+        usage_metadata=message.usage_metadata,
+    )
+
+
+class Cassette:
+    """LLM and tool interactions of one run, in the order they started"""
+
+    def __init__(self, header=None, interactions=()):
+        self.header = dict(header or {})
+        self.interactions = list(interactions)
+        self.mode = "record"
+        self.time_scale = 1.0
+        self.strict = False
+        self.misses = 0
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._by_key = None
+        self._used = set()
+
+    def add(self, kind, key, started, **fields) -> None:
+        item = {
+            "kind": kind,
+            "key": key,
+            "start": round(started - self.start, 4),
+            "latency": round(time.perf_counter() - started, 4),
+            **fields,
+        }
+        with self._lock:
+            self.interactions.append(item)
+
+    def take(self, kind, key) -> dict:
+        """Return the next unused interaction recorded for kind and key.
+
+        Without an exact match (a prompt or tool changed since recording)
+        the earliest unused interaction of the same kind stands in, unless
+        the cassette is strict.
+        """
+        with self._lock:
+            if self._by_key is None:
+                self._by_key = defaultdict(deque)
+                for i, item in enumerate(self.interactions):
+                    self._by_key[(item["kind"], item["key"])].append(i)
+            matches = self._by_key.get((kind, key), ())
+            while matches and matches[0] in self._used:
+                matches.popleft()
+            if matches:
+                index = matches.popleft()
+            else:
+                unused = (
+                    i
+                    for i, item in enumerate(self.interactions)
+                    if item["kind"] == kind and i not in self._used
+                )
+                index = None if self.strict else next(unused, None)
+                if index is None:
+                    raise CassetteMiss(f"No recorded {kind} call matches {key!r}")
+                self.misses += 1
+            self._used.add(index)
+            return self.interactions[index]
+
+    def wait(self, started, offset) -> None:
+        """Sleep until offset recorded seconds (scaled) have passed since started"""
+        delay = offset * self.time_scale - (time.perf_counter() - started)
+        if delay > 0:
+            time.sleep(delay)
+
+    def summary(self) -> dict:
+        return {
+            "llm_calls": sum(i["kind"] == "llm" for i in self.interactions),
+            "tool_calls": sum(i["kind"] == "tool" for i in self.interactions),
+            "backend_seconds": round(sum(i["latency"] for i in self.interactions), 4),
+        }
+
+    def save(self, path) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"version": CASSETTE_VERSION, **self.header}) + "\n")
+            for item in sorted(self.interactions, key=lambda i: i["start"]):
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version in {path}")
+            return cls(header, (json.loads(line) for line in f if line.strip()))
+
+
+@contextmanager
+def recording(query, **settings):
+    """Record the LLM and tool calls made in this context into a new cassette"""
+    install()
+    cassette = Cassette(
+        {
+            "query": query,
+            "settings": settings,
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+    )
+    token = _active.set(cassette)
+    try:
+        yield cassette
+    finally:
+        _active.reset(token)
+        cassette.header["duration"] = round(time.perf_counter() - cassette.start, 4)
+
+
+@contextmanager
+def replaying(cassette, time_scale=1.0, strict=False):
+    """Answer the LLM and tool calls made in this context from a cassette"""
+    install()
+    cassette.mode = "replay"
+    cassette.time_scale = time_scale
+    cassette.strict = strict
+    cassette.start = time.perf_counter()
+    token = _active.set(cassette)
+    try:
+        yield cassette
+    finally:
+        _active.reset(token)
+
+
+def current_cassette():
+    """Return the cassette being recorded or replayed in this context, if any"""
+    return _active.get()
+
+
+def _recorder():
+    cassette = _active.get()
+    return cassette if cassette is not None and cassette.mode == "record" else None
+
+
+class RecordingChatModel(BaseChatModel):
+    """Wraps a chat model and records its calls while a cassette is recording"""
+
+    inner: BaseChatModel
+
+    @property
+    def _llm_type(self) -> str:
+        return f"recording-{self.inner._llm_type}"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        cassette = _recorder()
+        started = time.perf_counter()
+        # The wrapper reports to the run's callbacks; the inner model keeps only its own
+        message = self.inner.invoke(
+            messages, config={"callbacks": []}, stop=stop, **kwargs
+        )
+        if cassette is not None:
+            cassette.add(
+                "llm",
+                _request_key(messages, kwargs),
+                started,
+                message=message_to_dict(message),
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        cassette = _recorder()
+        started = time.perf_counter()
+        chunks = []
+        for chunk in self.inner.stream(
+            messages, config={"callbacks": []}, stop=stop, **kwargs
+        ):
+            chunk = _as_chunk(chunk)
+            if cassette is not None:
+                chunks.append(
+                    [round(time.perf_counter() - started, 4), message_to_dict(chunk)]
+                )
+            yield ChatGenerationChunk(message=chunk)
+        if cassette is not None:
+            cassette.add("llm", _request_key(messages, kwargs), started, chunks=chunks)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model that answers from the cassette being replayed"""
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette-replay"
+
+    def _take(self, messages, kwargs):
+        cassette = _active.get()
+        if cassette is None or cassette.mode != "replay":
+            raise CassetteMiss("No cassette is being replayed")
+        return cassette, cassette.take("llm", _request_key(messages, kwargs))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.perf_counter()
+        cassette, item = self._take(messages, kwargs)
+        if "chunks" in item:
+            chunks = [_load_message(chunk) for _, chunk in item["chunks"]]
+            message = message_chunk_to_message(sum(chunks[1:], chunks[0]))
+        else:
+            message = _load_message(item["message"])
+        cassette.wait(started, item["latency"])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.perf_counter()
+        cassette, item = self._take(messages, kwargs)
+        if "chunks" in item:
+            chunks = [
+                (offset, _load_message(chunk)) for offset, chunk in item["chunks"]
+            ]
+        else:
+            chunks = [(item["latency"], _as_chunk(_load_message(item["message"])))]
+        for offset, chunk in chunks:
+            cassette.wait(started, offset)
+            yield ChatGenerationChunk(message=chunk)
+        cassette.wait(started, item["latency"])
+
+
+class CassetteToolCache:
+    """Wraps the tool result cache so tool results are recorded or replayed.
+
+    Every web and Wikipedia lookup passes through the cache, so both hits
+    and backend calls are captured with the latency the run saw.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+    def get_or_compute(self, tool: str, query: str, compute) -> str:
+        cassette = _active.get()
+        if cassette is None:
+            return self.cache.get_or_compute(tool, query, compute)
+        key = f"{tool}|{normalize_query(query)}"
+        started = time.perf_counter()
+        if cassette.mode == "replay":
+            item = cassette.take("tool", key)
+            cassette.wait(started, item["latency"])
+            if "error" in item:
+                raise ReplayedError(item["error"])
+            return item["result"]
+        try:
+            result = self.cache.get_or_compute(tool, query, compute)
+        except Exception as e:
+            cassette.add("tool", key, started, error=str(e))
+            raise
+        cassette.add("tool", key, started, result=result)
+        return result
+
+
+def install() -> None:
+    """Route tool results through the cassette hooks; safe to call repeatedly"""
+    import tools
+
+    if not isinstance(tools.tool_cache, CassetteToolCache):
+        tools.tool_cache = CassetteToolCache(tools.tool_cache)
+
+
+def cassette_path(directory=CASSETTE_DIR) -> str:
+    name = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.cassette.gz"
+    return os.path.join(directory, name)
+
+
+def record_run(args) -> dict:
+    from agent import build_agent_executor, build_llm
+    from services.pipeline import research_pipeline
+
+    if args.fake:
+        from benchmarks.fakes import FakeChatModel
+        from services.jobs import install_fake_backends
+
+        install_fake_backends()
+        direct_llm = FakeChatModel(script=[], latency=0.2)
+        agent_llm = FakeChatModel(latency=0.2)
+    else:
+        api_key = os.getenv("GOOGLE_API_KEY", "")
+        direct_llm = agent_llm = build_llm(api_key, args.model, args.temperature)
+    llm = RecordingChatModel(inner=direct_llm)
+    executor = build_agent_executor(
+        "cassette",
+        max_iterations=args.max_iterations,
+        verbose=False,
+        llm=llm if agent_llm is direct_llm else RecordingChatModel(inner=agent_llm),
+    )
+
+    with recording(
+        args.query, deep=args.deep, max_iterations=args.max_iterations
+    ) as cassette:
+        result = research_pipeline(args.query, llm, executor, deep=args.deep)
+    cassette.header["output"] = result.get("output", "")
+    cassette.save(args.output)
+    return {"cassette": args.output, "duration": cassette.header["duration"]}
+
+
+def replay_run(args) -> dict:
+    from agent import build_agent_executor
+    from services.metrics import track_run
+    from services.pipeline import research_pipeline
+
+    cassette = Cassette.load(args.cassette)
+    query = cassette.header["query"]
+    settings = cassette.header.get("settings", {})
+    llm = ReplayChatModel()
+    executor = build_agent_executor(
+        "cassette",
+        max_iterations=settings.get("max_iterations", 10),
+        verbose=False,
+        llm=llm,
+    )
+    with replaying(cassette, args.time_scale, args.strict), track_run(
+        query, export=False
+    ) as run_metrics:
+        result = research_pipeline(
+            query,
+            llm,
+            executor,
+            deep=settings.get("deep", False),
+            config={"callbacks": [run_metrics.handler]},
+        )
+    return {
+        "query": query,
+        "recorded_duration": cassette.header.get("duration"),
+        "replay_duration": round(run_metrics.duration, 4),
+        "time_scale": args.time_scale,
+        **cassette.summary(),
+        "unmatched_calls": cassette.misses,
+        "unused_calls": len(cassette.interactions) - len(cassette._used),
+        "output_matches": result.get("output", "") == cassette.header.get("output"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record or replay a research run")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Run a query live and record it")
+    record.add_argument("query")
+    record.add_argument("-o", "--output", default=None)
+    record.add_argument("--deep", action="store_true")
+    record.add_argument("--model", default="gemini-2.5-flash")
+    record.add_argument("--temperature", type=float, default=0.7)
+    record.add_argument("--max-iterations", type=int, default=10)
+    record.add_argument(
+        "--fake", action="store_true", help="Record against the local fakes"
+    )
+
+    replay = commands.add_parser("replay", help="Re-run a recorded query offline")
+    replay.add_argument("cassette")
+    replay.add_argument(
+        "--time-scale",
+        type=float,
+        default=1.0,
+        help="1 replays recorded latencies, 0 replays at CPU speed",
+    )
+    replay.add_argument(
+        "--strict", action="store_true", help="Fail on calls that were not recorded"
+    )
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if args.command == "record":
+        args.output = args.output or cassette_path(CASSETTE_DIR or ".")
+        report = record_run(args)
+    else:
+        report = replay_run(args)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    # Run the imported module, not this __main__ copy: the pipeline and the
+    # tools check services.cassette's active cassette and classes
+    from services.cassette import main as _main
+
+    sys.exit(_main())
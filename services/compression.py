@@ -0,0 +1,147 @@
+import math
+import os
+import re
+from collections import Counter
+
+from services.metrics import current_run, record
+from services.semantic_cache import tokenize
+
+# Approximate tokens an observation may occupy in the agent scratchpad
+OBSERVATION_TOKEN_BUDGET = int(os.getenv("OBSERVATION_TOKEN_BUDGET", "400"))
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+HEADER_LINE = re.compile(r"^(Source:|Page:|## |\d+\.\s)")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _parse(text: str) -> list:
+    """Split an observation into blocks of ("header", line) and ("sentence", text) items"""
+    blocks = []
+    for block in re.split(r"\n\s*\n", text):
+        items = []
+        for line in block.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if HEADER_LINE.match(line):
+                items.append(["header", line])
+            else:
+                items.extend(["sentence", s] for s in SENTENCE_SPLIT.split(line) if s)
+        if items:
+            blocks.append(items)
+    return blocks
+
+
+def _near_duplicate(words: set, seen: list, threshold=0.8) -> bool:
+    for other in seen:
+        overlap = len(words & other) / max(1, len(words | other))
+        if overlap >= threshold:
+            return True
+    return False
+
+
+def _bm25_scores(sentences: list, query_terms: list, k1=1.2, b=0.75) -> list:
+    docs = [Counter(tokenize(s)) for s in sentences]
+    avg_len = sum(sum(d.values()) for d in docs) / max(1, len(docs)) or 1.0
+    df = Counter(term for d in docs for term in d)
+    scores = []
+    for doc in docs:
+        length = sum(doc.values())
+        score = 0.0
+        for term in set(query_terms):
+            tf = doc.get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        scores.append(score)
+    return scores
+
+
+def compress_observation(
+    text: str, question: str, token_budget: int = OBSERVATION_TOKEN_BUDGET
+) -> str:
+    """Extractively shrink a tool observation to roughly token_budget tokens.
+
+    Near-duplicate sentences are dropped, the rest are ranked with BM25
+    against the question and the best ones kept in their original order.
+    Titles and "Source:" lines of every block that keeps a sentence are
+    preserved so citations survive.
+    """
+    original_tokens = estimate_tokens(text)
+    if original_tokens <= token_budget:
+        return text
+
+    blocks = _parse(text)
+    seen = []
+    candidates = []
+    for block_index, items in enumerate(blocks):
+        position = 0
+        for item_index, (kind, sentence) in enumerate(items):
+            if kind != "sentence":
+                continue
+            words = set(tokenize(sentence))
+            if not words or _near_duplicate(words, seen):
+                continue
+            seen.append(words)
+            candidates.append((block_index, item_index, position, sentence))
+            position += 1
+
+    if not candidates:
+        return text[: token_budget * 4]
+
+    scores = _bm25_scores([c[3] for c in candidates], tokenize(question))
+    # Leading sentences of a passage usually summarize it; favour them slightly
+    ranked = sorted(
+        zip(candidates, scores),
+        key=lambda pair: pair[1] + 0.1 / (1 + pair[0][2]),
+        reverse=True,
+    )
+
+    used = 0
+    kept = set()
+    kept_blocks = set()
+    for (block_index, item_index, _, sentence), score in ranked:
+        cost = estimate_tokens(sentence)
+        if block_index not in kept_blocks:
+            cost += sum(
+                estimate_tokens(line)
+                for kind, line in blocks[block_index]
+                if kind == "header"
+            )
+        if kept and (score <= 0 or used + cost > token_budget):
+            continue
+        used += cost
+        kept.add((block_index, item_index))
+        kept_blocks.add(block_index)
+
+    output = []
+    for block_index in sorted(kept_blocks):
+        lines = []
+        previous = None
+        for item_index, (kind, line) in enumerate(blocks[block_index]):
+            if kind == "header":
+                lines.append(line)
+            elif (block_index, item_index) in kept:
+                if previous == "sentence":
+                    lines[-1] += " " + line
+                else:
+                    lines.append(line)
+            else:
+                continue
+            previous = kind
+        output.append("\n".join(lines))
+
+    compressed = "\n\n".join(output)
+    record("compressed_tokens_saved", original_tokens - estimate_tokens(compressed))
+    return compressed
+
+
+def compress_for_question(text: str, tool_input: str) -> str:
+    """Compress against the current run's question, falling back to the tool input"""
+    run = current_run()
+    question = f"{run.query} {tool_input}" if run is not None else tool_input
+    return compress_observation(text, question)
@@ -0,0 +1,140 @@
+import contextvars
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from langchain_core.agents import AgentAction
+
+from services.compression import compress_observation
+from tools import combined_research
+
+# Upper bound on sub-questions per question and on sub-questions researched at once
+MAX_SUBQUESTIONS = int(os.getenv("DEEP_RESEARCH_MAX_SUBQUESTIONS", "5"))
+DEEP_RESEARCH_WORKERS = int(os.getenv("DEEP_RESEARCH_WORKERS", "4"))
+
+DECOMPOSE_PROMPT = """Break the research question below into at most {limit} independent sub-questions that can each be answered with a single web or encyclopedia search. Together they should cover everything needed to answer the question. If the question is already narrow, return it as the only item.
+
+Question: {question}
+
+Respond with only a JSON array of strings."""
+
+SYNTHESIS_PROMPT = """You are a helpful research assistant. The question below was split into sub-questions that were researched separately. Combine the findings into one answer to the original question. Cite sources where the findings give them, and say what is still missing.
+
+Question: {question}
+
+Findings:
+{findings}
+
+Provide a clear, well-formatted answer."""
+
+# Separate from the tools' pool: combined_research submits its own backend calls there
+_subquestion_pool = ThreadPoolExecutor(
+    max_workers=DEEP_RESEARCH_WORKERS, thread_name_prefix="deep-research"
+)
+
+
+def _message_text(message) -> str:
+    return message.content if isinstance(message.content, str) else ""
+
+
+def parse_subquestions(text: str, question: str, limit: int = MAX_SUBQUESTIONS) -> list:
+    """Read the sub-questions out of the model's reply, falling back to the question itself"""
+    items = []
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    if match:
+        try:
+            items = [str(item) for item in json.loads(match.group(0))]
+        except ValueError:
+            items = []
+    if not items:
+        # Numbered or bulleted lists instead of JSON
+        items = [
+            re.sub(r"^\s*(\d+[.)]|[-*•])\s*", "", line)
+            for line in text.splitlines()
+            if line.strip().endswith("?")
+        ]
+
+    subquestions = []
+    seen = set()
+    for item in items:
+        item = item.strip().strip('"')
+        if item and item.lower() not in seen:
+            seen.add(item.lower())
+            subquestions.append(item)
+    return subquestions[:limit] or [question]
+
+
+def decompose_question(llm, query, limit=MAX_SUBQUESTIONS, config=None) -> list:
+    """Ask the model for independent sub-questions covering the query"""
+    prompt = DECOMPOSE_PROMPT.format(question=query, limit=limit)
+    return parse_subquestions(
+        _message_text(llm.invoke(prompt, config=config)), query, limit
+    )
+
+
+def research_subquestion(subquestion: str) -> str:
+    """Fetch web and Wikipedia results for one sub-question and keep the relevant parts"""
+    return compress_observation(combined_research(subquestion), subquestion)
+
+
+def deep_research(
+    llm, query, on_text=None, on_tool_start=None, on_tool_end=None, config=None
+):
+    """Research a broad question as parallel sub-questions merged by one LLM call.
+
+    Takes the same callbacks as services.streaming.stream_research, always
+    invoked on the calling thread, and returns a result dict shaped like
+    the executor's.
+    """
+    subquestions = decompose_question(llm, query, config=config)
+
+    # Copy the context so metrics recorded by the tools reach the current run
+    futures = {
+        _subquestion_pool.submit(
+            contextvars.copy_context().run, research_subquestion, subquestion
+        ): subquestion
+        for subquestion in subquestions
+    }
+
+    findings = {}
+    for future in as_completed(futures):
+        subquestion = futures[future]
+        try:
+            findings[subquestion] = future.result()
+        except Exception as e:
+            findings[subquestion] = f"Research failed: {str(e)}"
+        # Reported as each sub-question finishes so input and output stay paired
+        if on_tool_start:
+            on_tool_start("combined_research", subquestion)
+        if on_tool_end:
+            on_tool_end("combined_research", findings[subquestion])
+
+    prompt = SYNTHESIS_PROMPT.format(
+        question=query,
+        findings="\n\n".join(
+            f"### {subquestion}\n{findings[subquestion]}"
+            for subquestion in subquestions
+        ),
+    )
+    text = ""
+    for chunk in llm.stream(prompt, config=config):
+        text += _message_text(chunk)
+        if on_text and text:
+            on_text(text)
+
+    return {
+        "input": query,
+        "output": text,
+        "intermediate_steps": [
+            (
+                AgentAction(
+                    tool="combined_research",
+                    tool_input=subquestion,
+                    log="deep research",
+                ),
+                findings[subquestion],
+            )
+            for subquestion in subquestions
+        ],
+    }
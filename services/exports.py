@@ -0,0 +1,55 @@
+import io
+import json
+import re
+import zipfile
+
+# File extension and MIME type of each export format
+EXPORT_FORMATS = {
+    "txt": ("txt", "text/plain"),
+    "md": ("md", "text/markdown"),
+    "jsonl": ("jsonl", "application/jsonl"),
+    "zip": ("zip", "application/zip"),
+}
+
+
+def render_entry(entry: dict, fmt: str = "txt") -> str:
+    """Format one research result (a dict with query, result and timestamp)"""
+    timestamp = entry.get("timestamp", "")
+    if fmt == "md":
+        return f"# {entry['query']}\n\n*{timestamp}*\n\n{entry['result']}\n"
+    if fmt == "jsonl":
+        return json.dumps(entry, ensure_ascii=False) + "\n"
+    return (
+        f"Query: {entry['query']}\nDate: {timestamp}\n\n{entry['result']}\n"
+        f"{'=' * 80}\n"
+    )
+
+
+def _entry_file_name(entry: dict) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", entry["query"].lower()).strip("-")[:50]
+    return f"{entry['id']:06d}-{slug or 'research'}.md"
+
+
+def export_history(store, fmt: str = "txt", search: str = None) -> bytes:
+    """Build an export of the (optionally filtered) history in the given format.
+
+    Entries are streamed from the store in batches and encoded as they
+    arrive, so only the finished file is held in memory. Meant to be
+    passed to st.download_button through a callable, so it only runs
+    when the user asks for the file.
+    """
+    out = io.BytesIO()
+    if fmt == "zip":
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+            for entry in store.iter_entries(search):
+                archive.writestr(_entry_file_name(entry), render_entry(entry, "md"))
+    else:
+        for entry in store.iter_entries(search):
+            out.write(render_entry(entry, fmt).encode("utf-8"))
+    return out.getvalue()
+
+
+def export_entry(store, entry_id: int, fmt: str = "txt") -> str:
+    """Load and format one history entry when its download is requested"""
+    entry = store.get(entry_id)
+    return render_entry(entry, fmt) if entry else ""
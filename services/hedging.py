@@ -0,0 +1,163 @@
+import contextvars
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from services.metrics import record
+
+# A search backend: name, func(query) -> str, and is_good(result) -> bool
+Backend = namedtuple("Backend", "name func is_good")
+
+
+class CircuitBreaker:
+    """Stops sending requests to a backend after repeated failures.
+
+    After failure_threshold consecutive failures the circuit opens and the
+    backend is skipped for reset_timeout seconds. Then a single trial
+    request is let through; its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial:
+                    record("circuit_opened")
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide circuit breaker for a backend"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+# Long-lived threads, so per-thread backend clients stay connected between calls
+_hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+
+def _track(future, breaker):
+    def done(f):
+        if f.exception() is None:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    future.add_done_callback(done)
+
+
+def hedged_call(backends, query, hedge_after=2.0, timeout=10.0):
+    """Return (backend name, result) of the first good response for query.
+
+    Backends are tried in order. The next one is started when the previous
+    has not answered within hedge_after seconds, or immediately when it
+    fails or returns a result is_good rejects. Backends whose circuit is
+    open are skipped. A result that is not good is returned only if no
+    backend does better; if every backend raised, the last error is raised.
+    """
+    remaining = list(backends)
+    launched = []
+    pending = {}
+
+    def launch():
+        """Start the next backend whose circuit allows it; False if none is left"""
+        while remaining:
+            backend = remaining.pop(0)
+            breaker = get_breaker(backend.name)
+            if not breaker.allow():
+                record("circuit_rejected")
+                continue
+            # Copy the context so metrics recorded by the backend reach the current run
+            future = _hedge_pool.submit(
+                contextvars.copy_context().run, backend.func, query
+            )
+            _track(future, breaker)
+            pending[future] = backend
+            launched.append(backend)
+            return True
+        return False
+
+    if not launch():
+        raise ConnectionError("All search backends are unavailable")
+
+    started = time.monotonic()
+    fallback = None
+    last_error = None
+    while pending:
+        elapsed = time.monotonic() - started
+        if elapsed >= timeout:
+            break
+        wait_for = timeout - elapsed
+        if remaining:
+            wait_for = min(wait_for, max(0.0, hedge_after * len(launched) - elapsed))
+        done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        if not done:
+            if remaining and launch():
+                record("hedged_requests")
+            continue
+
+        for future in done:
+            backend = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            if backend.is_good(result):
+                if backend is not launched[0]:
+                    record("hedge_wins")
+                return backend.name, result
+            fallback = fallback or (backend.name, result)
+        # Fail over straight away instead of waiting out the hedge delay
+        if not pending:
+            launch()
+
+    if fallback:
+        return fallback
+    if last_error is not None:
+        raise last_error
+    raise TimeoutError(f"No search backend answered within {timeout:.0f}s")
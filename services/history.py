@@ -0,0 +1,203 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+HISTORY_PATH = os.getenv("HISTORY_DB_PATH", ".cache/history.sqlite3")
+
+# Entries older than this many days are removed when the store opens
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", "90"))
+
+
+class HistoryStore:
+    """Persistent research history in SQLite with full-text search.
+
+    Uses WAL so page reads never wait on writes, and an FTS5 index over
+    queries and results when the SQLite build supports it (falling back to
+    LIKE otherwise). Pages return short previews; full results are loaded
+    per entry with get(). Every entry belongs to an owner, such as a
+    browser session, and each method only sees that owner's entries; use
+    for_owner() to get a view bound to one owner.
+    """
+
+    def __init__(self, path=HISTORY_PATH, retention_days=HISTORY_RETENTION_DAYS):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                query TEXT NOT NULL,
+                result TEXT NOT NULL,
+                owner TEXT NOT NULL DEFAULT ''
+            )""")
+        columns = {
+            row["name"] for row in self._conn.execute("PRAGMA table_info(history)")
+        }
+        if "owner" not in columns:
+            # Entries from before owners existed are removed by prune()
+            self._conn.execute(
+                "ALTER TABLE history ADD COLUMN owner TEXT NOT NULL DEFAULT ''"
+            )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS history_owner ON history (owner, id)"
+        )
+        indexed = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'history_fts'"
+        ).fetchone()
+        try:
+            self._conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                    query, result, content='history', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+                    INSERT INTO history_fts (rowid, query, result)
+                    VALUES (new.id, new.query, new.result);
+                END;
+                CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+                    INSERT INTO history_fts (history_fts, rowid, query, result)
+                    VALUES ('delete', old.id, old.query, old.result);
+                END;
+                """)
+            if not indexed:
+                # Index rows written before full-text search was available
+                self._conn.execute(
+                    "INSERT INTO history_fts (history_fts) VALUES ('rebuild')"
+                )
+            self.full_text = True
+        except sqlite3.OperationalError:
+            self.full_text = False
+        if retention_days:
+            self.prune(retention_days)
+
+    def for_owner(self, owner: str) -> "OwnerHistory":
+        return OwnerHistory(self, owner)
+
+    def add(self, owner: str, query: str, result: str, timestamp: str = None) -> int:
+        timestamp = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO history (timestamp, query, result, owner) VALUES (?, ?, ?, ?)",
+                (timestamp, query, result, owner),
+            )
+            return cursor.lastrowid
+
+    def _where(self, owner, search):
+        """Build the WHERE clause and parameters for an owner and optional search"""
+        words = re.findall(r"\w+", search or "")
+        if not words:
+            return "WHERE owner = ?", [owner]
+        if self.full_text:
+            # Quote each word so user input cannot inject FTS syntax
+            match = " ".join(f'"{word}"*' for word in words)
+            return (
+                "WHERE owner = ? AND id IN "
+                "(SELECT rowid FROM history_fts WHERE history_fts MATCH ?)",
+                [owner, match],
+            )
+        clauses = " AND ".join("(query LIKE ? OR result LIKE ?)" for _ in words)
+        params = [p for word in words for p in (f"%{word}%", f"%{word}%")]
+        return f"WHERE owner = ? AND {clauses}", [owner] + params
+
+    def count(self, owner: str, search: str = None) -> int:
+        where, params = self._where(owner, search)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM history {where}", params
+            ).fetchone()[0]
+
+    def page(
+        self, owner: str, page: int = 0, page_size: int = 10, search: str = None
+    ) -> list:
+        """Return one page of entries, newest first, with a result preview"""
+        where, params = self._where(owner, search)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT id, timestamp, query, substr(result, 1, 300) AS preview
+                FROM history {where} ORDER BY id DESC LIMIT ? OFFSET ?""",
+                params + [page_size, page * page_size],
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, owner: str, entry_id: int):
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT id, timestamp, query, result FROM history
+                WHERE id = ? AND owner = ?""",
+                (entry_id, owner),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def iter_entries(self, owner: str, search: str = None, batch_size: int = 200):
+        """Yield full entries, newest first, fetching batch_size rows at a time"""
+        where, params = self._where(owner, search)
+        # Keyset paging: each batch continues below the last id seen
+        where = f"{where} AND id < ?"
+        last_id = float("inf")
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"""SELECT id, timestamp, query, result FROM history {where}
+                    ORDER BY id DESC LIMIT ?""",
+                    params + [last_id, batch_size],
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            last_id = rows[-1]["id"]
+
+    def prune(self, max_age_days: float) -> int:
+        """Delete entries older than max_age_days and entries with no owner.
+
+        Entries written before owners existed cannot be shown to anyone,
+        and owners that never come back would otherwise keep theirs forever.
+        """
+        cutoff = datetime.now() - timedelta(days=max_age_days)
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM history WHERE owner = '' OR timestamp < ?",
+                (cutoff.strftime("%Y-%m-%d %H:%M:%S"),),
+            )
+        return cursor.rowcount
+
+    def clear(self, owner: str) -> None:
+        # The delete trigger keeps the full-text index in step
+        with self._lock:
+            self._conn.execute("DELETE FROM history WHERE owner = ?", (owner,))
+
+
+class OwnerHistory:
+    """One owner's view of a HistoryStore, with the owner argument bound"""
+
+    def __init__(self, store: HistoryStore, owner: str):
+        self.store = store
+        self.owner = owner
+
+    def add(self, query, result, timestamp=None):
+        return self.store.add(self.owner, query, result, timestamp)
+
+    def count(self, search=None):
+        return self.store.count(self.owner, search)
+
+    def page(self, page=0, page_size=10, search=None):
+        return self.store.page(self.owner, page, page_size, search)
+
+    def get(self, entry_id):
+        return self.store.get(self.owner, entry_id)
+
+    def iter_entries(self, search=None, batch_size=200):
+        return self.store.iter_entries(self.owner, search, batch_size)
+
+    def clear(self):
+        self.store.clear(self.owner)
+
+
+history_store = HistoryStore()
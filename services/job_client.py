@@ -0,0 +1,131 @@
+import json
+import urllib.error
+import urllib.request
+
+from langchain_core.agents import AgentAction
+
+
+class JobServiceError(Exception):
+    pass
+
+
+class ResearchServiceClient:
+    """Minimal client for the job service started by server.py"""
+
+    def __init__(self, base_url, tenant="default", timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.tenant = tenant
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None, timeout=None):
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=json.dumps(body).encode("utf-8") if body is not None else None,
+            method=method,
+            headers={"Content-Type": "application/json", "X-Tenant": self.tenant},
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=timeout or self.timeout)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", "replace")
+            try:
+                detail = json.loads(detail).get("error", detail)
+            except ValueError:
+                pass
+            raise JobServiceError(f"{e.code}: {detail}") from None
+
+    def submit(self, query, priority="interactive", **settings) -> str:
+        """Queue a query and return its job id"""
+        with self._request(
+            "POST", "/jobs", {"query": query, "priority": priority, **settings}
+        ) as response:
+            return json.load(response)["id"]
+
+    def get(self, job_id) -> dict:
+        with self._request("GET", f"/jobs/{job_id}") as response:
+            return json.load(response)
+
+    def cancel(self, job_id) -> bool:
+        with self._request("DELETE", f"/jobs/{job_id}") as response:
+            return json.load(response)["cancelled"]
+
+    def events(self, job_id, after=0):
+        """Yield (seq, type, data) progress events until the job finishes"""
+        # Long-lived response: the read timeout only guards against a dead server
+        with self._request(
+            "GET", f"/jobs/{job_id}/events?after={after}", timeout=300
+        ) as response:
+            seq, event_type, data = None, None, []
+            for raw in response:
+                line = raw.decode("utf-8").rstrip("\r\n")
+                if line.startswith("id:"):
+                    seq = int(line[3:].strip())
+                elif line.startswith("event:"):
+                    event_type = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].strip())
+                elif not line and event_type:
+                    yield seq, event_type, json.loads("\n".join(data) or "{}")
+                    seq, event_type, data = None, None, []
+
+    def research(
+        self,
+        query,
+        on_text=None,
+        on_tool_start=None,
+        on_tool_end=None,
+        priority="interactive",
+        **settings,
+    ) -> dict:
+        """Run a query on the service, streaming progress to the same callbacks
+        as services.streaming.stream_research, and return an executor-shaped result"""
+        job_id = self.submit(query, priority=priority, **settings)
+        shown = []
+        # While a requeued job repeats steps already shown, they are not shown again
+        repeating = None
+        skip_end = False
+        for _, event_type, data in self.events(job_id):
+            if event_type == "text" and on_text:
+                on_text(data["text"])
+            elif event_type == "requeued":
+                repeating = 0
+            elif event_type == "tool_start":
+                step = (data["tool"], data["tool_input"])
+                skip_end = (
+                    repeating is not None
+                    and repeating < len(shown)
+                    and shown[repeating] == step
+                )
+                if skip_end:
+                    repeating += 1
+                    continue
+                repeating = None
+                shown.append(step)
+                if on_tool_start:
+                    on_tool_start(*step)
+            elif event_type == "tool_end":
+                if not skip_end and on_tool_end:
+                    on_tool_end(data["tool"], data["output"])
+                skip_end = False
+            elif event_type == "error":
+                raise JobServiceError(data["error"])
+            elif event_type == "cancelled":
+                raise JobServiceError("The research job was cancelled")
+
+        job = self.get(job_id)
+        if job["status"] != "done":
+            raise JobServiceError(job.get("error") or f"Job ended as {job['status']}")
+        return {
+            "input": query,
+            "output": job["output"],
+            "intermediate_steps": [
+                (
+                    AgentAction(
+                        tool=step["tool"], tool_input=step["tool_input"], log=""
+                    ),
+                    step["observation"],
+                )
+                for step in job["steps"] or []
+            ],
+            "job_id": job_id,
+        }
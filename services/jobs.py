@@ -0,0 +1,472 @@
+"""Research job queue shared by the job service and its worker processes.
+
+Jobs and their progress events live in one SQLite database, which is the
+queue: the HTTP server inserts jobs, worker processes claim them inside a
+write transaction and append events as the research streams. Claiming
+respects priority lanes and per-tenant concurrency quotas.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+JOBS_PATH = os.getenv("JOBS_DB_PATH", ".cache/jobs.sqlite3")
+
+# Lower runs first; within a lane jobs run in submission order
+PRIORITIES = {"interactive": 0, "normal": 1, "batch": 2}
+
+# Per-tenant limits, overridable per tenant with a JSON file passed to server.py
+DEFAULT_QUOTA = {"max_concurrent": 2, "max_queued": 50}
+
+# Minimum seconds between stored "text" events of one job
+TEXT_EVENT_INTERVAL = 0.25
+
+# Runs a job may start before a worker dying under it fails the job instead
+MAX_JOB_ATTEMPTS = int(os.getenv("MAX_JOB_ATTEMPTS", "3"))
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def quota_for(quotas: dict, tenant: str) -> dict:
+    return {**DEFAULT_QUOTA, **quotas.get("default", {}), **quotas.get(tenant, {})}
+
+
+def serialize_steps(intermediate_steps):
+    return [
+        {
+            "tool": action.tool,
+            "tool_input": action.tool_input,
+            "observation": str(observation),
+        }
+        for action, observation in intermediate_steps
+    ]
+
+
+class JobStore:
+    """SQLite-backed job queue; each process opens its own JobStore"""
+
+    def __init__(self, path=JOBS_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                tenant TEXT NOT NULL,
+                query TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                worker INTEGER,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                output TEXT,
+                steps TEXT,
+                metrics TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_key TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created);
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            );
+            """)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "attempts" not in columns:
+            self._conn.execute(
+                "ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"
+            )
+        if "run_key" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN run_key TEXT")
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("settings", "steps", "metrics"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def submit(self, tenant, query, settings=None, priority="normal", quotas=None):
+        """Queue a job and return it; raises QuotaExceeded if the tenant's queue is full"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}")
+        quota = quota_for(quotas or {}, tenant)
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE tenant = ? AND status = 'queued'",
+                    (tenant,),
+                ).fetchone()[0]
+                if queued >= quota["max_queued"]:
+                    raise QuotaExceeded(
+                        f"Tenant {tenant!r} already has {queued} queued jobs"
+                    )
+                self._conn.execute(
+                    """INSERT INTO jobs (id, tenant, query, settings, priority, status, created)
+                    VALUES (?, ?, ?, ?, ?, 'queued', ?)""",
+                    (
+                        job_id,
+                        tenant,
+                        query,
+                        json.dumps(settings or {}),
+                        PRIORITIES[priority],
+                        time.time(),
+                    ),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    def claim(self, worker: int, quotas=None):
+        """Mark the next runnable job as running on worker and return it, or None"""
+        quotas = quotas or {}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                running = self._conn.execute("""SELECT tenant, COUNT(*) AS n FROM jobs
+                    WHERE status = 'running' GROUP BY tenant""").fetchall()
+                # Tenants at their concurrency quota wait, whatever their lane
+                full = [
+                    row["tenant"]
+                    for row in running
+                    if row["n"] >= quota_for(quotas, row["tenant"])["max_concurrent"]
+                ]
+                row = self._conn.execute(
+                    f"""SELECT id FROM jobs WHERE status = 'queued'
+                    AND tenant NOT IN ({", ".join("?" * len(full))})
+                    ORDER BY priority, created LIMIT 1""",
+                    full,
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        """UPDATE jobs SET status = 'running', worker = ?, started = ?,
+                        attempts = attempts + 1 WHERE id = ?""",
+                        (worker, time.time(), row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def join_running(self, job_id, run_key):
+        """Tag a running job with run_key and return the id of an identical job
+        already running, which this one should wait for, or None to run it.
+
+        Tagging and checking happen in one transaction, so of two identical
+        jobs the second always finds the first.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """SELECT id FROM jobs WHERE status = 'running' AND run_key = ?
+                    AND id != ? ORDER BY started LIMIT 1""",
+                    (run_key, job_id),
+                ).fetchone()
+                self._conn.execute(
+                    "UPDATE jobs SET run_key = ? WHERE id = ?", (run_key, job_id)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row["id"] if row is not None else None
+
+    def add_event(self, job_id, event_type, data) -> None:
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO job_events (job_id, seq, type, data)
+                SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM job_events WHERE job_id = ?""",
+                (job_id, event_type, json.dumps(data), job_id),
+            )
+
+    def events(self, job_id, after=0) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT seq, type, data FROM job_events
+                WHERE job_id = ? AND seq > ? ORDER BY seq""",
+                (job_id, after),
+            ).fetchall()
+        return [(row["seq"], row["type"], json.loads(row["data"])) for row in rows]
+
+    def finish(self, job_id, output, steps, metrics=None) -> None:
+        with self._lock:
+            self._conn.execute(
+                """UPDATE jobs SET status = 'done', finished = ?, output = ?,
+                steps = ?, metrics = ? WHERE id = ?""",
+                (
+                    time.time(),
+                    output,
+                    json.dumps(steps),
+                    json.dumps(metrics),
+                    job_id,
+                ),
+            )
+        self.add_event(job_id, "done", {"output": output})
+
+    def fail(self, job_id, error) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, error = ? WHERE id = ?",
+                (time.time(), error, job_id),
+            )
+        self.add_event(job_id, "error", {"error": error})
+
+    def cancel(self, job_id) -> bool:
+        """Cancel a job that has not started yet"""
+        with self._lock:
+            cursor = self._conn.execute(
+                """UPDATE jobs SET status = 'cancelled', finished = ?
+                WHERE id = ? AND status = 'queued'""",
+                (time.time(), job_id),
+            )
+        if cursor.rowcount:
+            self.add_event(job_id, "cancelled", {})
+        return bool(cursor.rowcount)
+
+    def requeue(self, worker=None) -> int:
+        """Put jobs of a dead worker (or of every worker, at startup) back in the queue.
+
+        A job that has already started MAX_JOB_ATTEMPTS times is failed
+        instead, so a job that crashes its worker cannot loop forever.
+        """
+        where, params = ("AND worker = ?", [worker]) if worker is not None else ("", [])
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, attempts FROM jobs WHERE status = 'running' {where}",
+                params,
+            ).fetchall()
+            job_ids = [row["id"] for row in rows if row["attempts"] < MAX_JOB_ATTEMPTS]
+            failed = [row["id"] for row in rows if row["attempts"] >= MAX_JOB_ATTEMPTS]
+            for job_id in job_ids:
+                self._conn.execute(
+                    """UPDATE jobs SET status = 'queued', worker = NULL, started = NULL
+                    WHERE id = ?""",
+                    (job_id,),
+                )
+        # Tells streaming clients to discard the partial progress they have shown
+        for job_id in job_ids:
+            self.add_event(job_id, "requeued", {})
+        for job_id in failed:
+            self.fail(
+                job_id, f"The worker running this job died {MAX_JOB_ATTEMPTS} times"
+            )
+        return len(job_ids)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._job(row)
+
+    def stats(self, tenant=None) -> dict:
+        """Job counts by status per tenant, or for one tenant only"""
+        where, params = (
+            ("WHERE tenant = ?", [tenant]) if tenant is not None else ("", [])
+        )
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT tenant, status, COUNT(*) AS n FROM jobs {where}
+                GROUP BY tenant, status""",
+                params,
+            ).fetchall()
+        tenants = {}
+        for row in rows:
+            tenants.setdefault(row["tenant"], {})[row["status"]] = row["n"]
+        return tenants
+
+
+class EventWriter:
+    """Pipeline callbacks that record a job's progress as events"""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+        self._text_sent = 0.0
+
+    def on_text(self, text):
+        # Text arrives per token; storing every one would flood the database
+        now = time.monotonic()
+        if now - self._text_sent >= TEXT_EVENT_INTERVAL:
+            self._text_sent = now
+            self.store.add_event(self.job_id, "text", {"text": text})
+
+    def on_tool_start(self, name, tool_input):
+        self.store.add_event(
+            self.job_id, "tool_start", {"tool": name, "tool_input": tool_input}
+        )
+
+    def on_tool_end(self, name, observation):
+        self.store.add_event(
+            self.job_id, "tool_end", {"tool": name, "output": str(observation)[:2000]}
+        )
+
+
+def _resources(settings, fake=False):
+    """Return (llm, agent_executor) for a job's settings"""
+    if fake:
+        from benchmarks.fakes import FakeChatModel
+
+        from agent import build_agent_executor
+
+        llm = FakeChatModel(script=[], latency=0.2)
+        return llm, build_agent_executor(
+            "fake", llm=FakeChatModel(latency=0.2), verbose=False
+        )
+
+    from agent import agent_pool
+
+    api_key = os.getenv("GOOGLE_API_KEY", "")
+    model_name = settings.get("model_name", "gemini-2.5-flash")
+    temperature = settings.get("temperature", 0.7)
+    max_iterations = settings.get("max_iterations", 10)
+    return (
+        agent_pool.get_llm(api_key, model_name, temperature),
+        agent_pool.get(api_key, model_name, temperature, max_iterations),
+    )
+
+
+def job_settings(job: dict) -> tuple:
+    """The settings an answer depends on, in the order the pages key them"""
+    settings = job["settings"]
+    return (
+        settings.get("model_name", "gemini-2.5-flash"),
+        settings.get("temperature", 0.7),
+        settings.get("max_iterations", 10),
+        settings.get("deep", False),
+    )
+
+
+def _follow(store: JobStore, job: dict, leader_id: str, poll_interval=0.2) -> bool:
+    """Relay an identical running job's events and result to job.
+
+    Returns False if the leader stopped without an answer (its worker died
+    or it was cancelled); job should then run itself.
+    """
+    after = 0
+    while True:
+        leader = store.get(leader_id)
+        for seq, event_type, data in store.events(leader_id, after):
+            after = seq
+            if event_type in ("text", "tool_start", "tool_end"):
+                store.add_event(job["id"], event_type, data)
+        if leader["status"] == "done":
+            store.finish(
+                job["id"], leader["output"], leader["steps"], leader["metrics"]
+            )
+            return True
+        if leader["status"] == "failed":
+            store.fail(job["id"], leader["error"])
+            return True
+        if leader["status"] != "running":
+            # Clients drop the relayed progress, as after a worker restart
+            store.add_event(job["id"], "requeued", {})
+            return False
+        time.sleep(poll_interval)
+
+
+def run_job(store: JobStore, job: dict, fake=False) -> None:
+    """Run one claimed job like the pages do.
+
+    A near-identical question answered earlier in this worker with the same
+    settings is answered from its answer cache. A job identical to one
+    already running on another worker waits for that job and shares its
+    result instead of running the agent again.
+    """
+    from services.cache import normalize_query
+    from services.metrics import record, track_run
+    from services.pipeline import research_pipeline
+    from services.semantic_cache import answer_cache
+
+    events = EventWriter(store, job["id"])
+    settings = job_settings(job)
+    try:
+        cached = answer_cache.lookup(job["query"], settings)
+        if cached:
+            for step in cached["result"]["steps"]:
+                events.on_tool_start(step["tool"], step["tool_input"])
+                events.on_tool_end(step["tool"], step["observation"])
+            store.finish(
+                job["id"], cached["result"]["output"], cached["result"]["steps"]
+            )
+            return
+
+        run_key = json.dumps([normalize_query(job["query"]), *settings])
+        leader_id = store.join_running(job["id"], run_key)
+        if leader_id is not None:
+            record("research_coalesced")
+            if _follow(store, job, leader_id):
+                return
+
+        llm, agent_executor = _resources(job["settings"], fake)
+        with track_run(job["query"], export=False) as run_metrics:
+            result = research_pipeline(
+                job["query"],
+                llm,
+                agent_executor,
+                deep=job["settings"].get("deep", False),
+                on_text=events.on_text,
+                on_tool_start=events.on_tool_start,
+                on_tool_end=events.on_tool_end,
+                config={"callbacks": [run_metrics.handler]},
+            )
+        output = result.get("output", "")
+        steps = serialize_steps(result.get("intermediate_steps", []))
+        store.finish(job["id"], output, steps, run_metrics.to_dict())
+        if output:
+            answer_cache.store(
+                job["query"], {"output": output, "steps": steps}, settings
+            )
+    except Exception as e:
+        store.fail(job["id"], str(e))
+
+
+def install_fake_backends():
+    """Point the search tools at the local fakes used by the benchmarks"""
+    import tools
+    from benchmarks.fakes import FakeDDGS, FakeWikipediaClient
+
+    tools.ddgs_factory = lambda: FakeDDGS(latency=0.1)
+    tools.api_wrapper.wiki_client = FakeWikipediaClient(latency=0.05)
+
+
+def worker_main(path=JOBS_PATH, quotas=None, fake=False, poll_interval=0.2):
+    """Claim and run jobs forever; started by server.py in its own process"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if fake:
+        install_fake_backends()
+    store = JobStore(path)
+    worker = os.getpid()
+    while True:
+        job = store.claim(worker, quotas)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        run_job(store, job, fake)
@@ -0,0 +1,263 @@
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+METRICS_DIR = os.getenv("METRICS_DIR", ".metrics")
+
+_current_run = contextvars.ContextVar("current_run", default=None)
+
+# Static prompt prefixes already sent by this process; repeats are what a
+# prefix cache saves
+_seen_prefixes = set()
+_seen_lock = threading.Lock()
+
+
+def measure_prompt(messages, invocation_params=None) -> dict:
+    """Split a chat prompt's size into its static prefix and the rest.
+
+    The prefix is the system messages plus the tool declarations; it is
+    reused when this process has sent the same prefix before.
+    """
+    params = invocation_params or {}
+    tools = params.get("functions") or params.get("tools") or []
+    system = [m.content for m in messages if m.type == "system"]
+    rest = [m.content for m in messages if m.type != "system"]
+    rest_bytes = len(json.dumps(rest, default=str).encode("utf-8"))
+    prefix_bytes = 0
+    reused = False
+    if system or tools:
+        prefix = json.dumps([system, tools], sort_keys=True, default=str)
+        prefix_bytes = len(prefix.encode("utf-8"))
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        with _seen_lock:
+            reused = key in _seen_prefixes
+            _seen_prefixes.add(key)
+    return {
+        "prompt_bytes": prefix_bytes + rest_bytes,
+        "prefix_bytes": prefix_bytes,
+        "prefix_reused": reused,
+    }
+
+
+class RunMetrics:
+    """Timings, token counts and counters collected for one research run"""
+
+    def __init__(self, query: str):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.query = query
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.counters = Counter()
+        self._open = {}
+        self._lock = threading.Lock()
+        self.handler = MetricsCallbackHandler(self)
+
+    def open_span(self, span_id, kind, name, **fields):
+        with self._lock:
+            self._open[span_id] = {
+                "kind": kind,
+                "name": name,
+                "start": time.perf_counter() - self.start,
+                **fields,
+            }
+
+    def close_span(self, span_id, **fields):
+        with self._lock:
+            span = self._open.pop(span_id, None)
+            if span is None:
+                return
+            span["duration"] = time.perf_counter() - self.start - span["start"]
+            span.update(fields)
+            self.spans.append(span)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+        self.spans.sort(key=lambda span: span["start"])
+
+    def to_dict(self) -> dict:
+        llm_spans = [s for s in self.spans if s["kind"] == "llm"]
+        return {
+            "run_id": self.run_id,
+            "query": self.query,
+            "started_at": self.started_at,
+            "duration": round(self.duration or 0.0, 4),
+            "llm_calls": len(llm_spans),
+            "tool_calls": sum(s["kind"] == "tool" for s in self.spans),
+            "prompt_tokens": sum(s.get("prompt_tokens", 0) for s in llm_spans),
+            "completion_tokens": sum(s.get("completion_tokens", 0) for s in llm_spans),
+            "cached_tokens": sum(s.get("cached_tokens", 0) for s in llm_spans),
+            "prompt_bytes": sum(s.get("prompt_bytes", 0) for s in llm_spans),
+            # Static prefix bytes a prefix cache did not need to process again
+            "prefix_bytes_saved": sum(
+                s.get("prefix_bytes", 0) for s in llm_spans if s.get("prefix_reused")
+            ),
+            "counters": dict(self.counters),
+            "spans": [
+                {
+                    **s,
+                    "start": round(s["start"], 4),
+                    "duration": round(s["duration"], 4),
+                }
+                for s in self.spans
+            ],
+        }
+
+
+def _token_usage(response) -> tuple:
+    """Pull (prompt, completion, cached prompt) token counts out of an LLMResult"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if usage:
+                return (
+                    usage.get("input_tokens", 0),
+                    usage.get("output_tokens", 0),
+                    (usage.get("input_token_details") or {}).get("cache_read", 0),
+                )
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), 0
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Records a span for every LLM and tool call of a run"""
+
+    def __init__(self, run: RunMetrics):
+        self.run = run
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.run.open_span(run_id, "llm", (serialized or {}).get("name", "llm"))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.run.open_span(
+            run_id,
+            "llm",
+            (serialized or {}).get("name", "llm"),
+            **measure_prompt(messages[0], kwargs.get("invocation_params")),
+        )
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_tokens, completion_tokens, cached_tokens = _token_usage(response)
+        self.run.close_span(
+            run_id,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.run.close_span(run_id, error=str(error)[:200])
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self.run.open_span(run_id, "tool", (serialized or {}).get("name", "tool"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self.run.close_span(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.run.close_span(run_id, error=str(error)[:200])
+
+
+class MetricsRegistry:
+    """Process-wide aggregates exported in Prometheus text format"""
+
+    def __init__(self):
+        self.counters = Counter()
+        self.sums = defaultdict(float)
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe_run(self, run: RunMetrics):
+        summary = run.to_dict()
+        with self._lock:
+            self.sums["research_run_seconds"] += summary["duration"]
+            self.counts["research_run_seconds"] += 1
+            self.counters["research_prompt_tokens"] += summary["prompt_tokens"]
+            self.counters["research_completion_tokens"] += summary["completion_tokens"]
+            self.counters["research_cached_tokens"] += summary["cached_tokens"]
+            self.counters["research_prompt_bytes"] += summary["prompt_bytes"]
+            self.counters["research_prefix_bytes_saved"] += summary[
+                "prefix_bytes_saved"
+            ]
+            for span in run.spans:
+                key = f'research_{span["kind"]}_seconds{{name="{span["name"]}"}}'
+                self.sums[key] += span["duration"]
+                self.counts[key] += 1
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name}_total {value}")
+            for key in sorted(self.sums):
+                name, _, labels = key.partition("{")
+                labels = "{" + labels if labels else ""
+                lines.append(f"{name}_sum{labels} {self.sums[key]:.6f}")
+                lines.append(f"{name}_count{labels} {self.counts[key]}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def current_run():
+    """Return the RunMetrics of the run being tracked in this context, if any"""
+    return _current_run.get()
+
+
+def record(name: str, amount: int = 1) -> None:
+    """Count an event (cache hit, retry, ...) globally and for the current run"""
+    registry.increment(f"research_{name}", amount)
+    run = _current_run.get()
+    if run is not None:
+        with run._lock:
+            run.counters[name] += amount
+
+
+def export_run(run: RunMetrics, directory: str = METRICS_DIR) -> None:
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "runs.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(run.to_dict(), ensure_ascii=False) + "\n")
+    # Written atomically so a textfile collector never reads a partial file
+    prom_path = os.path.join(directory, "research.prom")
+    with open(prom_path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(registry.to_prometheus())
+    os.replace(prom_path + ".tmp", prom_path)
+
+
+@contextmanager
+def track_run(query: str, export: bool = True):
+    """Collect metrics for one research run.
+
+    Pass run.handler to the executor's callbacks; events recorded with
+    record() inside the block are attributed to this run.
+    """
+    run = RunMetrics(query)
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+        run.finish()
+        registry.observe_run(run)
+        if export:
+            try:
+                export_run(run)
+            except OSError:
+                pass
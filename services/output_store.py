@@ -0,0 +1,395 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from services.metrics import record
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Seconds flush() waits for the writer before giving up
+FLUSH_TIMEOUT = 10.0
+
+# Seconds between retries of records that could not be written
+RETRY_INTERVAL = 5.0
+
+# Start of every frame, including those written before the store existed
+FRAME_HEADER = re.compile(rb"--- Research Output ---\nTimestamp: ([^\n]*)\n")
+
+
+@contextmanager
+def _locked(path):
+    """Hold an exclusive lock on path, shared by every process using the store"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class OutputStore:
+    """Append-only research output file written by one background thread.
+
+    Each record is written as a single frame in the same human-readable
+    format save_to_txt always produced, and its byte offset is appended to a
+    small JSONL index next to the segment (<file>.idx), so entries can be
+    found by timestamp or query without scanning the data. Writes are
+    batched and fsynced once per batch. The active file is rotated to
+    <name>.<timestamp><ext> once it exceeds max_bytes or max_age seconds.
+
+    Several processes (e.g. the job service's workers) may share a file:
+    each batch is written under an exclusive lock on <file>.lock, starting
+    from the end recorded in the index.
+
+    If a batch cannot be written, the error is reported on stderr and the
+    records are kept and retried every RETRY_INTERVAL seconds and before
+    every later batch. Meanwhile appends are written synchronously, so
+    callers see the error, until a write succeeds again.
+    """
+
+    def __init__(
+        self,
+        path="research_output.txt",
+        max_bytes=64 * 1024 * 1024,
+        max_age=24 * 60 * 60,
+        batch_size=64,
+        flush_interval=0.5,
+    ):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.lock_path = path + ".lock"
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._index = None
+        self._write_lock = threading.Lock()
+        # Records whose write failed, oldest first, retried before new ones
+        self._failed = []
+        self.last_error = None
+
+    def append(self, data: str, query: str = "") -> str:
+        """Queue a record for writing and return its timestamp.
+
+        While writes are failing the record is written before returning,
+        and an OSError is raised if that fails too.
+        """
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if self.last_error is not None:
+            self.flush()
+            if not self._write([(timestamp, query or "", data)], keep=False):
+                raise OSError(f"could not write {self.path}: {self.last_error}")
+            return timestamp
+        self._ensure_writer()
+        self._queue.put((timestamp, query or "", data))
+        return timestamp
+
+    def flush(self, timeout=FLUSH_TIMEOUT) -> bool:
+        """Wait until every queued record has been handled.
+
+        False if timeout passed first or some records are waiting to be
+        retried after a failed write.
+        """
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return not self._failed
+
+    def _ensure_writer(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="output-store-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _open(self):
+        if not os.path.exists(self.index_path) and os.path.exists(self.path):
+            # A file written before the store existed has no index yet
+            self._index_existing()
+        first, last, index_end = self._index_bounds(self.index_path)
+        end = last["offset"] + last["length"] if last else 0
+        self._file = open(self.path, "ab")
+        # Drop a partially written tail left by a crash before it was indexed
+        if self._file.tell() > end:
+            self._file.truncate(end)
+            self._file.seek(end)
+        self._index = open(self.index_path, "ab")
+        # Likewise a partially written index line
+        if self._index.tell() > index_end:
+            self._index.truncate(index_end)
+            self._index.seek(index_end)
+        self._opened_at = (
+            time.mktime(time.strptime(first["timestamp"], "%Y-%m-%d %H:%M:%S"))
+            if first
+            else time.time()
+        )
+
+    @staticmethod
+    def _index_bounds(index_path, tail_size=64 * 1024):
+        """First and last entries of an index and the byte offset where the last
+        of its complete entries ends. Normally reads only the first line and
+        the tail; a damaged tail is scanned from the start like _read_index."""
+        if not os.path.exists(index_path):
+            return None, None, 0
+        with open(index_path, "rb") as f:
+            first_line = f.readline()
+            size = f.seek(0, os.SEEK_END)
+            start = max(0, size - tail_size)
+            f.seek(start)
+            tail = f.read()
+            end = tail.rfind(b"\n") + 1
+            lines = tail[:end].splitlines()
+            try:
+                # A tail starting mid-line needs a complete line after the cut
+                if not lines or (start and len(lines) < 2):
+                    raise ValueError
+                return json.loads(first_line), json.loads(lines[-1]), start + end
+            except ValueError:
+                pass
+            f.seek(0)
+            first = last = None
+            end = 0
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError
+                    last = json.loads(line)
+                except ValueError:
+                    break
+                first = first or last
+                end += len(line)
+            return first, last, end
+
+    def _index_existing(self):
+        """Index every frame of an unindexed data file, keeping all its bytes"""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        starts = [
+            (m.start(), m.group(1).decode("utf-8", "replace"))
+            for m in FRAME_HEADER.finditer(data)
+        ]
+        if not starts or starts[0][0] > 0:
+            # Text before the first frame is kept as an entry of its own
+            modified = datetime.fromtimestamp(os.path.getmtime(self.path))
+            starts.insert(0, (0, modified.strftime("%Y-%m-%d %H:%M:%S")))
+        ends = [offset for offset, _ in starts[1:]] + [len(data)]
+        with open(self.index_path, "w", encoding="utf-8") as index:
+            for (offset, timestamp), end in zip(starts, ends):
+                if end > offset:
+                    entry = {
+                        "timestamp": timestamp,
+                        "query": "",
+                        "offset": offset,
+                        "length": end - offset,
+                    }
+                    index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            index.flush()
+            os.fsync(index.fileno())
+
+    def _close(self):
+        for f in (self._file, self._index):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        self._file = self._index = None
+
+    def _rotate(self):
+        self._file.close()
+        self._index.close()
+        stem, ext = os.path.splitext(self.path)
+        archive = f"{stem}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{ext}"
+        os.replace(self.path, archive)
+        os.replace(self.index_path, archive + ".idx")
+        self._open()
+
+    def _run(self):
+        while True:
+            try:
+                # With records waiting to be retried, wake up to retry them
+                timeout = RETRY_INTERVAL if self._failed else None
+                batch = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                self._write([])
+                continue
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch, keep=True) -> bool:
+        """Write earlier failed records and then batch; True if all were written.
+
+        On failure the records not yet written are kept for a retry, except
+        those of batch when keep is False (the caller reports the error).
+        """
+        with self._write_lock:
+            records = self._failed + batch
+            self._written = 0
+            try:
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with _locked(self.lock_path):
+                    # Reopened for each batch: other processes may have
+                    # appended to or rotated the file since the last one
+                    self._open()
+                    try:
+                        self._write_batch(records)
+                    finally:
+                        self._close()
+            except Exception as e:
+                self.last_error = e
+                pending = records[self._written :]
+                if not keep:
+                    pending = pending[: max(0, len(pending) - len(batch))]
+                self._failed = pending
+                record("output_store_errors")
+                print(
+                    f"Could not write research output to {self.path}: {e}"
+                    + (f" ({len(pending)} records will be retried)" if pending else ""),
+                    file=sys.stderr,
+                )
+                return False
+            self._failed = []
+            self.last_error = None
+            return True
+
+    def _write_batch(self, batch):
+        entries = []
+        for timestamp, query, data in batch:
+            frame = (
+                f"--- Research Output ---\nTimestamp: {timestamp}\n"
+                + (f"Query: {query}\n" if query else "")
+                + f"\n{data}\n\n{'=' * 50}\n\n"
+            ).encode("utf-8")
+            offset = self._file.tell()
+            if offset and (
+                offset + len(frame) > self.max_bytes
+                or time.time() - self._opened_at > self.max_age
+            ):
+                self._sync(entries)
+                entries = []
+                self._rotate()
+                offset = 0
+            self._file.write(frame)
+            entries.append(
+                {
+                    "timestamp": timestamp,
+                    "query": query,
+                    "offset": offset,
+                    "length": len(frame),
+                }
+            )
+        self._sync(entries)
+
+    def _sync(self, entries):
+        # Data reaches disk before the index entries that point at it
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        for entry in entries:
+            line = json.dumps(entry, ensure_ascii=False) + "\n"
+            self._index.write(line.encode("utf-8"))
+        self._index.flush()
+        os.fsync(self._index.fileno())
+        self._written += len(entries)
+
+    @staticmethod
+    def _read_index(index_path):
+        if not os.path.exists(index_path):
+            return []
+        entries = []
+        with open(index_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+        return entries
+
+    def segments(self) -> list:
+        """Data files, newest first"""
+        stem, ext = os.path.splitext(self.path)
+        archives = sorted(glob.glob(f"{glob.escape(stem)}.*{ext}"), reverse=True)
+        active = [self.path] if os.path.exists(self.path) else []
+        return active + [p for p in archives if p != self.path]
+
+    def lookup(self, timestamp=None, query=None, limit=10) -> list:
+        """Find saved entries, newest first.
+
+        timestamp matches as a prefix ("2024-05-01" or "2024-05-01 13:05"),
+        query as a case-insensitive substring of the research question.
+        """
+        self.flush()
+        results = []
+        for segment in self.segments():
+            matches = [
+                entry
+                for entry in reversed(self._read_index(segment + ".idx"))
+                if (timestamp is None or entry["timestamp"].startswith(timestamp))
+                and (query is None or query.lower() in entry["query"].lower())
+            ]
+            if not matches:
+                continue
+            with open(segment, "rb") as f:
+                for entry in matches[: limit - len(results)]:
+                    f.seek(entry["offset"])
+                    text = f.read(entry["length"]).decode("utf-8")
+                    results.append({**entry, "file": segment, "text": text})
+            if len(results) >= limit:
+                break
+        return results
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: str) -> OutputStore:
+    """Return the shared store for a file so all sessions use one writer"""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = OutputStore(path)
+        return _stores[path]
+
+
+@atexit.register
+def _flush_all():
+    for store in list(_stores.values()):
+        store.flush()
@@ -0,0 +1,61 @@
+from services.cassette import (
+    CASSETTE_DIR,
+    cassette_path,
+    current_cassette,
+    recording,
+)
+from services.deep_research import deep_research
+from services.prefetch import prefetching
+from services.router import answer_directly, classify_query
+from services.streaming import stream_research
+
+
+def research_pipeline(
+    query,
+    llm,
+    agent_executor,
+    deep=False,
+    on_text=None,
+    on_tool_start=None,
+    on_tool_end=None,
+    config=None,
+):
+    """Answer a query the way the pages do: deep research, the fast path or the agent.
+
+    Shared by the Streamlit pages and the job service workers. Takes the
+    same callbacks as services.streaming.stream_research. With CASSETTE_DIR
+    set, every run is recorded there for offline replay.
+    """
+    display = dict(
+        on_text=on_text,
+        on_tool_start=on_tool_start,
+        on_tool_end=on_tool_end,
+        config=config,
+    )
+    # Runs started by the cassette CLI are already being recorded or replayed
+    if not CASSETTE_DIR or current_cassette() is not None:
+        return _research(query, llm, agent_executor, deep, display)
+    with recording(
+        query, deep=deep, max_iterations=agent_executor.max_iterations
+    ) as cassette:
+        result = _research(query, llm, agent_executor, deep, display)
+    cassette.header["output"] = result.get("output", "")
+    try:
+        cassette.save(cassette_path())
+    except OSError:
+        pass
+    return result
+
+
+def _research(query, llm, agent_executor, deep, display):
+    if deep:
+        # Sub-questions researched in parallel, one synthesis call
+        return deep_research(llm, query, **display)
+    # Searches for the query start while the first LLM call decides on its own
+    with prefetching(query):
+        # Simple lookups skip the agent loop: one fetch, one LLM call
+        if classify_query(query) == "simple":
+            result = answer_directly(llm, query, **display)
+            if result is not None:
+                return result
+        return stream_research(agent_executor, query, **display)
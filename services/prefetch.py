@@ -0,0 +1,154 @@
+"""Speculative tool prefetch for research runs.
+
+Before the agent's first LLM call decides what to search, the raw query and
+the key entities in it are sent to web search and Wikipedia in the
+background. A prefetch only runs if its backend's rate limit has a token
+free at that moment, so it never delays the agent's own searches. Results
+land in the shared tool cache. A matching agent call is then served from
+the cache, or joins the fetch still in flight. Prefetches still queued when
+the run ends are cancelled. Issued, hit, unused and
+cancelled prefetches are counted in the run metrics.
+"""
+
+import contextvars
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from services.cache import normalize_query
+from services.cassette import current_cassette
+from services.metrics import record
+
+PREFETCH_ENABLED = os.getenv("RESEARCH_PREFETCH", "1").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+
+# Entity lookups prefetched besides the raw query
+MAX_ENTITIES = int(os.getenv("RESEARCH_PREFETCH_ENTITIES", "2"))
+
+# Quoted phrases and runs of capitalized words, e.g. "Ada Lovelace"
+ENTITY_PATTERN = re.compile(r"\"([^\"]+)\"|([A-Z][\w'-]+(?:\s+[A-Z][\w'-]+)*)")
+
+# Capitalized words at the start of a question that are not entities
+QUESTION_WORDS = set(
+    "what who where when why how which is are was were do does did can could "
+    "should tell explain define describe compare list give".split()
+)
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="prefetch")
+
+_active = contextvars.ContextVar("active_prefetch", default=None)
+
+
+def prefetch_queries(query: str) -> list:
+    """The raw query followed by up to MAX_ENTITIES entities found in it"""
+    from services.router import extract_subject
+
+    candidates = [query, extract_subject(query)]
+    candidates += [quoted or caps for quoted, caps in ENTITY_PATTERN.findall(query)]
+    queries = []
+    seen = set()
+    for candidate in candidates:
+        key = normalize_query(candidate)
+        if key and key not in seen and key not in QUESTION_WORDS:
+            seen.add(key)
+            queries.append(candidate.strip())
+    return queries[: 1 + MAX_ENTITIES]
+
+
+def _fetchers() -> dict:
+    from tools import get_tool, prefetch_web_search
+
+    fetchers = {"web_search": prefetch_web_search}
+    wiki = get_tool("wikipedia").api_wrapper
+    # A local index answers quickly enough without a head start
+    if not getattr(wiki.wiki_client, "local", False):
+        fetchers["wikipedia"] = wiki.prefetch
+    return fetchers
+
+
+class Prefetch:
+    """Background fetches started for one run, until the run claims them"""
+
+    def __init__(self):
+        self.pending = {}
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def _fetch(self, fetch, query) -> bool:
+        # A prefetch that only gets a worker after its run ended is dropped
+        if self.closed:
+            return False
+        return fetch(query)
+
+    def submit(self, tool, query, fetch):
+        key = (tool, normalize_query(query))
+        with self._lock:
+            if key in self.pending:
+                return
+            # Errors are left on the future; the agent's own call reports them
+            self.pending[key] = _prefetch_pool.submit(
+                contextvars.copy_context().run, self._fetch, fetch, query
+            )
+        record("prefetch_issued")
+
+    def claim(self, tool, query) -> bool:
+        """Count an agent call matching a prefetch; True if the prefetch had started"""
+        with self._lock:
+            future = self.pending.pop((tool, normalize_query(query)), None)
+        if future is None:
+            return False
+        # Still queued: the agent's call fetches it now, so drop the prefetch
+        if future.cancel():
+            record("prefetch_cancelled")
+            return False
+        # Skipped for want of a rate-limit token: the agent fetches it itself
+        if future.done() and future.exception() is None and not future.result():
+            return False
+        record("prefetch_hits")
+        return True
+
+    def cancel(self):
+        """Cancel queued prefetches and count the fetched ones as unused"""
+        with self._lock:
+            self.closed = True
+            unused, self.pending = self.pending, {}
+        for future in unused.values():
+            if future.cancel():
+                record("prefetch_cancelled")
+            elif not future.done() or future.exception() or future.result():
+                record("prefetch_unused")
+
+
+def claim(tool: str, query: str) -> bool:
+    """Called by the cached tools before each lookup made by a research run"""
+    prefetch = _active.get()
+    return prefetch is not None and prefetch.claim(tool, query)
+
+
+@contextmanager
+def prefetching(query: str):
+    """Prefetch tool results for query while the block runs the research.
+
+    Skipped while a run is recorded or replayed: prefetches race the
+    agent's calls, which would make replays depend on timing.
+    """
+    if not PREFETCH_ENABLED or current_cassette() is not None:
+        yield None
+        return
+    prefetch = Prefetch()
+    fetchers = _fetchers()
+    for prefetch_query in prefetch_queries(query):
+        for tool, fetch in fetchers.items():
+            prefetch.submit(tool, prefetch_query, fetch)
+    # Set after submitting, so the prefetches themselves never claim
+    token = _active.set(prefetch)
+    try:
+        yield prefetch
+    finally:
+        _active.reset(token)
+        prefetch.cancel()
@@ -0,0 +1,136 @@
+"""Static prompt prefix handling for the research agent.
+
+The agent's prompt starts with a static prefix, the system prompt and the
+tool declarations, which is identical for every step of every run. Gemini
+2.5 models reuse such a prefix implicitly. With GEMINI_CONTEXT_CACHE=1 the
+prefix is also stored as an explicit context cache and left out of each
+request. The metrics callback measures how many prompt bytes the prefix
+accounts for on every call (see services.metrics.measure_prompt).
+"""
+
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.messages import SystemMessage
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from services.metrics import record
+
+CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+
+class ContextCache:
+    """Explicit Gemini context cache holding the agent's system prompt and tools.
+
+    Created on first use and recreated shortly before it expires. If the
+    API refuses it, for example because the prefix is below the model's
+    minimum cacheable size, name() returns None for one TTL and requests
+    carry the prefix as usual.
+    """
+
+    def __init__(self, api_key, model, system_prompt, functions, ttl=CONTEXT_CACHE_TTL):
+        self.api_key = api_key
+        self.model = model
+        self.system_prompt = system_prompt
+        self.functions = functions
+        self.ttl = ttl
+        self._name = None
+        self._expires = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def _create(self):
+        from google.ai.generativelanguage_v1beta import CacheServiceClient
+        from google.ai.generativelanguage_v1beta.types import (
+            CachedContent,
+            Content,
+            Part,
+        )
+        from langchain_google_genai._function_utils import (
+            convert_to_genai_function_declarations,
+        )
+
+        client = CacheServiceClient(client_options={"api_key": self.api_key})
+        cache = client.create_cached_content(
+            cached_content=CachedContent(
+                model=self.model,
+                system_instruction=Content(parts=[Part(text=self.system_prompt)]),
+                tools=[convert_to_genai_function_declarations(self.functions)],
+                ttl={"seconds": self.ttl},
+            )
+        )
+        return cache.name
+
+    def name(self) -> Optional[str]:
+        with self._lock:
+            if time.monotonic() < self._retry_at:
+                return None
+            # Renew a minute early so no request races the expiry
+            if self._name is None or time.monotonic() > self._expires - 60:
+                try:
+                    self._name = self._create()
+                    self._expires = time.monotonic() + self.ttl
+                    record("context_cache_created")
+                except Exception:
+                    self._retry_at = time.monotonic() + self.ttl
+                    record("context_cache_unavailable")
+                    return None
+            return self._name
+
+
+class PrefixCachedChatModel(ChatGoogleGenerativeAI):
+    """Gemini chat model that sends its static prefix through a ContextCache.
+
+    While the cache is available the system messages and tool declarations
+    are dropped from each request, since the cache already holds them.
+    """
+
+    context_cache: Optional[Any] = None
+
+    def _prepare_request(
+        self,
+        messages,
+        *,
+        tools=None,
+        functions=None,
+        tool_config=None,
+        tool_choice=None,
+        cached_content=None,
+        **kwargs,
+    ):
+        name = None
+        if self.context_cache is not None and not cached_content:
+            name = self.context_cache.name()
+        if name is None:
+            return super()._prepare_request(
+                messages,
+                tools=tools,
+                functions=functions,
+                tool_config=tool_config,
+                tool_choice=tool_choice,
+                cached_content=cached_content,
+                **kwargs,
+            )
+        return super()._prepare_request(
+            [m for m in messages if not isinstance(m, SystemMessage)],
+            tool_config=tool_config,
+            cached_content=name,
+            **kwargs,
+        )
+
+
+def with_context_cache(llm, api_key, system_prompt, functions):
+    """Return a copy of llm that reads the agent's prefix from a context cache.
+
+    Other models (fakes, replays) are returned unchanged. A recording
+    wrapper is kept around the cached model.
+    """
+    inner = getattr(llm, "inner", llm)
+    if not isinstance(inner, PrefixCachedChatModel):
+        return llm
+    cache = ContextCache(api_key, inner.model, system_prompt, functions)
+    cached = inner.model_copy(update={"context_cache": cache})
+    return llm.model_copy(update={"inner": cached}) if inner is not llm else cached
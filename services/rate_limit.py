@@ -0,0 +1,215 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from services.metrics import record
+
+# Requests per second and burst size per backend, overridable with
+# RATE_LIMIT_<BACKEND>="<rate>,<burst>" (e.g. RATE_LIMIT_GEMINI="0.2,3")
+DEFAULT_LIMITS = {
+    "gemini": (0.5, 5),
+    "ddgs": (1.0, 3),
+    "wikipedia": (5.0, 10),
+}
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    if getattr(exc, "code", None) == 429 or getattr(exc, "status_code", None) == 429:
+        return True
+    text = f"{type(exc).__name__} {exc}".lower()
+    return any(
+        marker in text
+        for marker in (
+            "429",
+            "ratelimit",
+            "rate limit",
+            "resourceexhausted",
+            "resource_exhausted",
+        )
+    )
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """Rate limits and transient network failures are worth retrying"""
+    if is_rate_limit_error(exc) or isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    name = type(exc).__name__
+    return "Timeout" in name or name in ("ServiceUnavailable", "ConnectionError")
+
+
+class TokenBucket:
+    """Thread-safe token bucket with a shared, jittered exponential backoff.
+
+    Every caller of a backend draws from the same bucket. When a call fails
+    with a retryable error the whole bucket pauses, so concurrent callers
+    back off together instead of hammering a backend that is pushing back.
+    """
+
+    def __init__(self, name, rate, capacity, base_delay=1.0, max_delay=30.0):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.tokens = float(capacity)
+        self.waiting = 0
+        self.retries = 0
+        self.strikes = 0
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def _wait_time(self, now):
+        """Seconds until a token is available, 0 if one can be taken now"""
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def try_acquire(self, reserve=0) -> bool:
+        """Take a token if one is free now and reserve more would still be left"""
+        with self._cond:
+            if self._wait_time(time.monotonic()) == 0 and self.tokens >= 1 + reserve:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self, blocking=True, timeout=None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._wait_time(now)
+                    if wait == 0:
+                        self.tokens -= 1
+                        return True
+                    if not blocking or (deadline is not None and now >= deadline):
+                        return False
+                    if deadline is not None:
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                self.waiting -= 1
+
+    def record_failure(self) -> float:
+        """Pause the bucket for a jittered, exponentially growing delay"""
+        with self._cond:
+            self.strikes += 1
+            self.retries += 1
+            delay = min(self.max_delay, self.base_delay * 2 ** (self.strikes - 1))
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            return delay
+
+    def record_success(self) -> None:
+        with self._cond:
+            self.strikes = 0
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "tokens": round(self.tokens, 2),
+                "queue_depth": self.waiting,
+                "retries": self.retries,
+                "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            }
+
+
+def _limits_for(name):
+    rate, capacity = DEFAULT_LIMITS.get(name, (1.0, 1))
+    override = os.getenv(f"RATE_LIMIT_{name.upper()}")
+    if override:
+        rate, capacity = override.split(",")
+    return float(rate), int(capacity)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(name: str) -> TokenBucket:
+    """Return the process-wide bucket for a backend"""
+    with _buckets_lock:
+        if name not in _buckets:
+            _buckets[name] = TokenBucket(name, *_limits_for(name))
+        return _buckets[name]
+
+
+def queue_depths() -> dict:
+    with _buckets_lock:
+        return {name: bucket.waiting for name, bucket in _buckets.items()}
+
+
+def call_with_backoff(backend: str, func, *args, retries=3, acquired=False, **kwargs):
+    """Call func through the backend's bucket, retrying retryable errors in place.
+
+    acquired=True means the caller already took a token for the first attempt.
+    """
+    bucket = get_bucket(backend)
+    attempt = 0
+    while True:
+        if not acquired:
+            bucket.acquire()
+        acquired = False
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or not is_retryable_error(e):
+                raise
+            attempt += 1
+            # The next acquire() waits out the pause this sets
+            bucket.record_failure()
+            record("retries")
+            continue
+        bucket.record_success()
+        return result
+
+
+class BucketRateLimiter(BaseRateLimiter):
+    """Adapter that lets LangChain chat models draw from a TokenBucket"""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        return self.bucket.acquire(blocking=blocking)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        while not self.bucket.try_acquire():
+            if not blocking:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+
+class BackoffCallbackHandler(BaseCallbackHandler):
+    """Feeds LLM successes and rate-limit failures back into a TokenBucket"""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        self.bucket.record_success()
+
+    def on_llm_error(self, error, **kwargs) -> None:
+        if is_retryable_error(error):
+            self.bucket.record_failure()
+            record("retries")
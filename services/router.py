@@ -0,0 +1,118 @@
+import re
+
+from langchain_core.agents import AgentAction
+
+from tools import safe_search, wiki_tool
+
+# Words that signal a question needs several lookups or current information
+COMPLEX_MARKERS = set(
+    "affect analyse analysis analyze best between compare comparison cons "
+    "current difference effect effects future how impact importance latest "
+    "news pros recent role should significance today trend trends versus vs "
+    "why".split()
+)
+
+# Words and years that ask for the state of things now: an encyclopedia
+# lookup would answer these with stale facts, so they go to the agent
+RECENCY_MARKERS = set(
+    "now latest today tonight yesterday tomorrow current currently recent "
+    "recently news price prices forecast weather upcoming".split()
+)
+YEAR = re.compile(r"\b(1[5-9]|20)\d\d\b")
+
+# Lowercase words allowed inside a name, as in "Treaty of Versailles"
+NAME_CONNECTORS = set("of the de la von van da del du".split())
+
+MAX_ENTITY_WORDS = 4
+
+SIMPLE_PREFIX = re.compile(
+    r"^(what|who|where|when)\s+(is|are|was|were)\s+(a\s+|an\s+|the\s+)?"
+    r"|^(define|definition of|tell me about|explain)\s+(a\s+|an\s+|the\s+)?",
+    re.IGNORECASE,
+)
+
+MAX_SIMPLE_WORDS = 10
+
+NO_WIKI_RESULT = "No good Wikipedia Search Result was found"
+
+FAST_PATH_PROMPT = """You are a helpful research assistant. Answer the question using the sources below. If the sources do not fully answer it, say what is missing.
+
+Question: {question}
+
+Sources:
+{sources}
+
+Provide a clear, well-formatted answer."""
+
+
+def extract_subject(query: str) -> str:
+    """Strip the question wording, leaving the entity to look up"""
+    subject = SIMPLE_PREFIX.sub("", query.strip())
+    return subject.rstrip("?!. ") or query
+
+
+def _looks_like_name(query: str) -> bool:
+    """A short capitalized phrase such as "Ada Lovelace" or "Treaty of Versailles" """
+    words = query.strip().rstrip("?!. ").split()
+    if not words or len(words) > MAX_ENTITY_WORDS or not words[0][:1].isupper():
+        return False
+    return all(word[:1].isupper() or word in NAME_CONNECTORS for word in words)
+
+
+def classify_query(query: str) -> str:
+    """Return "simple" for single-entity factual lookups, otherwise "complex".
+
+    Simple means a definitional question ("What is ...", "Who was ...",
+    "Define ...") or a bare name, with nothing asking for current
+    information, comparisons or several parts.
+    """
+    words = re.findall(r"[a-z0-9']+", query.lower())
+    if not words or len(words) > MAX_SIMPLE_WORDS:
+        return "complex"
+    if COMPLEX_MARKERS.intersection(words) or query.count("?") > 1:
+        return "complex"
+    if RECENCY_MARKERS.intersection(words) or YEAR.search(query):
+        return "complex"
+    if " and " in f" {query.lower()} " or "," in query:
+        return "complex"
+    if SIMPLE_PREFIX.match(query.strip()) or _looks_like_name(query):
+        return "simple"
+    return "complex"
+
+
+def answer_directly(
+    llm, query, on_text=None, on_tool_start=None, on_tool_end=None, config=None
+):
+    """Answer with one lookup and one LLM call instead of the agent loop.
+
+    Takes the same callbacks as services.streaming.stream_research. Returns
+    a result dict shaped like the executor's, or None when no source was
+    found and the question should go to the full agent.
+    """
+    subject = extract_subject(query)
+
+    tool_name, observation = "wikipedia", wiki_tool.run(subject)
+    if observation.startswith(NO_WIKI_RESULT):
+        tool_name, observation = "web_search", safe_search(query)
+        if observation.startswith(("No search results", "Search error")):
+            return None
+
+    tool_input = subject if tool_name == "wikipedia" else query
+    if on_tool_start:
+        on_tool_start(tool_name, tool_input)
+    if on_tool_end:
+        on_tool_end(tool_name, observation)
+
+    prompt = FAST_PATH_PROMPT.format(question=query, sources=observation)
+    text = ""
+    for chunk in llm.stream(prompt, config=config):
+        text += chunk.content if isinstance(chunk.content, str) else ""
+        if on_text and text:
+            on_text(text)
+
+    action = AgentAction(tool=tool_name, tool_input=tool_input, log="fast path")
+    return {
+        "input": query,
+        "output": text,
+        "intermediate_steps": [(action, observation)],
+    }
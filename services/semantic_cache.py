@@ -0,0 +1,153 @@
+import hashlib
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from services.metrics import record
+
+STOPWORDS = set(
+    "a an and are as about at be by can could did do does for from how i in is "
+    "it me of on or please tell that the this to was what when where which who "
+    "why with you".split()
+)
+
+
+def tokenize(text: str) -> list:
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return [w for w in words if w not in STOPWORDS]
+
+
+class HashingEmbedder:
+    """Deterministic local embedder based on hashed word unigrams and bigrams.
+
+    Implements the embed_query interface of LangChain embeddings, so any
+    LangChain embedding model (e.g. GoogleGenerativeAIEmbeddings) can be
+    passed to SemanticCache instead.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> int:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.dim
+
+    def embed_query(self, text: str) -> list:
+        words = tokenize(text)
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            vector[self._bucket(feature)] += 1.0
+        return vector.tolist()
+
+
+class SemanticCache:
+    """Answer cache that matches new queries to past ones by cosine similarity.
+
+    Embeddings live in one preallocated float32 matrix, so a lookup is a
+    single matrix-vector product. When full, the least recently used entry
+    is overwritten. Entries are stored with the settings that produced them
+    (e.g. model, temperature and deep mode) and only match lookups made
+    with equal settings.
+    """
+
+    def __init__(
+        self, embedder=None, threshold=0.9, max_entries=1000, ttl=24 * 60 * 60
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._entries = [None] * max_entries
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        # Per slot, a small integer standing for the entry's settings
+        self._settings = np.full(max_entries, -1, dtype=np.int32)
+        self._settings_ids = {}
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embedder.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query: str, settings=None):
+        """Return {"query", "result", "similarity"} for the closest fresh match
+        stored with the same settings, or None"""
+        vector = self._embed(query)
+        now = time.time()
+        with self._lock:
+            settings_id = self._settings_ids.get(settings)
+            if self._vectors is None or not vector.any() or settings_id is None:
+                self.misses += 1
+                return None
+
+            similarities = np.where(
+                self._settings == settings_id, self._vectors @ vector, -1.0
+            )
+            best = int(np.argmax(similarities))
+            entry = self._entries[best]
+            if (
+                entry is None
+                or similarities[best] < self.threshold
+                or now - entry["created"] > self.ttl
+            ):
+                self.misses += 1
+                return None
+
+            self._last_used[best] = now
+            self.hits += 1
+            record("answer_cache_hits")
+            return {
+                "query": entry["query"],
+                "result": entry["result"],
+                "similarity": float(similarities[best]),
+            }
+
+    def store(self, query: str, result: dict, settings=None) -> None:
+        vector = self._embed(query)
+        if not vector.any():
+            return
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros(
+                    (self.max_entries, len(vector)), dtype=np.float32
+                )
+
+            # Empty slots have a last-used time of 0, so they are filled first
+            slot = int(np.argmin(self._last_used))
+            self._vectors[slot] = vector
+            self._entries[slot] = {"query": query, "result": result, "created": now}
+            self._last_used[slot] = now
+            self._settings[slot] = self._settings_ids.setdefault(
+                settings, len(self._settings_ids)
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors = None
+            self._entries = [None] * self.max_entries
+            self._last_used[:] = 0
+            self._settings[:] = -1
+            self._settings_ids = {}
+
+    def stats(self) -> dict:
+        return {
+            "entries": sum(entry is not None for entry in self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+answer_cache = SemanticCache(
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+)
@@ -0,0 +1,252 @@
+import atexit
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from services.metrics import record
+
+# Observations larger than this are written to disk and replaced by a handle
+SPILL_THRESHOLD_BYTES = int(os.getenv("SPILL_THRESHOLD_BYTES", "1024"))
+
+# Disk space and age limits for spilled files; the oldest go first
+SPILL_MAX_BYTES = int(float(os.getenv("SPILL_MAX_MB", "256")) * 1024 * 1024)
+SPILL_MAX_AGE = float(os.getenv("SPILL_MAX_AGE", str(24 * 60 * 60)))
+
+# Global budget for per-session data such as the last research result
+MEMORY_BUDGET_BYTES = int(float(os.getenv("MEMORY_BUDGET_MB", "64")) * 1024 * 1024)
+
+# Characters of a spilled observation kept in memory for display
+PREVIEW_CHARS = 300
+
+
+class SpilledText:
+    """Handle to a large text stored on disk; str() gives a short preview"""
+
+    __slots__ = ("path", "size", "preview")
+
+    def __init__(self, path, size, preview):
+        self.path = path
+        self.size = size
+        self.preview = preview
+
+    def read(self) -> str:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            # The spill directory was cleared; the preview is all that is left
+            return self.preview
+
+    def __str__(self):
+        return self.preview
+
+    def __repr__(self):
+        return f"SpilledText({self.path!r}, size={self.size})"
+
+
+def estimate_size(value) -> int:
+    """Approximate bytes held by a result: text lengths plus container overhead"""
+    if isinstance(value, str):
+        return len(value) + 49
+    if isinstance(value, SpilledText):
+        return len(value.preview) + 100
+    if isinstance(value, dict):
+        return 64 + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(estimate_size(item) for item in value)
+    if hasattr(value, "tool_input"):
+        # AgentAction and friends
+        return 100 + estimate_size(value.tool_input) + estimate_size(value.log)
+    return sys.getsizeof(value)
+
+
+class SpillStore:
+    """Content-addressed temporary files for tool observations.
+
+    Files are shared by every result and session that spilled the same
+    text, so they are not removed when one session lets go of them. They
+    are swept instead: least recently spilled first, once the directory
+    exceeds max_bytes or a file is older than max_age seconds. A handle
+    whose file was swept reads as its preview.
+    """
+
+    def __init__(
+        self,
+        directory=None,
+        threshold=SPILL_THRESHOLD_BYTES,
+        max_bytes=SPILL_MAX_BYTES,
+        max_age=SPILL_MAX_AGE,
+    ):
+        # Always a private subdirectory, so clear() never touches other files
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="research-spill-", dir=directory)
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.spilled = 0
+        self.bytes_spilled = 0
+        self.disk_bytes = 0
+        self.swept = 0
+        # path -> (size, last spilled), least recently spilled first
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def spill(self, text):
+        """Return text unchanged if small, otherwise a SpilledText handle"""
+        if not isinstance(text, str) or len(text) < self.threshold:
+            return text
+        data = text.encode("utf-8")
+        path = os.path.join(self.directory, hashlib.sha1(data).hexdigest() + ".txt")
+        with self._lock:
+            if path in self._files and os.path.exists(path):
+                self._files.move_to_end(path)
+            else:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                old = self._files.pop(path, None)
+                self.disk_bytes += len(data) - (old[0] if old else 0)
+            self._files[path] = (len(data), time.monotonic())
+            self._sweep()
+            self.spilled += 1
+            self.bytes_spilled += len(data)
+        record("spilled_observations")
+        return SpilledText(path, len(data), text[:PREVIEW_CHARS])
+
+    def _sweep(self):
+        # The file just spilled is last, and always kept
+        cutoff = time.monotonic() - self.max_age
+        while len(self._files) > 1:
+            path, (size, spilled_at) = next(iter(self._files.items()))
+            if self.disk_bytes <= self.max_bytes and spilled_at >= cutoff:
+                break
+            del self._files[path]
+            self.disk_bytes -= size
+            self.swept += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            record("spill_files_swept")
+
+    def spill_result(self, result: dict) -> dict:
+        """Copy of an executor result with large observations moved to disk"""
+        return {
+            **result,
+            "intermediate_steps": [
+                (action, self.spill(observation))
+                for action, observation in result.get("intermediate_steps", [])
+            ],
+        }
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+            self.disk_bytes = 0
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {
+            "spilled": self.spilled,
+            "bytes_spilled": self.bytes_spilled,
+            "disk_bytes": self.disk_bytes,
+            "files": len(self._files),
+            "swept": self.swept,
+        }
+
+
+class _SessionHandle:
+    __slots__ = ("session_id", "__weakref__")
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+
+
+class SessionMemory:
+    """Per-session values kept under one global byte budget.
+
+    Values are charged to their session by estimate_size. When the total
+    exceeds the budget, the least recently used values of any session are
+    evicted, so a single heavy session cannot starve the others. A
+    session's values are dropped when its handle() is garbage collected.
+    """
+
+    def __init__(self, budget=MEMORY_BUDGET_BYTES):
+        self.budget = budget
+        self.total = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, session_id, key, value) -> None:
+        size = estimate_size(value)
+        with self._lock:
+            old = self._entries.pop((session_id, key), None)
+            if old is not None:
+                self.total -= old[1]
+            self._entries[(session_id, key)] = (value, size)
+            self.total += size
+            # The value just stored is kept even if it alone exceeds the budget
+            while self.total > self.budget and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total -= evicted_size
+                self.evictions += 1
+                record("session_evictions")
+
+    def get(self, session_id, key, default=None):
+        with self._lock:
+            entry = self._entries.get((session_id, key))
+            if entry is None:
+                return default
+            self._entries.move_to_end((session_id, key))
+            return entry[0]
+
+    def drop_session(self, session_id) -> None:
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == session_id]:
+                self.total -= self._entries.pop(entry_key)[1]
+
+    def handle(self, session_id):
+        """Object that drops session_id's values once it is garbage collected.
+
+        Keep it in the session's own state (st.session_state), so the values
+        go when Streamlit discards the session rather than waiting for the
+        budget to evict them.
+        """
+        handle = _SessionHandle(session_id)
+        weakref.finalize(handle, self.drop_session, session_id)
+        return handle
+
+    def usage(self, session_id) -> int:
+        """Bytes currently charged to session_id"""
+        with self._lock:
+            return sum(
+                size
+                for (sid, _), (_, size) in self._entries.items()
+                if sid == session_id
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len({sid for sid, _ in self._entries}),
+                "entries": len(self._entries),
+                "bytes": self.total,
+                "budget": self.budget,
+                "evictions": self.evictions,
+            }
+
+
+spill_store = SpillStore(os.getenv("SPILL_DIR") or None)
+session_memory = SessionMemory()
+
+atexit.register(spill_store.clear)
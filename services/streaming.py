@@ -0,0 +1,65 @@
+import asyncio
+
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    # Some models stream a list of content parts instead of a plain string
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in content
+    )
+
+
+async def astream_research(
+    agent_executor,
+    query,
+    on_text=None,
+    on_tool_start=None,
+    on_tool_end=None,
+    config=None,
+):
+    """Run the agent via astream_events, reporting tokens and tool calls as they happen.
+
+    on_text receives the text generated so far by the current LLM call,
+    on_tool_start receives (tool_name, tool_input) and on_tool_end receives
+    (tool_name, output). config is passed through to the executor, e.g. to
+    attach callbacks. Returns the executor's final result dict.
+    """
+    result = None
+    text = ""
+
+    async for event in agent_executor.astream_events(
+        {"input": query}, config=config, version="v2"
+    ):
+        kind = event["event"]
+
+        if kind == "on_chat_model_start":
+            text = ""
+        elif kind == "on_chat_model_stream":
+            token = _chunk_text(event["data"]["chunk"])
+            if token:
+                text += token
+                if on_text:
+                    on_text(text)
+        elif event.get("parent_ids"):
+            continue
+        elif kind == "on_chain_stream":
+            # The executor streams planned actions, then their observations
+            chunk = event["data"]["chunk"]
+            for action in chunk.get("actions", []):
+                if on_tool_start:
+                    on_tool_start(action.tool, action.tool_input)
+            for step in chunk.get("steps", []):
+                if on_tool_end:
+                    on_tool_end(step.action.tool, step.observation)
+        elif kind == "on_chain_end":
+            result = event["data"].get("output")
+
+    return result or {}
+
+
+def stream_research(agent_executor, query, **callbacks):
+    """Blocking wrapper around astream_research for Streamlit's script thread"""
+    return asyncio.run(astream_research(agent_executor, query, **callbacks))
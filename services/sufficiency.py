@@ -0,0 +1,219 @@
+"""Early termination for the research agent loop.
+
+SufficiencyAgent plans like the normal agent but first checks whether
+more research is worth it. It stops when the last observations added
+little new text, when the model repeats a search it already made, or when
+the run's estimated prompt tokens would exceed the budget. It then writes
+the final answer from the findings so far in one LLM call. The executor's
+max_iterations and max_execution_time limits end in the same answer
+instead of a canned "Agent stopped" message; SufficiencyExecutor passes
+the run's callbacks to that answer, which the plain AgentExecutor does not.
+"""
+
+import os
+from contextvars import ContextVar
+from typing import Any
+
+from langchain.agents.agent import AgentExecutor, RunnableAgent
+from langchain_core.agents import AgentAction, AgentFinish
+
+from services.compression import estimate_tokens
+from services.metrics import record
+from services.semantic_cache import tokenize
+
+# An observation whose share of new word pairs is below MIN_INFORMATION_GAIN
+# adds little; GAIN_PATIENCE such observations in a row end the research
+MIN_INFORMATION_GAIN = float(os.getenv("RESEARCH_MIN_GAIN", "0.15"))
+GAIN_PATIENCE = int(os.getenv("RESEARCH_GAIN_PATIENCE", "2"))
+
+# Estimated prompt tokens and seconds one agent run may spend
+RESEARCH_TOKEN_BUDGET = int(os.getenv("RESEARCH_TOKEN_BUDGET", "50000"))
+RESEARCH_TIME_BUDGET = float(os.getenv("RESEARCH_TIME_BUDGET", "90"))
+
+# Word overlap at which two queries to the same tool count as one search
+DUPLICATE_THRESHOLD = 0.8
+
+RESEARCH_TOOLS = {"combined_research", "web_search", "wikipedia"}
+
+# A combined_research query already covers the same web and Wikipedia searches
+COVERED_BY = {"web_search": "combined_research", "wikipedia": "combined_research"}
+
+FINAL_ANSWER_PROMPT = """You are a helpful research assistant. Research on the question below has stopped. Answer it as well as the findings allow. Cite sources where the findings give them, and say what is still missing.
+
+Question: {question}
+
+Findings:
+{findings}
+
+Provide a comprehensive answer with proper formatting."""
+
+# Callbacks of the executor run in progress, for its forced final answer
+_run_callbacks = ContextVar("run_callbacks", default=None)
+
+
+def _shingles(text: str) -> set:
+    words = tokenize(text)
+    return set(zip(words, words[1:])) or set(words)
+
+
+def information_gains(intermediate_steps) -> list:
+    """Share of new word pairs in each research observation, in order"""
+    seen = set()
+    gains = []
+    for action, observation in intermediate_steps:
+        if action.tool not in RESEARCH_TOOLS:
+            continue
+        shingles = _shingles(str(observation))
+        gains.append(len(shingles - seen) / len(shingles) if shingles else 0.0)
+        seen |= shingles
+    return gains
+
+
+def _same_search(a: str, b: str) -> bool:
+    words_a, words_b = set(tokenize(a)), set(tokenize(b))
+    if not words_a or not words_b:
+        return a.strip().lower() == b.strip().lower()
+    return len(words_a & words_b) / len(words_a | words_b) >= DUPLICATE_THRESHOLD
+
+
+def is_repeat(action, intermediate_steps) -> bool:
+    """Whether a planned tool call repeats, or is covered by, an earlier one"""
+    if action.tool not in RESEARCH_TOOLS:
+        return False
+    tools = {action.tool, COVERED_BY.get(action.tool)}
+    return any(
+        earlier.tool in tools
+        and _same_search(str(earlier.tool_input), str(action.tool_input))
+        for earlier, _ in intermediate_steps
+    )
+
+
+def estimated_run_tokens(base_tokens: int, intermediate_steps) -> int:
+    """Prompt tokens the run has sent, plus the next call, estimated from its steps.
+
+    Every call re-sends the prompt and the scratchpad built so far.
+    """
+    total = base_tokens
+    scratchpad = 0
+    for action, observation in intermediate_steps:
+        scratchpad += estimate_tokens(f"{action.log}{action.tool_input}{observation}")
+        total += base_tokens + scratchpad
+    return total
+
+
+def format_findings(intermediate_steps) -> str:
+    findings = [
+        f"[{action.tool}: {action.tool_input}]\n{observation}"
+        for action, observation in intermediate_steps
+        if action.tool in RESEARCH_TOOLS
+    ]
+    return "\n\n".join(findings) or "(no findings)"
+
+
+class SufficiencyAgent(RunnableAgent):
+    """RunnableAgent that stops researching once more steps stop paying off"""
+
+    answer_llm: Any = None
+    prompt_tokens: int = 0
+
+    def stop_reason(self, intermediate_steps, question):
+        gains = information_gains(intermediate_steps)
+        recent = gains[-GAIN_PATIENCE:]
+        # The first observation is all new, so it never counts towards patience
+        if len(gains) > GAIN_PATIENCE and max(recent) < MIN_INFORMATION_GAIN:
+            return "low_gain"
+        base = self.prompt_tokens + estimate_tokens(question)
+        if estimated_run_tokens(base, intermediate_steps) > RESEARCH_TOKEN_BUDGET:
+            return "token_budget"
+        return None
+
+    def _final_prompt(self, intermediate_steps, question, reason):
+        record("early_stops")
+        record(f"early_stop_{reason}")
+        return FINAL_ANSWER_PROMPT.format(
+            question=question, findings=format_findings(intermediate_steps)
+        )
+
+    @staticmethod
+    def _finish(message, reason):
+        text = message.content if isinstance(message.content, str) else ""
+        if not text:
+            return None
+        return AgentFinish({"output": text}, f"Stopped early ({reason})")
+
+    def plan(self, intermediate_steps, callbacks=None, **kwargs):
+        question = kwargs.get("input", "")
+        reason = self.stop_reason(intermediate_steps, question)
+        decision = None
+        if reason is None:
+            decision = super().plan(intermediate_steps, callbacks, **kwargs)
+            if not (
+                isinstance(decision, AgentAction)
+                and is_repeat(decision, intermediate_steps)
+            ):
+                return decision
+            reason = "repeat"
+        prompt = self._final_prompt(intermediate_steps, question, reason)
+        message = self.answer_llm.invoke(prompt, config={"callbacks": callbacks})
+        # A model that returns no text keeps researching instead
+        return (
+            self._finish(message, reason)
+            or decision
+            or super().plan(intermediate_steps, callbacks, **kwargs)
+        )
+
+    async def aplan(self, intermediate_steps, callbacks=None, **kwargs):
+        question = kwargs.get("input", "")
+        reason = self.stop_reason(intermediate_steps, question)
+        decision = None
+        if reason is None:
+            decision = await super().aplan(intermediate_steps, callbacks, **kwargs)
+            if not (
+                isinstance(decision, AgentAction)
+                and is_repeat(decision, intermediate_steps)
+            ):
+                return decision
+            reason = "repeat"
+        prompt = self._final_prompt(intermediate_steps, question, reason)
+        message = await self.answer_llm.ainvoke(prompt, config={"callbacks": callbacks})
+        return (
+            self._finish(message, reason)
+            or decision
+            or await super().aplan(intermediate_steps, callbacks, **kwargs)
+        )
+
+    def return_stopped_response(
+        self, early_stopping_method, intermediate_steps, **kwargs
+    ):
+        """Answer from the findings when the iteration or time limit is hit"""
+        question = kwargs.get("input", "")
+        prompt = self._final_prompt(intermediate_steps, question, "limit")
+        config = {"callbacks": _run_callbacks.get()}
+        try:
+            finish = self._finish(
+                self.answer_llm.invoke(prompt, config=config), "limit"
+            )
+        except Exception:
+            finish = None
+        return finish or super().return_stopped_response(
+            early_stopping_method, intermediate_steps, **kwargs
+        )
+
+
+class SufficiencyExecutor(AgentExecutor):
+    """AgentExecutor whose limit-forced final answer reports to the run's
+    callbacks (metrics, waterfall, token budget) like every other step"""
+
+    def _call(self, inputs, run_manager=None):
+        token = _run_callbacks.set(run_manager.get_child() if run_manager else None)
+        try:
+            return super()._call(inputs, run_manager=run_manager)
+        finally:
+            _run_callbacks.reset(token)
+
+    async def _acall(self, inputs, run_manager=None):
+        token = _run_callbacks.set(run_manager.get_child() if run_manager else None)
+        try:
+            return await super()._acall(inputs, run_manager=run_manager)
+        finally:
+            _run_callbacks.reset(token)
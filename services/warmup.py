@@ -0,0 +1,29 @@
+import sys
+import threading
+
+_started = False
+_lock = threading.Lock()
+
+
+def warm_agent(api_key, model_name, temperature, max_iterations):
+    """Import the agent stack and start building its executor off the script thread.
+
+    Importing LangChain and the Gemini client takes seconds, so the page
+    renders first and the research request usually finds everything loaded.
+    """
+    global _started
+    if "agent" in sys.modules and hasattr(sys.modules["agent"], "agent_pool"):
+        sys.modules["agent"].agent_pool.warm(
+            api_key, model_name, temperature, max_iterations
+        )
+        return
+
+    def load():
+        from agent import agent_pool
+
+        agent_pool.warm(api_key, model_name, temperature, max_iterations)
+
+    with _lock:
+        if not _started:
+            _started = True
+            threading.Thread(target=load, name="agent-import", daemon=True).start()
@@ -0,0 +1,377 @@
+"""Offline Wikipedia backend: a memory-mapped inverted index with BM25 ranking.
+
+Build an index from a corpus of articles, either JSONL with "title" and
+"text" fields (the output of `wikiextractor --json`, optionally gzipped)
+or a directory of .txt/.md files, one article per file:
+
+    python -m services.wiki_index build simplewiki/ -o .cache/wiki_index
+    python -m services.wiki_index search .cache/wiki_index "sri lanka trade"
+
+Then set WIKIPEDIA_INDEX_PATH to the index directory and the wikipedia
+tool reads from it instead of the Wikipedia API.
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import math
+import os
+import sys
+import time
+from array import array
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+
+from services.semantic_cache import tokenize
+
+INDEX_VERSION = 1
+
+# Characters of leading paragraphs returned as a page summary
+SUMMARY_CHARS = 1200
+
+
+class PageError(Exception):
+    pass
+
+
+class DisambiguationError(Exception):
+    pass
+
+
+class _StringWriter:
+    """Streams strings to a UTF-8 blob and an offsets array, as _StringTable reads them.
+
+    Offsets go to a raw temporary file while writing, so neither the
+    strings nor their offsets are held in memory.
+    """
+
+    def __init__(self, directory, name):
+        self._offsets_path = os.path.join(directory, f"{name}_offsets.npy")
+        self._raw_path = self._offsets_path + ".tmp"
+        self._blob = open(os.path.join(directory, f"{name}.bin"), "wb")
+        self._offsets = open(self._raw_path, "wb")
+        self._end = 0
+        self._offsets.write(array("q", [0]).tobytes())
+        self.count = 0
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self._blob.write(data)
+        self._end += len(data)
+        self._offsets.write(array("q", [self._end]).tobytes())
+        self.count += 1
+
+    def close(self):
+        self._blob.close()
+        self._offsets.close()
+        raw = np.memmap(self._raw_path, dtype=np.int64, mode="r")
+        offsets = np.lib.format.open_memmap(
+            self._offsets_path, mode="w+", dtype=np.int64, shape=(len(raw),)
+        )
+        offsets[:] = raw
+        offsets.flush()
+        del raw, offsets
+        os.remove(self._raw_path)
+
+
+def _array_file(directory, name, dtype, length):
+    """A writable .npy array of length items backed by a file in directory"""
+    path = os.path.join(directory, f"{name}.npy")
+    if not length:
+        # An empty array cannot be memory-mapped
+        np.save(path, np.empty(0, dtype))
+        return np.empty(0, dtype)
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(length,))
+
+
+def _write_strings(directory, name, strings):
+    """Store strings as one UTF-8 blob plus an offsets array"""
+    writer = _StringWriter(directory, name)
+    for text in strings:
+        writer.write(text)
+    writer.close()
+
+
+class _StringTable:
+    """Read-only sequence of strings backed by a memory-mapped blob"""
+
+    def __init__(self, directory, name):
+        self._offsets = np.load(
+            os.path.join(directory, f"{name}_offsets.npy"), mmap_mode="r"
+        )
+        path = os.path.join(directory, f"{name}.bin")
+        # np.memmap cannot map an empty file
+        self._blob = (
+            np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else b""
+        )
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return bytes(self._blob[start:end]).decode("utf-8")
+
+
+class _SortedView:
+    """Presents a string table in the order given by a permutation, for bisect"""
+
+    def __init__(self, table, order):
+        self._table = table
+        self._order = order
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, i):
+        return self._table[int(self._order[i])]
+
+
+def read_articles(path):
+    """Yield {"title", "text", "url"} dicts from a JSONL file or a directory tree"""
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                yield from read_articles(os.path.join(root, name))
+        return
+
+    stem, ext = os.path.splitext(os.path.basename(path))
+    if ext in (".txt", ".md"):
+        with open(path, encoding="utf-8") as f:
+            yield {"title": stem, "text": f.read(), "url": ""}
+        return
+
+    opener = gzip.open if ext == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("title") and record.get("text"):
+                yield {
+                    "title": record["title"],
+                    "text": record["text"],
+                    "url": record.get("url", ""),
+                }
+
+
+def build_index(articles, directory):
+    """Write an inverted index for the articles into directory; returns the document count.
+
+    Titles, texts and urls are streamed to disk as articles are read, so
+    only the postings are held in memory while a dump is indexed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    strings = {
+        name: _StringWriter(directory, name) for name in ("titles", "texts", "urls")
+    }
+    lengths = array("i")
+    postings = {}
+
+    for doc_id, article in enumerate(articles):
+        strings["titles"].write(article["title"])
+        strings["texts"].write(article["text"])
+        strings["urls"].write(article.get("url", ""))
+        # Title words count as part of the document so exact-title queries rank first
+        terms = Counter(tokenize(f"{article['title']}\n{article['text']}"))
+        lengths.append(sum(terms.values()))
+        for term, tf in terms.items():
+            docs_tfs = postings.get(term)
+            if docs_tfs is None:
+                docs_tfs = postings[term] = (array("i"), array("H"))
+            docs_tfs[0].append(doc_id)
+            docs_tfs[1].append(min(tf, 65535))
+    for writer in strings.values():
+        writer.close()
+    documents = strings["titles"].count
+
+    vocabulary = sorted(postings)
+    offsets = np.zeros(len(vocabulary) + 1, np.int64)
+    for i, term in enumerate(vocabulary):
+        offsets[i + 1] = offsets[i] + len(postings[term][0])
+    # Filled in place on disk rather than copied into one more in-memory array
+    doc_ids = _array_file(directory, "postings", np.int32, int(offsets[-1]))
+    freqs = _array_file(directory, "freqs", np.uint16, int(offsets[-1]))
+    for i, term in enumerate(vocabulary):
+        docs, tfs = postings.pop(term)
+        doc_ids[offsets[i] : offsets[i + 1]] = docs
+        freqs[offsets[i] : offsets[i + 1]] = tfs
+    for array_file in (doc_ids, freqs):
+        if isinstance(array_file, np.memmap):
+            array_file.flush()
+    del doc_ids, freqs
+
+    _write_strings(directory, "terms", vocabulary)
+    np.save(os.path.join(directory, "posting_offsets.npy"), offsets)
+    np.save(os.path.join(directory, "lengths.npy"), np.array(lengths, np.int32))
+    # Titles are read back from disk once the postings are freed
+    titles = _StringTable(directory, "titles")
+    title_order = sorted(range(documents), key=titles.__getitem__)
+    np.save(os.path.join(directory, "title_order.npy"), np.array(title_order, np.int32))
+
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": INDEX_VERSION,
+                "documents": documents,
+                "terms": len(vocabulary),
+                "average_length": sum(lengths) / max(1, len(lengths)),
+            },
+            f,
+        )
+    return documents
+
+
+class LocalPage:
+    """The parts of wikipedia.WikipediaPage that WikipediaAPIWrapper reads"""
+
+    def __init__(self, title, content, url):
+        self.title = title
+        self.content = content
+        self.url = url
+
+    @property
+    def summary(self):
+        # The lead section: paragraphs up to the first heading or SUMMARY_CHARS
+        paragraphs = []
+        length = 0
+        for paragraph in self.content.split("\n\n"):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if paragraph.startswith("=") or (paragraphs and length >= SUMMARY_CHARS):
+                break
+            paragraphs.append(paragraph)
+            length += len(paragraph)
+        return "\n\n".join(paragraphs)[:SUMMARY_CHARS]
+
+
+class LocalWikipediaClient:
+    """Drop-in for the wikipedia module backed by an index from build_index.
+
+    Assign an instance to WikipediaAPIWrapper.wiki_client. Index files are
+    memory-mapped, so opening is instant and the OS page cache holds the
+    hot parts across processes.
+    """
+
+    exceptions = SimpleNamespace(
+        PageError=PageError, DisambiguationError=DisambiguationError
+    )
+    # Lets callers skip the rate limiter and result cache meant for the API
+    local = True
+
+    def __init__(self, directory, k1=1.2, b=0.75):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported wiki index version in {directory}")
+
+        def load(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+        self.documents = meta["documents"]
+        self.average_length = meta["average_length"] or 1.0
+        self.k1 = k1
+        self.b = b
+        self.terms = _StringTable(directory, "terms")
+        self.titles = _StringTable(directory, "titles")
+        self.texts = _StringTable(directory, "texts")
+        self.urls = _StringTable(directory, "urls")
+        self.posting_offsets = load("posting_offsets")
+        self.postings = load("postings")
+        self.freqs = load("freqs")
+        self.lengths = load("lengths")
+        self._title_order = load("title_order")
+        self._titles_sorted = _SortedView(self.titles, self._title_order)
+
+    def set_lang(self, lang):
+        pass
+
+    def _term_id(self, term):
+        i = bisect.bisect_left(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            return i
+        return None
+
+    def top_documents(self, query, k=3):
+        """Return ids of the k documents with the highest BM25 score for query"""
+        doc_parts, score_parts = [], []
+        for term in set(tokenize(query)):
+            term_id = self._term_id(term)
+            if term_id is None:
+                continue
+            start = int(self.posting_offsets[term_id])
+            end = int(self.posting_offsets[term_id + 1])
+            docs = np.asarray(self.postings[start:end])
+            tf = np.asarray(self.freqs[start:end], np.float32)
+            df = end - start
+            idf = math.log(1 + (self.documents - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (
+                1 - self.b + self.b * self.lengths[docs] / self.average_length
+            )
+            doc_parts.append(docs)
+            score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not doc_parts or k <= 0:
+            return []
+
+        docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(score_parts))
+        k = min(k, len(docs))
+        top = np.argpartition(-totals, k - 1)[:k]
+        top = top[np.argsort(-totals[top], kind="stable")]
+        return docs[top].tolist()
+
+    def search(self, query, results=10):
+        return [self.titles[doc_id] for doc_id in self.top_documents(query, results)]
+
+    def page(self, title=None, auto_suggest=False, **kwargs):
+        i = bisect.bisect_left(self._titles_sorted, title)
+        if i == len(self._titles_sorted) or self._titles_sorted[i] != title:
+            raise PageError(f'Page id "{title}" does not match any pages')
+        doc_id = int(self._title_order[i])
+        return LocalPage(self.titles[doc_id], self.texts[doc_id], self.urls[doc_id])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build or query a local Wikipedia index"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Index a JSONL file or a directory")
+    build.add_argument("input")
+    build.add_argument("-o", "--output", default=".cache/wiki_index")
+    search = commands.add_parser("search", help="Show the top titles for a query")
+    search.add_argument("index")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        count = build_index(read_articles(args.input), args.output)
+        print(
+            f"Indexed {count} articles into {args.output} "
+            f"in {time.perf_counter() - start:.1f}s",
+            file=sys.stderr,
+        )
+        return 0
+
+    client = LocalWikipediaClient(args.index)
+    start = time.perf_counter()
+    titles = client.search(args.query, results=args.k)
+    elapsed = (time.perf_counter() - start) * 1000
+    for title in titles:
+        print(title)
+    print(f"{len(titles)} results in {elapsed:.1f}ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,13 @@
 import streamlit as st
 
 
+@st.cache_resource
+def _read_css(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
 def load_css():
-    with open("styles/styles.css") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    st.markdown(
+        f"<style>{_read_css('styles/styles.css')}</style>", unsafe_allow_html=True
+    )
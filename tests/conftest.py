@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Module-level stores open their files on import, so point them at scratch
+# space before any test imports them
+_scratch = tempfile.mkdtemp(prefix="research-tests-")
+for name, value in {
+    "TOOL_CACHE_PATH": os.path.join(_scratch, "tool_cache.sqlite3"),
+    "HISTORY_DB_PATH": os.path.join(_scratch, "history.sqlite3"),
+    "JOBS_DB_PATH": os.path.join(_scratch, "jobs.sqlite3"),
+    "METRICS_DIR": os.path.join(_scratch, "metrics"),
+    "SPILL_DIR": os.path.join(_scratch, "spill"),
+    "GOOGLE_API_KEY": "fake",
+}.items():
+    os.environ.setdefault(name, value)
+os.environ.pop("CASSETTE_DIR", None)
+os.environ.pop("RESEARCH_SERVICE_URL", None)
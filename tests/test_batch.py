@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import tools
+from batch import BatchRunner, completed_ids, read_queries
+from benchmarks.fakes import FakeChatModel, FakeDDGS, FakeWikipediaClient
+
+
+@pytest.fixture
+def runner_for(monkeypatch):
+    from agent import build_agent_executor
+
+    monkeypatch.setattr(tools, "ddgs_factory", lambda: FakeDDGS())
+    monkeypatch.setattr(tools.api_wrapper, "wiki_client", FakeWikipediaClient())
+
+    def make(output):
+        executor = build_agent_executor("fake", llm=FakeChatModel(), verbose=False)
+        return BatchRunner(FakeChatModel(script=[]), executor, str(output), workers=2)
+
+    return make
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text().splitlines() if line]
+
+
+def test_malformed_lines_get_error_records(tmp_path, runner_for):
+    queries = tmp_path / "queries.jsonl"
+    queries.write_text(
+        '{"id": "a", "query": "Compare the trade of Sri Lanka and Japan"}\n'
+        '{"id": "b", "query": \n'
+        "\n"
+        '["not", "an", "object"]\n'
+        '{"id": "c"}\n'
+        '{"id": "d", "query": "Who was Ada Lovelace?"}\n'
+    )
+    assert [entry[0] for entry in read_queries(str(queries))] == [
+        "a",
+        "line-2",
+        "line-4",
+        "d",
+    ]
+
+    output = tmp_path / "results.jsonl"
+    runner = runner_for(output)
+    runner.run(read_queries(str(queries)))
+
+    records = {r["id"]: r for r in _records(output)}
+    assert set(records) == {"a", "line-2", "line-4", "d"}
+    assert records["line-2"]["error"].startswith("Malformed input on line 2")
+    assert records["line-4"]["error"].startswith("Malformed input on line 4")
+    assert (runner.succeeded, runner.failed) == (2, 2)
+    assert completed_ids(str(output)) == {"a", "d"}
+
+
+def test_runs_go_through_the_pipeline(tmp_path, runner_for):
+    output = tmp_path / "results.jsonl"
+    runner_for(output).run_one("q", "Who was Ada Lovelace?")
+    (record,) = _records(output)
+    # The router's fast path: one lookup and no agent steps
+    assert [step["tool"] for step in record["intermediate_steps"]] == ["wikipedia"]
+    assert record["intermediate_steps"][0]["tool_input"] == "Ada Lovelace"
+    assert record["output"]
+
+
+def test_resume_after_a_truncated_line(tmp_path, runner_for):
+    output = tmp_path / "results.jsonl"
+    output.write_text(
+        '{"id": "a", "query": "q", "output": "ok", "error": null}\n'
+        '{"id": "b", "query": "q", "outp'
+    )
+    assert completed_ids(str(output)) == {"a"}
+
+    runner_for(output).run_one("b", "Who was Ada Lovelace?")
+    lines = output.read_text().splitlines()
+    assert lines[1] == '{"id": "b", "query": "q", "outp'
+    assert json.loads(lines[2])["id"] == "b"
+    assert completed_ids(str(output)) == {"a", "b"}
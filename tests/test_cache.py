@@ -0,0 +1,123 @@
+import sqlite3
+
+import pytest
+
+from services import cache as cache_module
+from services.cache import ResultCache, normalize_query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(
+        str(tmp_path / "cache.sqlite3"),
+        max_entries=3,
+        ttls={"web_search": 100},
+        negative_ttl=10,
+    )
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["What is BM25?", "  what   is bm25 ", "WHAT IS BM25!", "what is\tbm25?."],
+)
+def test_key_normalization(cache, query):
+    assert normalize_query(query) == "what is bm25"
+    cache.set("web_search", "what is bm25", "result")
+    assert cache.get("web_search", query) == "result"
+
+
+def test_entries_expire_after_the_tool_ttl(cache, clock):
+    cache.set("web_search", "q", "result")
+    clock.now += 100
+    assert cache.get("web_search", "q") == "result"
+    clock.now += 1
+    assert not cache.contains("web_search", "q")
+    assert cache.get("web_search", "q") is None
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["misses"] == {"web_search": 1}
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "No search results found for: q",
+        "No good Wikipedia Search Result was found",
+        "Search error: timed out",
+    ],
+)
+def test_empty_results_expire_after_the_negative_ttl(cache, clock, value):
+    cache.set("web_search", "q", value)
+    clock.now += 10
+    assert cache.get("web_search", "q") == value
+    clock.now += 1
+    assert cache.get("web_search", "q") is None
+
+    calls = []
+    compute = lambda: calls.append(1) or "fresh"
+    assert cache.get_or_compute("web_search", "q", compute) == "fresh"
+    assert cache.get_or_compute("web_search", "q", compute) == "fresh"
+    assert len(calls) == 1
+
+
+def test_least_recently_used_entry_is_evicted(cache, clock):
+    for query in ("a", "b", "c"):
+        cache.set("web_search", query, query.upper())
+        clock.now += 1
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("web_search", "a") == "A"
+    clock.now += 1
+    cache.set("wikipedia", "d", "D")
+
+    assert cache.get("web_search", "b") is None
+    assert [cache.get("web_search", q) for q in ("a", "c")] == ["A", "C"]
+    assert cache.get("wikipedia", "d") == "D"
+    assert cache.stats()["size"] == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_overwriting_an_entry_does_not_evict(cache):
+    for query in ("a", "b", "c"):
+        cache.set("web_search", query, "old")
+    cache.set("web_search", "a", "new")
+    assert (cache.stats()["size"], cache.stats()["evictions"]) == (3, 0)
+    assert cache.get("web_search", "a") == "new"
+
+
+def test_cache_without_the_negative_column_is_migrated(tmp_path, clock):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE results (
+            tool TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created REAL NOT NULL,
+            accessed REAL NOT NULL,
+            PRIMARY KEY (tool, key)
+        )""")
+    conn.execute(
+        "INSERT INTO results VALUES ('web_search', 'q', 'old', ?, ?)",
+        (clock.now, clock.now),
+    )
+    conn.commit()
+    conn.close()
+
+    cache = ResultCache(path)
+    assert cache.get("web_search", "q") == "old"
+    cache.set("web_search", "empty", "No search results found for: empty")
+    clock.now += cache.negative_ttl + 1
+    assert cache.get("web_search", "empty") is None
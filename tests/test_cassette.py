@@ -0,0 +1,80 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+from services.cassette import Cassette
+
+QUERY = "Compare the trade of Sri Lanka and Japan today"
+
+# Runs one query through the pipeline the way the pages do, with the
+# recording wrapper build_llm adds when CASSETTE_DIR is set
+PAGE_RUN = """
+from benchmarks.fakes import FakeChatModel
+from services.cassette import RecordingChatModel
+from services.jobs import install_fake_backends
+install_fake_backends()
+from agent import build_agent_executor
+from services.pipeline import research_pipeline
+llm = RecordingChatModel(inner=FakeChatModel(script=[]))
+executor = build_agent_executor(
+    "fake", llm=RecordingChatModel(inner=FakeChatModel()), verbose=False
+)
+research_pipeline({query!r}, llm, executor)
+"""
+
+
+def _python(tmp_path, *args, cassette_dir=None):
+    env = {**os.environ, "TOOL_CACHE_PATH": str(tmp_path / "tool_cache.sqlite3")}
+    if cassette_dir:
+        env["CASSETTE_DIR"] = str(cassette_dir)
+    result = subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def _replay(tmp_path, path, cassette_dir=None):
+    stdout = _python(
+        tmp_path,
+        "-m",
+        "services.cassette",
+        "replay",
+        str(path),
+        "--strict",
+        "--time-scale",
+        "0",
+        cassette_dir=cassette_dir,
+    )
+    return json.loads(stdout)
+
+
+def test_cli_replays_pipeline_recording(tmp_path):
+    recordings = tmp_path / "recordings"
+    _python(tmp_path, "-c", PAGE_RUN.format(query=QUERY), cassette_dir=recordings)
+    [path] = recordings.iterdir()
+
+    report = _replay(tmp_path, path, cassette_dir=recordings)
+
+    assert report["output_matches"]
+    assert report["unmatched_calls"] == 0
+    # Replaying must not start a recording of its own
+    assert list(recordings.iterdir()) == [path]
+
+
+def test_cli_recording_skips_prefetch(tmp_path):
+    path = tmp_path / "run.cassette.gz"
+    _python(
+        tmp_path, "-m", "services.cassette", "record", "--fake", QUERY, "-o", str(path)
+    )
+
+    # Only the agent's two scripted searches, no speculative ones
+    assert Cassette.load(str(path)).summary()["tool_calls"] == 2
+    assert _replay(tmp_path, path)["output_matches"]
@@ -0,0 +1,64 @@
+from services.compression import compress_observation, estimate_tokens
+
+FILLER = (
+    "The committee met on Tuesday to review the schedule for the coming season. "
+    "Several members raised questions about parking near the venue. "
+    "Tickets will go on sale at the usual outlets next month. "
+)
+
+
+def _search_results(bodies):
+    return "\n".join(
+        f"{i}. Result {i}\n{body}\nSource: https://example.com/{i}\n"
+        for i, body in enumerate(bodies, 1)
+    )
+
+
+def test_short_observations_are_unchanged():
+    text = _search_results(["Sri Lanka exports tea."])
+    assert compress_observation(text, "Sri Lanka tea", token_budget=400) == text
+
+
+def test_relevant_sentences_keep_their_source_headers():
+    text = _search_results(
+        [
+            FILLER + "Sri Lanka is among the largest tea exporters in the world.",
+            FILLER * 2,
+            "Tea exports earn Sri Lanka over a billion dollars a year. " + FILLER,
+        ]
+    )
+    compressed = compress_observation(text, "Sri Lanka tea exports", token_budget=60)
+
+    assert estimate_tokens(compressed) < estimate_tokens(text) / 3
+    assert "largest tea exporters" in compressed
+    assert "over a billion dollars" in compressed
+    for kept in (1, 3):
+        assert f"{kept}. Result {kept}" in compressed
+        assert f"Source: https://example.com/{kept}" in compressed
+    # A block without a relevant sentence is dropped with its headers
+    assert "Source: https://example.com/2" not in compressed
+    assert "parking" not in compressed
+
+
+def test_kept_sentences_stay_in_their_block_and_order():
+    text = _search_results(
+        [
+            "Tea came to Ceylon in 1867. "
+            + FILLER
+            + "Ceylon tea is grown in the hills.",
+        ]
+    )
+    compressed = compress_observation(text, "Ceylon tea", token_budget=40)
+    assert compressed.splitlines() == [
+        "1. Result 1",
+        "Tea came to Ceylon in 1867. Ceylon tea is grown in the hills.",
+        "Source: https://example.com/1",
+    ]
+
+
+def test_near_duplicate_sentences_are_kept_once():
+    sentence = "Sri Lanka is one of the largest tea exporters in the world."
+    text = _search_results([sentence + " " + FILLER, FILLER + " " + sentence] * 2)
+    compressed = compress_observation(text, "Sri Lanka tea exporters", token_budget=60)
+    assert compressed.count("largest tea exporters") == 1
+    assert compressed.count("Source:") == 1
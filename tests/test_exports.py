@@ -0,0 +1,85 @@
+import io
+import json
+import zipfile
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.exports import export_entry, export_history, render_entry
+from services.history import HistoryStore
+
+ENTRY = {
+    "id": 7,
+    "query": "Sri Lanka's trade?",
+    "result": "Tea, rubber and garments.",
+    "timestamp": "2026-01-02 03:04:05",
+}
+
+
+def test_render_txt():
+    assert render_entry(ENTRY) == (
+        "Query: Sri Lanka's trade?\n"
+        "Date: 2026-01-02 03:04:05\n"
+        "\n"
+        "Tea, rubber and garments.\n" + "=" * 80 + "\n"
+    )
+
+
+def test_render_md():
+    assert render_entry(ENTRY, "md") == (
+        "# Sri Lanka's trade?\n\n*2026-01-02 03:04:05*\n\nTea, rubber and garments.\n"
+    )
+
+
+def test_render_jsonl_keeps_non_ascii_text():
+    entry = {**ENTRY, "result": "කොළඹ — Colombo\nport"}
+    line = render_entry(entry, "jsonl")
+    assert line.endswith("}\n") and line.count("\n") == 1
+    assert "කොළඹ" in line
+    assert json.loads(line) == entry
+
+
+def test_render_without_a_timestamp():
+    entry = {"query": "q", "result": "r"}
+    assert render_entry(entry).startswith("Query: q\nDate: \n\nr\n")
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.sqlite3")).for_owner("alice")
+    start = datetime.now() - timedelta(hours=1)
+    for i, query in enumerate(["Sri Lanka trade", "Japan trade", "Tea?"]):
+        timestamp = (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")
+        history.add(query, f"answer {i}", timestamp)
+    return history
+
+
+def test_export_history_txt_and_search(history):
+    text = export_history(history, "txt").decode("utf-8")
+    assert [line for line in text.splitlines() if line.startswith("Query:")] == [
+        "Query: Tea?",
+        "Query: Japan trade",
+        "Query: Sri Lanka trade",
+    ]
+    jsonl = export_history(history, "jsonl", search="trade").decode("utf-8")
+    assert [json.loads(line)["query"] for line in jsonl.splitlines()] == [
+        "Japan trade",
+        "Sri Lanka trade",
+    ]
+
+
+def test_export_history_zip(history):
+    archive = zipfile.ZipFile(io.BytesIO(export_history(history, "zip")))
+    names = archive.namelist()
+    assert [name.split("-", 1)[1] for name in names] == [
+        "tea.md",
+        "japan-trade.md",
+        "sri-lanka-trade.md",
+    ]
+    assert archive.read(names[0]).decode("utf-8").startswith("# Tea?\n")
+
+
+def test_export_entry(history):
+    entry = history.page()[0]
+    assert export_entry(history, entry["id"], "md").startswith("# Tea?\n")
+    assert export_entry(history, 10_000) == ""
@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from services.hedging import Backend, CircuitBreaker, get_breaker, hedged_call
+from services.metrics import track_run
+
+
+def _backend(name, result="result", delay=0.0, error=None, good=True):
+    def func(query):
+        time.sleep(delay)
+        if error:
+            raise error
+        return f"{name}: {result}"
+
+    return Backend(name, func, lambda result: good)
+
+
+def test_fast_primary_is_not_hedged():
+    backends = [_backend("fast_primary"), _backend("fast_secondary")]
+    with track_run("hedge", export=False) as run:
+        name, result = hedged_call(backends, "q", hedge_after=1.0)
+    assert (name, result) == ("fast_primary", "fast_primary: result")
+    assert run.counters["hedged_requests"] == 0
+
+
+def test_slow_primary_is_hedged():
+    backends = [_backend("slow_primary", delay=1.0), _backend("slow_secondary")]
+    started = time.monotonic()
+    with track_run("hedge", export=False) as run:
+        name, _ = hedged_call(backends, "q", hedge_after=0.1)
+    assert name == "slow_secondary"
+    assert time.monotonic() - started < 0.8
+    assert run.counters["hedged_requests"] == 1
+    assert run.counters["hedge_wins"] == 1
+
+
+def test_failure_fails_over_without_waiting():
+    backends = [
+        _backend("failing_primary", error=ConnectionError("down")),
+        _backend("failover_secondary"),
+    ]
+    started = time.monotonic()
+    name, _ = hedged_call(backends, "q", hedge_after=5.0)
+    assert name == "failover_secondary"
+    assert time.monotonic() - started < 1.0
+
+
+def test_poor_result_is_kept_as_fallback():
+    backends = [
+        _backend("poor_primary", good=False),
+        _backend("poor_secondary", error=ConnectionError("down")),
+    ]
+    assert hedged_call(backends, "q") == ("poor_primary", "poor_primary: result")
+
+
+def test_last_error_is_raised_when_every_backend_fails():
+    backends = [
+        _backend("error_primary", error=ConnectionError("first")),
+        _backend("error_secondary", error=TimeoutError("second")),
+    ]
+    with pytest.raises(TimeoutError, match="second"):
+        hedged_call(backends, "q")
+
+
+def test_open_circuit_skips_backend():
+    breaker = get_breaker("open_primary")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == "open"
+
+    with track_run("hedge", export=False) as run:
+        name, _ = hedged_call(
+            [_backend("open_primary"), _backend("open_secondary")], "q"
+        )
+    assert name == "open_secondary"
+    assert run.counters["circuit_rejected"] == 1
+
+    with pytest.raises(ConnectionError):
+        hedged_call([_backend("open_primary")], "q")
+
+
+def test_breaker_half_opens_for_one_trial():
+    breaker = CircuitBreaker("trial", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    # A failed trial reopens the circuit, a successful one closes it
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
@@ -0,0 +1,104 @@
+import sqlite3
+
+import pytest
+
+from services.history import HistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history.sqlite3"))
+
+
+def test_add_page_and_clear(store):
+    alice = store.for_owner("alice")
+    for i in range(12):
+        alice.add(f"question {i}", f"answer {i} " + "x" * 400)
+
+    assert alice.count() == 12
+    first = alice.page(0, page_size=10)
+    assert [e["query"] for e in first[:2]] == ["question 11", "question 10"]
+    assert len(first) == 10 and len(alice.page(1, page_size=10)) == 2
+    # Pages carry a preview; get() loads the full result
+    assert len(first[0]["preview"]) == 300
+    assert alice.get(first[0]["id"])["result"].startswith("answer 11 x")
+    assert [e["query"] for e in alice.iter_entries(batch_size=5)][-1] == "question 0"
+
+    alice.clear()
+    assert alice.count() == 0
+    assert alice.page() == []
+
+
+def test_search(store):
+    alice = store.for_owner("alice")
+    alice.add("Sri Lanka trade", "Tea and spices")
+    alice.add("Japan trade", "Cars and electronics")
+    assert [e["query"] for e in alice.page(search="spice")] == ["Sri Lanka trade"]
+    assert alice.count(search="trade") == 2
+    # Search syntax in the input is treated as plain words
+    assert alice.count(search='"tea" OR cars*') == 0
+
+
+def test_owners_only_see_their_own_entries(store):
+    alice, bob = store.for_owner("alice"), store.for_owner("bob")
+    entry_id = alice.add("Sri Lanka trade", "Tea and spices")
+    bob.add("Japan trade", "Cars")
+
+    assert [e["query"] for e in bob.page()] == ["Japan trade"]
+    assert bob.count(search="tea") == 0
+    assert bob.get(entry_id) is None
+    assert [e["query"] for e in bob.iter_entries()] == ["Japan trade"]
+    bob.clear()
+    assert alice.count() == 1
+    assert bob.count() == 0
+
+
+def test_unowned_and_expired_entries_are_pruned(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    # A history table from before entries had an owner
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE history (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, "
+        "query TEXT NOT NULL, result TEXT NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO history (timestamp, query, result) "
+        "VALUES ('2024-01-01 00:00:00', 'old', 'shared')"
+    )
+    conn.commit()
+    conn.close()
+
+    store = HistoryStore(path, retention_days=30)
+    assert store.count("", None) == 0
+    alice = store.for_owner("alice")
+    alice.add("stale", "result", timestamp="2000-01-01 00:00:00")
+    alice.add("fresh", "result")
+    assert alice.count() == 2
+    assert store.prune(30) == 1
+    assert [e["query"] for e in alice.page()] == ["fresh"]
+    assert alice.count(search="fresh") == 1
+
+
+def _owner_page():
+    import streamlit as st
+
+    from components.history import history_owner
+
+    st.write(history_owner())
+
+
+def test_anonymous_owner_is_kept_in_the_url():
+    from streamlit.testing.v1 import AppTest
+
+    first = AppTest.from_function(_owner_page).run()
+    token = first.query_params["history"]
+    assert first.markdown[0].value == token
+
+    reloaded = AppTest.from_function(_owner_page)
+    reloaded.query_params["history"] = token
+    assert reloaded.run().markdown[0].value == token
+
+    # Only issued tokens are accepted, so no one can claim an account's history
+    forged = AppTest.from_function(_owner_page)
+    forged.query_params["history"] = "user:someone@example.com"
+    assert forged.run().markdown[0].value not in ("user:someone@example.com", token)
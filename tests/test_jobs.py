@@ -0,0 +1,166 @@
+import pytest
+
+from services import jobs
+from services.jobs import JobStore, QuotaExceeded
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_claims_follow_priority_lanes(store):
+    batch = store.submit("acme", "batch job", priority="batch")
+    first = store.submit("acme", "first normal job")
+    second = store.submit("acme", "second normal job")
+    urgent = store.submit("acme", "interactive job", priority="interactive")
+    quotas = {"acme": {"max_concurrent": 4}}
+
+    claimed = [store.claim(1, quotas)["id"] for _ in range(4)]
+    assert claimed == [urgent["id"], first["id"], second["id"], batch["id"]]
+    assert store.claim(1, quotas) is None
+
+
+def test_tenant_at_its_concurrency_quota_waits(store):
+    quotas = {"default": {"max_concurrent": 1}}
+    busy = store.submit("busy", "first", priority="interactive")
+    store.submit("busy", "second", priority="interactive")
+    quiet = store.submit("quiet", "other tenant", priority="batch")
+
+    assert store.claim(1, quotas)["id"] == busy["id"]
+    # The busy tenant's queued job waits even though its lane comes first
+    assert store.claim(2, quotas)["id"] == quiet["id"]
+    assert store.claim(3, quotas) is None
+    store.finish(busy["id"], "done", [])
+    assert store.claim(3, quotas)["query"] == "second"
+
+
+def test_queue_quota_and_priority_are_checked(store):
+    quotas = {"acme": {"max_queued": 2}}
+    store.submit("acme", "one", quotas=quotas)
+    store.submit("acme", "two", quotas=quotas)
+    with pytest.raises(QuotaExceeded):
+        store.submit("acme", "three", quotas=quotas)
+    store.submit("other", "three", quotas=quotas)
+    with pytest.raises(ValueError):
+        store.submit("acme", "four", priority="urgent")
+
+
+def test_cancel_only_queued_jobs(store):
+    running = store.submit("acme", "running")
+    queued = store.submit("acme", "queued")
+    store.claim(1)
+    assert not store.cancel(running["id"])
+    assert store.cancel(queued["id"])
+    assert store.get(queued["id"])["status"] == "cancelled"
+    assert store.events(queued["id"])[-1][1] == "cancelled"
+
+
+def test_dead_workers_jobs_are_requeued_until_the_cap(store, monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_JOB_ATTEMPTS", 2)
+    job = store.submit("acme", "crashes its worker")
+    other = store.submit("acme", "runs on another worker")
+
+    store.claim(1)
+    store.claim(2)
+    assert store.requeue(1) == 1
+    assert store.get(job["id"])["status"] == "queued"
+    assert store.get(other["id"])["status"] == "running"
+    assert [event[1] for event in store.events(job["id"])] == ["requeued"]
+
+    assert store.claim(1)["attempts"] == 2
+    assert store.requeue(1) == 0
+    failed = store.get(job["id"])
+    assert failed["status"] == "failed"
+    assert "died 2 times" in failed["error"]
+    assert store.events(job["id"])[-1][1] == "error"
+
+
+def test_events_are_numbered_per_job(store):
+    job = store.submit("acme", "query")
+    for text in ("a", "b", "c"):
+        store.add_event(job["id"], "text", {"text": text})
+    assert [seq for seq, _, _ in store.events(job["id"])] == [1, 2, 3]
+    assert store.events(job["id"], after=2) == [(3, "text", {"text": "c"})]
+
+
+def test_identical_running_job_follows_the_first(store):
+    first = store.submit("acme", "Sri Lanka trade")
+    second = store.submit("acme", "Sri Lanka trade")
+    store.claim(1)
+    store.claim(2)
+    assert store.join_running(first["id"], "key") is None
+    assert store.join_running(second["id"], "key") == first["id"]
+    assert store.join_running(second["id"], "other key") is None
+
+    store.add_event(
+        first["id"], "tool_start", {"tool": "web_search", "tool_input": "q"}
+    )
+    steps = [{"tool": "web_search", "tool_input": "q", "observation": "tea"}]
+    store.finish(first["id"], "Tea and spices", steps)
+    assert jobs._follow(store, store.get(second["id"]), first["id"])
+
+    followed = store.get(second["id"])
+    assert (followed["status"], followed["output"], followed["steps"]) == (
+        "done",
+        "Tea and spices",
+        steps,
+    )
+    assert [e[1] for e in store.events(second["id"])] == ["tool_start", "done"]
+
+
+def test_follower_runs_itself_when_the_first_job_is_requeued(store):
+    first = store.submit("acme", "Sri Lanka trade")
+    second = store.submit("acme", "Sri Lanka trade")
+    store.claim(1)
+    store.claim(2)
+    store.requeue(1)
+    assert not jobs._follow(store, store.get(second["id"]), first["id"])
+    assert [e[1] for e in store.events(second["id"])] == ["requeued"]
+
+
+def test_run_job_reuses_answers_with_the_same_settings(store, monkeypatch):
+    from langchain_core.agents import AgentAction
+
+    from services import pipeline
+
+    runs = []
+
+    def research(query, llm, agent_executor, deep=False, on_tool_start=None, **kw):
+        runs.append((query, deep))
+        on_tool_start("web_search", query)
+        action = AgentAction(tool="web_search", tool_input=query, log="")
+        return {"output": f"answer to {query}", "intermediate_steps": [(action, "obs")]}
+
+    monkeypatch.setattr(pipeline, "research_pipeline", research)
+    monkeypatch.setattr(jobs, "_resources", lambda settings, fake: (None, None))
+
+    def run(query, **settings):
+        job = store.submit("acme", query, settings)
+        store.claim(1, {"acme": {"max_concurrent": 10}})
+        jobs.run_job(store, store.get(job["id"]))
+        return store.get(job["id"])
+
+    first = run("Why did the Silk Road decline?")
+    again = run("why did the silk road decline")
+    deep = run("Why did the Silk Road decline?", deep=True)
+
+    assert runs == [
+        ("Why did the Silk Road decline?", False),
+        ("Why did the Silk Road decline?", True),
+    ]
+    assert again["output"] == first["output"]
+    assert again["steps"] == first["steps"]
+    assert [e[1] for e in store.events(again["id"])] == [
+        "tool_start",
+        "tool_end",
+        "done",
+    ]
+    assert deep["status"] == "done"
+
+
+def test_stats_can_be_scoped_to_a_tenant(store):
+    store.submit("acme", "one")
+    store.submit("other", "two")
+    assert store.stats("acme") == {"acme": {"queued": 1}}
+    assert set(store.stats()) == {"acme", "other"}
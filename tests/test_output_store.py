@@ -0,0 +1,145 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import ROOT
+from services.output_store import OutputStore
+
+LEGACY = (
+    "--- Research Output ---\nTimestamp: 2024-05-01 09:00:00\n\n"
+    "Old answer\n\n" + "=" * 50 + "\n\n"
+)
+
+
+def test_append_and_lookup(tmp_path):
+    store = OutputStore(str(tmp_path / "out.txt"), flush_interval=0.01)
+    store.append("Tea and spices", query="Sri Lanka trade")
+    timestamp = store.append("Cars and chips", query="Japan trade")
+    assert store.flush()
+
+    found = store.lookup(query="japan")
+    assert [entry["query"] for entry in found] == ["Japan trade"]
+    assert "Cars and chips" in found[0]["text"]
+    assert found[0]["text"].startswith("--- Research Output ---")
+    # Newest first
+    assert [e["query"] for e in store.lookup(timestamp=timestamp[:10])] == [
+        "Japan trade",
+        "Sri Lanka trade",
+    ]
+    assert store.lookup(query="iceland") == []
+
+
+def test_rotates_when_full(tmp_path):
+    store = OutputStore(str(tmp_path / "out.txt"), max_bytes=300, flush_interval=0.01)
+    for i in range(4):
+        store.append("x" * 150, query=f"query {i}")
+    store.flush()
+
+    assert len(store.segments()) == 4
+    assert [e["query"] for e in store.lookup(limit=10)] == [
+        f"query {i}" for i in reversed(range(4))
+    ]
+
+
+def test_legacy_file_is_indexed_not_truncated(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_text("Notes kept before the first frame\n" + LEGACY, encoding="utf-8")
+    store = OutputStore(str(path), flush_interval=0.01)
+    store.append("New answer", query="new")
+    store.flush()
+
+    text = path.read_text(encoding="utf-8")
+    assert text.startswith("Notes kept before the first frame\n" + LEGACY)
+    assert "New answer" in text
+    legacy = store.lookup(timestamp="2024-05-01")
+    assert [entry["text"] for entry in legacy] == [LEGACY]
+
+
+def test_partial_tail_is_dropped(tmp_path):
+    path = tmp_path / "out.txt"
+    store = OutputStore(str(path), flush_interval=0.01)
+    store.append("Complete", query="first")
+    store.flush()
+    # A frame and an index line that were being written when the process died
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("--- Research Output ---\nTimestamp: 2024-")
+    with open(str(path) + ".idx", "a", encoding="utf-8") as f:
+        f.write('{"timestamp": "2024-')
+
+    reopened = OutputStore(str(path), flush_interval=0.01)
+    reopened.append("After restart", query="second")
+    reopened.flush()
+    assert [e["query"] for e in reopened.lookup()] == ["second", "first"]
+    assert "2024-" not in path.read_text(encoding="utf-8")
+
+
+def test_failed_records_are_retried_and_later_appends_see_the_error(tmp_path):
+    blocker = tmp_path / "blocked"
+    blocker.write_text("a file where the output directory should be")
+    store = OutputStore(str(blocker / "out.txt"), flush_interval=0.01)
+
+    store.append("kept for a retry", query="first")
+    assert not store.flush()
+    assert store.last_error is not None
+    with pytest.raises(OSError):
+        store.append("reported to the caller", query="second")
+
+    blocker.unlink()
+    store.append("written", query="third")
+    assert store.last_error is None
+    store.append("queued again", query="fourth")
+    assert store.flush()
+    assert [e["query"] for e in store.lookup()] == ["fourth", "third", "first"]
+
+
+def test_writer_retries_on_its_own(tmp_path, monkeypatch):
+    from services import output_store
+
+    monkeypatch.setattr(output_store, "RETRY_INTERVAL", 0.05)
+    blocker = tmp_path / "blocked"
+    blocker.write_text("a file where the output directory should be")
+    store = OutputStore(str(blocker / "out.txt"), flush_interval=0.01)
+    store.append("kept for a retry", query="first")
+    assert not store.flush()
+
+    blocker.unlink()
+    deadline = time.monotonic() + 5
+    while not store.flush() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert [e["query"] for e in store.lookup()] == ["first"]
+
+
+# Appends from a separate process, as a job service worker would
+APPEND_SCRIPT = """
+import sys
+from services.output_store import OutputStore
+path, worker = sys.argv[1], sys.argv[2]
+store = OutputStore(path, max_bytes=4000, flush_interval=0.01, batch_size=3)
+for i in range(30):
+    store.append(f"answer {i} " * 20, query=f"worker {worker} query {i}")
+store.flush()
+"""
+
+
+def test_processes_can_share_a_file(tmp_path):
+    path = str(tmp_path / "out.txt")
+    processes = [
+        subprocess.Popen([sys.executable, "-c", APPEND_SCRIPT, path, str(w)], cwd=ROOT)
+        for w in range(3)
+    ]
+    for process in processes:
+        assert process.wait(60) == 0
+
+    store = OutputStore(path)
+    entries = store.lookup(limit=1000)
+    assert len(entries) == 90
+    assert {e["query"] for e in entries} == {
+        f"worker {w} query {i}" for w in range(3) for i in range(30)
+    }
+    for entry in entries:
+        # Every index entry points at its own whole frame
+        assert entry["text"].startswith("--- Research Output ---")
+        assert f"Query: {entry['query']}\n" in entry["text"]
+        assert entry["text"].endswith("=" * 50 + "\n\n")
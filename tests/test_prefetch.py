@@ -0,0 +1,135 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services import prefetch as prefetch_module
+from services.metrics import track_run
+from services.prefetch import Prefetch, claim, prefetch_queries, prefetching
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # One worker, so a blocked fetch keeps the ones behind it queued
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(prefetch_module, "_prefetch_pool", pool)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+class Fetch:
+    """A fetch that records its queries and returns result, optionally once released"""
+
+    def __init__(self, result=True, blocked=False):
+        self.result = result
+        self.queries = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not blocked:
+            self.release.set()
+
+    def __call__(self, query):
+        self.started.set()
+        self.release.wait(5)
+        self.queries.append(query)
+        return self.result
+
+
+def test_prefetch_queries():
+    assert prefetch_queries('Compare "Sri Lanka" and Japan trade') == [
+        'Compare "Sri Lanka" and Japan trade',
+        "Sri Lanka",
+        "Japan",
+    ]
+    assert prefetch_queries("Who was Ada Lovelace?") == [
+        "Who was Ada Lovelace?",
+        "Ada Lovelace",
+    ]
+
+
+def test_claim_a_finished_prefetch(pool):
+    fetch = Fetch()
+    prefetch = Prefetch()
+    with track_run("prefetch", export=False) as run:
+        prefetch.submit("web_search", "Sri Lanka", fetch)
+        # Already submitted under its normalized key
+        prefetch.submit("web_search", "sri lanka?", fetch)
+        prefetch.pending[("web_search", "sri lanka")].result(5)
+
+        assert not prefetch.claim("wikipedia", "Sri Lanka")
+        assert prefetch.claim("web_search", "  SRI LANKA ")
+        # A prefetch is claimed once
+        assert not prefetch.claim("web_search", "Sri Lanka")
+    assert fetch.queries == ["Sri Lanka"]
+    assert run.counters["prefetch_issued"] == 1
+    assert run.counters["prefetch_hits"] == 1
+
+
+def test_claim_a_prefetch_that_found_no_token(pool):
+    prefetch = Prefetch()
+    prefetch.submit("web_search", "q", Fetch(result=False))
+    prefetch.pending[("web_search", "q")].result(5)
+    with track_run("prefetch", export=False) as run:
+        assert not prefetch.claim("web_search", "q")
+    assert run.counters["prefetch_hits"] == 0
+
+
+def test_claiming_a_queued_prefetch_cancels_it(pool):
+    blocker, queued = Fetch(blocked=True), Fetch()
+    prefetch = Prefetch()
+    with track_run("prefetch", export=False) as run:
+        prefetch.submit("web_search", "first", blocker)
+        prefetch.submit("web_search", "second", queued)
+        assert blocker.started.wait(5)
+
+        assert not prefetch.claim("web_search", "second")
+        # A claimed fetch still running is joined by the agent's call
+        assert prefetch.claim("web_search", "first")
+        blocker.release.set()
+    pool.shutdown(wait=True)
+    assert queued.queries == []
+    assert run.counters["prefetch_cancelled"] == 1
+    assert run.counters["prefetch_hits"] == 1
+
+
+def test_cancel_counts_unused_and_drops_queued(pool):
+    done, running, queued = Fetch(), Fetch(blocked=True), Fetch()
+    prefetch = Prefetch()
+    with track_run("prefetch", export=False) as run:
+        prefetch.submit("web_search", "done", done)
+        prefetch.pending[("web_search", "done")].result(5)
+        prefetch.submit("web_search", "running", running)
+        prefetch.submit("wikipedia", "queued", queued)
+        assert running.started.wait(5)
+
+        prefetch.cancel()
+        running.release.set()
+    pool.shutdown(wait=True)
+    assert prefetch.pending == {}
+    assert queued.queries == []
+    assert run.counters["prefetch_cancelled"] == 1
+    assert run.counters["prefetch_unused"] == 2
+
+
+def test_fetch_that_starts_after_the_run_is_dropped():
+    fetch = Fetch()
+    prefetch = Prefetch()
+    prefetch.closed = True
+    assert prefetch._fetch(fetch, "q") is False
+    assert fetch.queries == []
+
+
+def test_only_calls_inside_the_run_claim(pool, monkeypatch):
+    fetch = Fetch()
+    monkeypatch.setattr(prefetch_module, "PREFETCH_ENABLED", True)
+    monkeypatch.setattr(prefetch_module, "_fetchers", lambda: {"web_search": fetch})
+    with track_run("prefetch", export=False) as run:
+        with prefetching("Who was Ada Lovelace?") as prefetch:
+            for future in list(prefetch.pending.values()):
+                future.result(5)
+            assert claim("web_search", "Ada Lovelace")
+        assert not claim("web_search", "Who was Ada Lovelace?")
+    assert fetch.queries == ["Who was Ada Lovelace?", "Ada Lovelace"]
+    assert run.counters["prefetch_issued"] == 2
+    assert run.counters["prefetch_hits"] == 1
+    assert run.counters["prefetch_unused"] == 1
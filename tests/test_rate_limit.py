@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from services.metrics import track_run
+from services.rate_limit import TokenBucket, call_with_backoff, get_bucket
+
+
+def test_burst_then_refill():
+    bucket = TokenBucket("test", rate=20.0, capacity=3)
+    assert all(bucket.acquire(blocking=False) for _ in range(3))
+    assert not bucket.acquire(blocking=False)
+
+    started = time.monotonic()
+    assert bucket.acquire(timeout=1.0)
+    # One token refills in 1/rate seconds
+    assert 0.03 < time.monotonic() - started < 0.5
+
+
+def test_acquire_times_out():
+    bucket = TokenBucket("test", rate=0.1, capacity=1)
+    bucket.acquire()
+    started = time.monotonic()
+    assert not bucket.acquire(timeout=0.1)
+    assert time.monotonic() - started < 0.5
+    assert bucket.stats()["queue_depth"] == 0
+
+
+def test_try_acquire_leaves_reserve():
+    bucket = TokenBucket("test", rate=0.01, capacity=3)
+    assert bucket.try_acquire(reserve=1)
+    assert bucket.try_acquire(reserve=1)
+    # The last token is kept for callers that wait for one
+    assert not bucket.try_acquire(reserve=1)
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_failure_pauses_the_whole_bucket():
+    bucket = TokenBucket("test", rate=100.0, capacity=5, base_delay=0.2)
+    delay = bucket.record_failure()
+    assert 0.1 <= delay <= 0.2
+    assert not bucket.try_acquire()
+    assert not bucket.acquire(blocking=False)
+    assert bucket.acquire(timeout=1.0)
+    # Consecutive failures back off exponentially, up to max_delay
+    assert 0.2 <= bucket.record_failure() <= 0.4
+    bucket.record_success()
+    assert bucket.strikes == 0
+
+
+def test_call_with_backoff_retries_retryable_errors(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_TEST_RETRY", "100,5")
+    get_bucket("test_retry").base_delay = 0.01
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("429 Resource exhausted")
+        return "ok"
+
+    with track_run("retry", export=False) as run:
+        assert call_with_backoff("test_retry", flaky) == "ok"
+    assert len(attempts) == 3
+    assert run.counters["retries"] == 2
+
+
+def test_call_with_backoff_raises_other_errors(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_TEST_FATAL", "100,5")
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        call_with_backoff("test_fatal", broken)
+    assert len(attempts) == 1
+
+
+def test_call_with_backoff_uses_a_token_already_taken(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_TEST_TAKEN", "0.01,1")
+    bucket = get_bucket("test_taken")
+    assert bucket.try_acquire()
+    started = time.monotonic()
+    assert call_with_backoff("test_taken", lambda: "ok", acquired=True) == "ok"
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,52 @@
+import pytest
+
+from services.router import classify_query, extract_subject
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "What is photosynthesis?",
+        "Who was Ada Lovelace?",
+        "where is Kandy",
+        "Define entropy",
+        "Tell me about the Treaty of Versailles",
+        "Ada Lovelace",
+        "Treaty of Versailles",
+    ],
+)
+def test_definitional_and_name_queries_are_simple(query):
+    assert classify_query(query) == "simple"
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        # Short, but asking about now
+        "Bitcoin price now",
+        "latest AI news",
+        "What is the weather today?",
+        "Who won the election in 2024?",
+        "Who is the current prime minister of Japan?",
+        # Short, but not a lookup of one thing
+        "bitcoin price",
+        "python async tutorial",
+        "ada lovelace",
+        # Comparisons, several parts or open questions
+        "What is the importance of Sri Lanka in global trade?",
+        "Compare tea and coffee",
+        "What is tea? What is coffee?",
+        "Who were Ada Lovelace, Charles Babbage and Alan Turing?",
+        "How do volcanoes form?",
+        "What is the long and complicated history of the Ottoman Empire in Europe",
+        "",
+    ],
+)
+def test_everything_else_is_complex(query):
+    assert classify_query(query) == "complex"
+
+
+def test_extract_subject_strips_question_wording():
+    assert extract_subject("Who was Ada Lovelace?") == "Ada Lovelace"
+    assert extract_subject("Define an atom.") == "atom"
+    assert extract_subject("Treaty of Versailles") == "Treaty of Versailles"
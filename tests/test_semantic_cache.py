@@ -0,0 +1,79 @@
+from services.semantic_cache import HashingEmbedder, SemanticCache
+
+QUERY = "What is the importance of Sri Lanka in global trade?"
+
+
+def _result(output):
+    return {"output": output, "intermediate_steps": []}
+
+
+def test_embedder_is_deterministic():
+    first = HashingEmbedder().embed_query(QUERY)
+    assert first == HashingEmbedder().embed_query(QUERY)
+    assert len(first) == 512
+    # Stopwords and punctuation do not change the embedding
+    assert first == HashingEmbedder().embed_query(
+        "importance of Sri Lanka global trade"
+    )
+
+
+def test_near_duplicate_returns_stored_answer():
+    cache = SemanticCache(HashingEmbedder(), threshold=0.8)
+    cache.store(QUERY, _result("Sri Lanka answer"))
+
+    match = cache.lookup("what's the importance of sri lanka in global trade")
+    assert match["query"] == QUERY
+    assert match["result"]["output"] == "Sri Lanka answer"
+    assert match["similarity"] >= 0.8
+    assert cache.lookup("How do volcanoes form?") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_threshold_and_ttl():
+    strict = SemanticCache(HashingEmbedder(), threshold=0.99)
+    strict.store(QUERY, _result("answer"))
+    assert strict.lookup("importance of Sri Lanka in trade") is None
+
+    expired = SemanticCache(HashingEmbedder(), ttl=-1)
+    expired.store(QUERY, _result("answer"))
+    assert expired.lookup(QUERY) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(HashingEmbedder(), max_entries=2)
+    cache.store("history of the silk road", _result("silk"))
+    cache.store("how do volcanoes form", _result("volcano"))
+    assert cache.lookup("history of the silk road")
+    cache.store("rules of cricket", _result("cricket"))
+
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("how do volcanoes form") is None
+    assert cache.lookup("history of the silk road")["result"]["output"] == "silk"
+    assert cache.lookup("rules of cricket")["result"]["output"] == "cricket"
+
+
+def test_embedder_is_pluggable():
+    class LengthEmbedder:
+        def embed_query(self, text):
+            return [1.0, float(len(text) > 20)]
+
+    cache = SemanticCache(LengthEmbedder(), threshold=0.99)
+    cache.store("a long question about trade", _result("long"))
+    assert cache.lookup("another long question here")["result"]["output"] == "long"
+    assert cache.lookup("short one") is None
+
+
+def test_answers_only_match_the_same_settings():
+    cache = SemanticCache(HashingEmbedder())
+    normal = ("gemini-2.5-flash", 0.7, 10, False)
+    deep = ("gemini-2.5-flash", 0.7, 10, True)
+    cache.store(QUERY, _result("normal answer"), normal)
+
+    assert cache.lookup(QUERY, deep) is None
+    assert cache.lookup(QUERY, ("gemini-2.5-pro", 0.7, 10, False)) is None
+    assert cache.lookup(QUERY) is None
+    assert cache.lookup(QUERY, normal)["result"]["output"] == "normal answer"
+
+    cache.store(QUERY, _result("deep answer"), deep)
+    assert cache.lookup(QUERY, deep)["result"]["output"] == "deep answer"
+    assert cache.lookup(QUERY, normal)["result"]["output"] == "normal answer"
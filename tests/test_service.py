@@ -0,0 +1,176 @@
+"""The job service end to end on one machine: server.py --fake with a local
+SQLite queue, worker processes and the fake LLM and search backends"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+from conftest import ROOT
+from services.job_client import JobServiceError, ResearchServiceClient
+
+QUERY = "What is the importance of Sri Lanka in global trade?"
+
+
+def _children(pid):
+    """Process ids whose parent is pid, read from /proc"""
+    children = []
+    for entry in os.listdir("/proc"):
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The ppid follows the parenthesised command name
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.fixture(scope="module")
+def service_url(tmp_path_factory):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    db = tmp_path_factory.mktemp("service") / "jobs.sqlite3"
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "--fake", "--workers", "1"]
+        + ["--port", str(port), "--db", str(db)],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f"{url}/health", timeout=1).close()
+                break
+            except OSError:
+                assert server.poll() is None, "server.py exited"
+                assert time.monotonic() < deadline, "server.py did not start"
+                time.sleep(0.2)
+        yield url
+    finally:
+        workers = _children(server.pid) if os.path.isdir("/proc") else []
+        # What docker stop or systemd sends
+        server.terminate()
+        server.wait(10)
+    assert server.returncode == 0
+    deadline = time.monotonic() + 5
+    while any(_alive(pid) for pid in workers) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not [pid for pid in workers if _alive(pid)], "workers outlived the server"
+
+
+def test_research_streams_and_returns_result(service_url):
+    client = ResearchServiceClient(service_url, tenant="acme", timeout=10)
+    steps = []
+    result = client.research(
+        QUERY,
+        on_tool_start=lambda name, tool_input: steps.append(name),
+    )
+
+    assert result["output"]
+    assert steps == [action.tool for action, _ in result["intermediate_steps"]]
+    assert steps == ["web_search", "wikipedia"]
+    assert client.get(result["job_id"])["status"] == "done"
+
+
+def test_jobs_are_private_to_their_tenant(service_url):
+    owner = ResearchServiceClient(service_url, tenant="acme")
+    job_id = owner.submit(QUERY, priority="batch")
+    with pytest.raises(JobServiceError, match="404"):
+        ResearchServiceClient(service_url, tenant="other").get(job_id)
+    assert owner.get(job_id)["tenant"] == "acme"
+
+
+def test_bad_requests_are_rejected(service_url):
+    client = ResearchServiceClient(service_url, tenant="acme")
+    with pytest.raises(JobServiceError, match="400: priority"):
+        client.submit(QUERY, priority="urgent")
+    with pytest.raises(JobServiceError, match="400: query"):
+        client.submit("  ")
+
+    job_id = client.submit(QUERY)
+    with pytest.raises(JobServiceError, match="400: after must be an event id"):
+        list(client.events(job_id, after="abc"))
+
+
+class ReplayClient(ResearchServiceClient):
+    """Client fed a fixed event stream instead of a server"""
+
+    def __init__(self, events, steps):
+        super().__init__("http://unused")
+        self._events = events
+        self._steps = steps
+
+    def submit(self, query, priority="interactive", **settings):
+        return "job"
+
+    def events(self, job_id, after=0):
+        for seq, (event_type, data) in enumerate(self._events, 1):
+            yield seq, event_type, data
+
+    def get(self, job_id):
+        return {"status": "done", "output": "answer", "steps": self._steps}
+
+
+def _events(*steps):
+    events = []
+    for tool, tool_input in steps:
+        events.append(("tool_start", {"tool": tool, "tool_input": tool_input}))
+        events.append(("tool_end", {"tool": tool, "output": f"{tool} output"}))
+    return events
+
+
+def test_requeued_job_does_not_repeat_shown_steps():
+    search, wiki, news = ("web_search", "q"), ("wikipedia", "q"), ("web_search", "n")
+    events = (
+        _events(search, wiki)
+        + [("requeued", {})]
+        + _events(search, wiki, news)
+        + [("done", {"output": "answer"})]
+    )
+    client = ReplayClient(events, steps=[])
+    started, ended = [], []
+    client.research(
+        QUERY,
+        on_tool_start=lambda *step: started.append(step),
+        on_tool_end=lambda name, output: ended.append(name),
+    )
+    assert started == [search, wiki, news]
+    assert ended == ["web_search", "wikipedia", "web_search"]
+
+
+def test_requeued_job_that_diverges_shows_new_steps():
+    search, wiki = ("web_search", "q"), ("wikipedia", "q")
+    events = _events(search) + [("requeued", {})] + _events(wiki, search)
+    client = ReplayClient(events + [("done", {})], steps=[])
+    started = []
+    client.research(QUERY, on_tool_start=lambda *step: started.append(step))
+    assert started == [search, wiki, search]
+
+
+def test_stats_only_cover_the_callers_jobs(service_url):
+    ResearchServiceClient(service_url, tenant="stats-a").submit(QUERY, priority="batch")
+    ResearchServiceClient(service_url, tenant="stats-b").submit(QUERY, priority="batch")
+    request = urllib.request.Request(
+        f"{service_url}/stats", headers={"X-Tenant": "stats-a"}
+    )
+    with urllib.request.urlopen(request) as response:
+        assert list(json.load(response)) == ["stats-a"]
@@ -0,0 +1,96 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.metrics import registry
+from services.singleflight import SingleFlight
+
+
+def _wait_for_followers(name, count):
+    deadline = time.monotonic() + 5
+    while registry.counters[f"research_{name}_coalesced"] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test_shared")
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flight.do, "key", work) for _ in range(4)]
+        _wait_for_followers("test_shared", 3)
+        assert flight.in_flight("key")
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert {result for result, _ in results} == {"result"}
+    assert not flight.in_flight("key")
+
+
+def test_followers_receive_the_leaders_error():
+    flight = SingleFlight("test_error")
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("backend down")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "key", fail)
+        started.wait(5)
+        follower = pool.submit(flight.do, "key", lambda: "never run")
+        _wait_for_followers("test_error", 1)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match="backend down"):
+                future.result()
+
+    # The failed call is not remembered
+    assert flight.do("key", lambda: "retried") == ("retried", False)
+
+
+def test_different_keys_run_independently():
+    flight = SingleFlight("test")
+    assert flight.do("a", lambda: 1) == (1, False)
+    assert flight.do("b", lambda: 2) == (2, False)
+    # Sequential calls are not coalesced
+    assert flight.do("a", lambda: 3) == (3, False)
+
+
+def test_followers_rerun_work_when_leader_is_interrupted():
+    from streamlit.runtime.scriptrunner_utils.exceptions import StopException
+
+    flight = SingleFlight("test_interrupt")
+    started = threading.Event()
+    release = threading.Event()
+
+    def interrupted():
+        started.set()
+        release.wait(5)
+        # What Streamlit raises in a session whose user pressed Stop
+        raise StopException()
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "key", interrupted)
+        started.wait(5)
+        follower = pool.submit(flight.do, "key", lambda: "own result")
+        _wait_for_followers("test_interrupt", 1)
+        release.set()
+        with pytest.raises(StopException):
+            leader.result()
+        # The follower does the work itself instead of stopping too
+        assert follower.result() == ("own result", False)
+    assert not flight.in_flight("key")
@@ -0,0 +1,122 @@
+import gc
+import os
+
+import pytest
+
+from services import spill as spill_module
+from services.spill import SessionMemory, SpilledText, SpillStore, estimate_size
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(spill_module.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SpillStore(str(tmp_path), threshold=100, max_bytes=1000, max_age=60)
+    yield store
+    store.clear()
+
+
+def test_only_large_texts_are_spilled(store):
+    assert store.spill("short") == "short"
+    text = "x" * 500
+    handle = store.spill(text)
+    assert isinstance(handle, SpilledText)
+    assert handle.read() == text
+    assert str(handle) == text[: spill_module.PREVIEW_CHARS]
+    # The same text shares one file
+    assert store.spill(text).path == handle.path
+    assert store.stats()["files"] == 1
+    assert store.stats()["disk_bytes"] == 500
+
+
+def test_oldest_files_are_swept_over_the_size_limit(store, clock):
+    handles = []
+    for letter in "abc":
+        handles.append(store.spill(letter * 400))
+        clock.now += 1
+    # 1200 bytes: the oldest file goes
+    assert not os.path.exists(handles[0].path)
+    assert handles[0].read() == handles[0].preview
+    assert [os.path.exists(h.path) for h in handles[1:]] == [True, True]
+    assert store.stats()["disk_bytes"] == 800
+    assert store.stats()["swept"] == 1
+
+    # Spilling a text again makes it the most recent
+    store.spill("b" * 400)
+    store.spill("d" * 400)
+    assert not os.path.exists(handles[2].path)
+    assert os.path.exists(handles[1].path)
+
+
+def test_files_are_swept_by_age(store, clock):
+    old = store.spill("a" * 200)
+    clock.now += 61
+    new = store.spill("b" * 200)
+    assert not os.path.exists(old.path)
+    assert os.path.exists(new.path)
+
+    # The file just spilled is kept even when it alone is over the limit
+    huge = store.spill("c" * 5000)
+    assert os.path.exists(huge.path)
+    assert store.stats()["files"] == 1
+
+
+def test_session_memory_evicts_least_recently_used_across_sessions():
+    value = "x" * 1000
+    size = estimate_size(value)
+    memory = SessionMemory(budget=3 * size)
+    memory.put("a", "first", value)
+    memory.put("b", "first", value)
+    memory.put("a", "second", value)
+    assert memory.get("a", "first") == value
+
+    memory.put("c", "first", value)
+    assert memory.get("b", "first") is None
+    assert memory.stats() == {
+        "sessions": 2,
+        "entries": 3,
+        "bytes": 3 * size,
+        "budget": 3 * size,
+        "evictions": 1,
+    }
+    assert memory.usage("a") == 2 * size
+
+    # Replacing a value charges only the new size
+    memory.put("a", "first", "small")
+    assert memory.usage("a") == size + estimate_size("small")
+
+
+def test_a_value_larger_than_the_budget_is_kept_alone():
+    memory = SessionMemory(budget=100)
+    memory.put("a", "small", "x")
+    memory.put("b", "huge", "x" * 1000)
+    assert memory.get("b", "huge") == "x" * 1000
+    assert memory.get("a", "small") is None
+    assert memory.stats()["entries"] == 1
+
+
+def test_session_values_go_with_the_session_handle():
+    memory = SessionMemory()
+    handle = memory.handle("a")
+    memory.put("a", "last_result", "x" * 100)
+    memory.put("b", "last_result", "y" * 100)
+
+    del handle
+    gc.collect()
+    assert memory.get("a", "last_result") is None
+    assert memory.usage("a") == 0
+    assert memory.get("b", "last_result") == "y" * 100
+    assert memory.total == memory.usage("b")
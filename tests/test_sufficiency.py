@@ -0,0 +1,133 @@
+import pytest
+from langchain_core.agents import AgentAction
+
+import tools
+from agent import build_agent_executor
+from benchmarks.fakes import FakeChatModel, FakeDDGS, FakeWikipediaClient
+from services import sufficiency
+from services.metrics import track_run
+from services.sufficiency import SufficiencyAgent, information_gains, is_repeat
+
+
+def _step(tool, tool_input, observation):
+    return AgentAction(tool, tool_input, ""), observation
+
+
+@pytest.fixture
+def fake_backends(monkeypatch):
+    monkeypatch.setattr(tools, "ddgs_factory", lambda: FakeDDGS())
+    monkeypatch.setattr(tools.api_wrapper, "wiki_client", FakeWikipediaClient())
+
+
+def _run(script, max_iterations=10):
+    executor = build_agent_executor(
+        "fake",
+        llm=FakeChatModel(script=script),
+        max_iterations=max_iterations,
+        verbose=False,
+    )
+    with track_run("sufficiency", export=False) as run:
+        result = executor.invoke(
+            {"input": "What does Sri Lanka export?"},
+            config={"callbacks": [run.handler]},
+        )
+    return result, run
+
+
+def test_low_gain_needs_patience_observations_in_a_row():
+    agent = SufficiencyAgent(runnable=FakeChatModel())
+    same = "Sri Lanka exports tea rubber and garments to Europe"
+    steps = [_step("web_search", f"query {i}", same) for i in range(3)]
+
+    assert information_gains(steps) == [1.0, 0.0, 0.0]
+    # The first observation is all new and never counts towards patience
+    assert agent.stop_reason(steps[:2], "q") is None
+    assert agent.stop_reason(steps, "q") == "low_gain"
+
+    steps.append(_step("wikipedia", "tea", "Ceylon tea is grown in the hill country"))
+    assert agent.stop_reason(steps, "q") is None
+
+
+def test_tool_calls_outside_research_do_not_count_for_gain():
+    steps = [
+        _step("web_search", "q", "Sri Lanka exports tea"),
+        _step("save_text_to_file", "notes", "Sri Lanka exports tea"),
+    ]
+    assert information_gains(steps) == [1.0]
+
+
+@pytest.mark.parametrize(
+    "earlier, planned, repeat",
+    [
+        (
+            ("web_search", "Sri Lanka exports"),
+            ("web_search", "sri lanka exports"),
+            True,
+        ),
+        (
+            ("web_search", "Sri Lanka main exports 2020"),
+            ("web_search", "Sri Lanka main exports"),
+            True,
+        ),
+        (
+            ("web_search", "Sri Lanka exports"),
+            ("web_search", "Sri Lanka imports"),
+            False,
+        ),
+        (
+            ("web_search", "Sri Lanka exports"),
+            ("wikipedia", "Sri Lanka exports"),
+            False,
+        ),
+        # combined_research already covered both backends
+        (
+            ("combined_research", "Sri Lanka exports"),
+            ("wikipedia", "Sri Lanka exports"),
+            True,
+        ),
+        (
+            ("save_text_to_file", "Sri Lanka exports"),
+            ("save_text_to_file", "Sri Lanka exports"),
+            False,
+        ),
+    ],
+)
+def test_is_repeat(earlier, planned, repeat):
+    steps = [_step(*earlier, "observation")]
+    assert is_repeat(AgentAction(*planned, ""), steps) is repeat
+
+
+def test_token_budget_counts_the_resent_scratchpad(monkeypatch):
+    agent = SufficiencyAgent(runnable=FakeChatModel(), prompt_tokens=100)
+    steps = [_step("web_search", f"query {i}", f"result {i} " * 50) for i in range(3)]
+    used = sufficiency.estimated_run_tokens(100 + 1, steps)
+    # Each call re-sends the prompt, so the total grows faster than the steps
+    assert used > 4 * 100 + sum(
+        sufficiency.estimate_tokens(str(obs)) for _, obs in steps
+    )
+
+    monkeypatch.setattr(sufficiency, "RESEARCH_TOKEN_BUDGET", used)
+    assert agent.stop_reason(steps, "q") is None
+    monkeypatch.setattr(sufficiency, "RESEARCH_TOKEN_BUDGET", used - 1)
+    assert agent.stop_reason(steps, "q") == "token_budget"
+
+
+def test_repeated_search_ends_in_a_final_answer(fake_backends):
+    result, run = _run([("web_search", "{query}"), ("web_search", "{query}")])
+
+    assert [action.tool for action, _ in result["intermediate_steps"]] == ["web_search"]
+    assert result["output"].startswith("answer")
+    # Two planning calls and the final answer, all reported to the run
+    assert run.to_dict()["llm_calls"] == 3
+
+
+def test_iteration_limit_answer_reports_to_the_run_callbacks(fake_backends):
+    script = [("web_search", "{query} one"), ("wikipedia", "{query} two")]
+    result, run = _run(script, max_iterations=1)
+
+    assert len(result["intermediate_steps"]) == 1
+    assert result["output"].startswith("answer")
+    metrics = run.to_dict()
+    # One planning call and the forced final answer
+    assert metrics["llm_calls"] == 2
+    assert metrics["completion_tokens"] == 10 + FakeChatModel().answer_tokens
@@ -0,0 +1,100 @@
+import gzip
+import json
+
+import pytest
+
+import tools
+from services.wiki_index import (
+    LocalWikipediaClient,
+    PageError,
+    build_index,
+    main,
+    read_articles,
+)
+
+ARTICLES = [
+    {
+        "title": "Sri Lanka",
+        "text": "Sri Lanka is an island country in South Asia.\n\n"
+        "Its economy relies on tea, rubber and garment exports.\n\n"
+        "== History ==\n\nThe island was known as Ceylon.",
+        "url": "https://en.wikipedia.org/wiki/Sri_Lanka",
+    },
+    {
+        "title": "Tea",
+        "text": "Tea is an aromatic beverage. Tea tea tea is grown in "
+        "China, India and Sri Lanka.",
+        "url": "https://en.wikipedia.org/wiki/Tea",
+    },
+    {
+        "title": "Ada Lovelace",
+        "text": "Ada Lovelace was an English mathematician who wrote the first "
+        "published algorithm for a computing machine.",
+        "url": "https://en.wikipedia.org/wiki/Ada_Lovelace",
+    },
+]
+
+
+@pytest.fixture
+def client(tmp_path):
+    assert build_index(ARTICLES, str(tmp_path / "index")) == len(ARTICLES)
+    return LocalWikipediaClient(str(tmp_path / "index"))
+
+
+def test_search_ranks_by_bm25(client):
+    assert client.search("Sri Lanka economy")[0] == "Sri Lanka"
+    assert client.search("tea", results=2) == ["Tea", "Sri Lanka"]
+    assert client.search("mathematician algorithm") == ["Ada Lovelace"]
+    assert client.search("quantum chromodynamics") == []
+    assert client.search("tea", results=0) == []
+
+
+def test_page_lookup_by_exact_title(client):
+    page = client.page(title="Sri Lanka", auto_suggest=False)
+    assert page.url == "https://en.wikipedia.org/wiki/Sri_Lanka"
+    assert "Ceylon" in page.content
+    # The summary is the lead section, up to the first heading
+    assert page.summary == (
+        "Sri Lanka is an island country in South Asia.\n\n"
+        "Its economy relies on tea, rubber and garment exports."
+    )
+    with pytest.raises(PageError):
+        client.page(title="Sri lanka")
+
+
+def test_wikipedia_tool_reads_the_index(client, monkeypatch):
+    monkeypatch.setattr(tools.api_wrapper, "wiki_client", client)
+    result = tools.api_wrapper.run("Ada Lovelace mathematician")
+    assert result.startswith("Page: Ada Lovelace\nSummary: Ada Lovelace was")
+
+
+def test_build_from_jsonl_and_directories(tmp_path):
+    corpus = tmp_path / "corpus.jsonl.gz"
+    with gzip.open(corpus, "wt", encoding="utf-8") as f:
+        for article in ARTICLES:
+            f.write(json.dumps(article) + "\n")
+        # Malformed lines and records without text are skipped
+        f.write("{not json\n")
+        f.write(json.dumps({"title": "Empty", "text": ""}) + "\n")
+    assert [a["title"] for a in read_articles(str(corpus))] == [
+        a["title"] for a in ARTICLES
+    ]
+
+    pages = tmp_path / "pages" / "nested"
+    pages.mkdir(parents=True)
+    (pages / "Colombo.txt").write_text("Colombo is the largest city of Sri Lanka.")
+    (pages / "Kandy.md").write_text("Kandy is a city in the hill country.")
+    assert main(["build", str(tmp_path / "pages"), "-o", str(tmp_path / "idx")]) == 0
+
+    client = LocalWikipediaClient(str(tmp_path / "idx"))
+    assert client.documents == 2
+    assert client.search("largest city") == ["Colombo", "Kandy"]
+    assert client.page(title="Kandy").content.startswith("Kandy is")
+
+
+def test_empty_corpus(tmp_path):
+    assert build_index([], str(tmp_path / "index")) == 0
+    client = LocalWikipediaClient(str(tmp_path / "index"))
+    assert client.search("anything") == []
+    with pytest.raises(PageError):
+        client.page(title="Anything")
@@ -1,84 +1,289 @@
 from langchain_community.tools import WikipediaQueryRun
 from langchain_community.utilities import WikipediaAPIWrapper
 from langchain.tools import Tool
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import contextvars
 import os
+import re
+import threading
+import time
+from services.cache import normalize_query, tool_cache
+from services.hedging import Backend, hedged_call
+from services.metrics import current_run, record
+from services.output_store import get_store
+from services.prefetch import claim
+from services.rate_limit import call_with_backoff, get_bucket
 
 
 def save_to_txt(data: str, filename: str = "research_output.txt") -> str:
-    """Save research data to a text file with timestamp"""
+    """Queue research data to be appended to a text file with timestamp"""
     try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_text = f"--- Research Output ---\nTimestamp: {timestamp}\n\n{data}\n\n{'=' * 50}\n\n"
+        run = current_run()
+        get_store(filename).append(data, query=run.query if run else "")
+        return f"✓ Data saved to {filename}"
+    except Exception as e:
+        return f"✗ Error saving to file: {str(e)}"
 
-        os.makedirs(
-            os.path.dirname(filename) if os.path.dirname(filename) else ".",
-            exist_ok=True,
-        )
 
-        with open(filename, "a", encoding="utf-8") as f:
-            f.write(formatted_text)
+def _new_ddgs():
+    from duckduckgo_search import DDGS
 
-        return f"✓ Data successfully saved to {filename}"
-    except Exception as e:
-        return f"✗ Error saving to file: {str(e)}"
+    return DDGS()
 
 
-save_tool = Tool(
-    name="save_text_to_file",
-    func=save_to_txt,
-    description="Saves structured research data to a text file. Input should be the text content to save.",
-)
+# Creates DuckDuckGo clients; the benchmark harness swaps in a local fake
+ddgs_factory = _new_ddgs
 
+_ddgs_clients = threading.local()
 
-def safe_search(query: str) -> str:
-    """Wrapper for DuckDuckGo search with error handling"""
+
+def _ddgs_client():
+    """Return this thread's DDGS client, keeping its HTTP connection alive between searches"""
+    if getattr(_ddgs_clients, "client", None) is None:
+        _ddgs_clients.client = ddgs_factory()
+    return _ddgs_clients.client
+
+
+def _ddgs_search(query: str) -> str:
+    """Run a DuckDuckGo text search and format the top results"""
     try:
-        from duckduckgo_search import DDGS
+        results = list(_ddgs_client().text(query, max_results=5))
+    except Exception:
+        # Start the next search on a fresh connection
+        _ddgs_clients.client = None
+        raise
+
+    if not results:
+        return f"No search results found for: {query}"
+
+    formatted_results = []
+    for i, result in enumerate(results, 1):
+        title = result.get("title", "No title")
+        body = result.get("body", "No description")
+        link = result.get("href", "No link")
+        formatted_results.append(f"{i}. {title}\n{body}\nSource: {link}\n")
+
+    return "\n".join(formatted_results)
+
+
+def _web_search(query: str) -> str:
+    claim("web_search", query)
+    return tool_cache.get_or_compute(
+        "web_search", query, lambda: call_with_backoff("ddgs", _ddgs_search, query)
+    )
+
 
-        # Use DDGS 
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, max_results=5))
+def _fill_cache(tool: str, key: str, backend: str, fetch, query: str) -> bool:
+    """Cache a search result ahead of time, only if the backend has a token free now.
 
-            if not results:
-                return f"No search results found for: {query}"
+    Used by speculative prefetches, which must never queue behind the rate
+    limit ahead of the agent's own searches, nor use its last token. Cached and in-flight searches
+    are skipped. Returns whether a fetch was made.
+    """
+    if tool_cache.contains(tool, key) or tool_cache.in_flight(tool, key):
+        return False
+    # Leave a token for the agent's next search
+    if not get_bucket(backend).try_acquire(reserve=1):
+        record("prefetch_skipped")
+        return False
+    tool_cache.get_or_compute(
+        tool, key, lambda: call_with_backoff(backend, fetch, query, acquired=True)
+    )
+    return True
 
-           
-            formatted_results = []
-            for i, result in enumerate(results, 1):
-                title = result.get("title", "No title")
-                body = result.get("body", "No description")
-                link = result.get("href", "No link")
-                formatted_results.append(f"{i}. {title}\n{body}\nSource: {link}\n")
 
-            return "\n".join(formatted_results)
+def prefetch_web_search(query: str) -> bool:
+    return _fill_cache("web_search", query, "ddgs", _ddgs_search, query)
+
+
+def _wikipedia_search(query: str) -> str:
+    return f"Web search failed or was slow, using Wikipedia instead:\n\n{get_tool('wikipedia').run(query)}"
+
+
+# Seconds DuckDuckGo may take before Wikipedia is queried as well, and the
+# overall limit for a web_search call
+SEARCH_HEDGE_AFTER = float(os.getenv("SEARCH_HEDGE_AFTER", "2.0"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "10.0"))
+
+SEARCH_BACKENDS = [
+    Backend("ddgs", _web_search, lambda r: not r.startswith("No search results")),
+    Backend(
+        "wikipedia",
+        _wikipedia_search,
+        lambda r: "No good Wikipedia Search Result" not in r,
+    ),
+]
+
+
+def safe_search(query: str) -> str:
+    """DuckDuckGo search hedged with Wikipedia when it is slow, failing or empty"""
+    try:
+        _, result = hedged_call(
+            SEARCH_BACKENDS,
+            query,
+            hedge_after=SEARCH_HEDGE_AFTER,
+            timeout=SEARCH_TIMEOUT,
+        )
+        return result
     except Exception as e:
-        # If DuckDuckGo fails, try Wikipedia as backup
+        return f"Search error: {str(e)}. Please try rephrasing your query or check your internet connection."
+
+
+class CachedWikipediaAPIWrapper(WikipediaAPIWrapper):
+    """Wikipedia wrapper that serves repeated queries from the shared tool cache"""
+
+    def _cache_key(self, query: str) -> str:
+        # Different result sizes must not share cache entries
+        return f"{normalize_query(query)}|{self.top_k_results}|{self.doc_content_chars_max}"
+
+    def run(self, query: str) -> str:
+        if getattr(self.wiki_client, "local", False):
+            # A local index answers faster than the cache and has no rate limit
+            return super().run(query)
+        claim("wikipedia", query)
+        fetch = super(CachedWikipediaAPIWrapper, self).run
+        return tool_cache.get_or_compute(
+            "wikipedia",
+            self._cache_key(query),
+            lambda: call_with_backoff("wikipedia", fetch, query),
+        )
+
+    def prefetch(self, query: str) -> bool:
+        fetch = super(CachedWikipediaAPIWrapper, self).run
+        return _fill_cache("wikipedia", self._cache_key(query), "wikipedia", fetch, query)
+
+
+def _share_wikipedia_session():
+    """Route the wikipedia package's requests.get calls through one pooled Session"""
+    import requests
+    import wikipedia.wikipedia as wikipedia_module
+
+    session = requests.Session()
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=16))
+    wikipedia_module.requests = session
+
+
+# Seconds each backend may take before combined_research gives up on it
+RESEARCH_TIMEOUTS = {"Web Search": 10.0, "Wikipedia": 10.0}
+
+_research_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="research")
+
+
+def _split_passages(text: str) -> list:
+    return [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+
+def _passage_key(passage: str) -> str:
+    """Fingerprint a passage by its leading words, ignoring numbering and case"""
+    passage = re.sub(r"^\d+\.\s*", "", passage)
+    words = re.findall(r"\w+", passage.lower())
+    return " ".join(words[:30])
+
+
+def combined_research(query: str) -> str:
+    """Query web search and Wikipedia concurrently and merge their results"""
+    backends = {"Web Search": safe_search, "Wikipedia": get_tool("wikipedia").run}
+    started = time.monotonic()
+    # Copy the context so metrics recorded by the backends reach the current run
+    futures = {
+        name: _research_pool.submit(contextvars.copy_context().run, func, query)
+        for name, func in backends.items()
+    }
+
+    seen = set()
+    sections = []
+    for name, future in futures.items():
+        remaining = RESEARCH_TIMEOUTS[name] - (time.monotonic() - started)
         try:
-            wiki_wrapper = WikipediaAPIWrapper(
-                top_k_results=2, doc_content_chars_max=1000
-            )
-            wiki_tool_backup = WikipediaQueryRun(api_wrapper=wiki_wrapper)
-            return f"Web search failed, using Wikipedia instead:\n\n{wiki_tool_backup.run(query)}"
-        except:  # noqa: E722
-            return f"Search error: {str(e)}. Please try rephrasing your query or check your internet connection."
-
-
-search_tool = Tool(
-    name="web_search",
-    func=safe_search,
-    description="Search the web for current information. Input should be a search query string. Use this for recent events, statistics, cities, countries, and up-to-date information.",
-)
-
-# Create Wikipedia tool
-api_wrapper = WikipediaAPIWrapper(
-    top_k_results=3, doc_content_chars_max=2000, load_all_available_meta=False
-)
-wiki_tool = WikipediaQueryRun(
-    api_wrapper=api_wrapper,
-    name="wikipedia",
-    description="Search Wikipedia for encyclopedic information. Input should be a search query string. Use this for historical facts, scientific concepts, geography, and general knowledge about cities, countries, and places.",
-)
-
-
-all_tools = [search_tool, wiki_tool, save_tool]
+            text = future.result(timeout=max(remaining, 0))
+        except FutureTimeout:
+            sections.append(f"## {name}\n{name} timed out, no results.")
+            continue
+        except Exception as e:
+            sections.append(f"## {name}\n{name} failed: {str(e)}")
+            continue
+
+        passages = []
+        for passage in _split_passages(text):
+            key = _passage_key(passage)
+            if key and key not in seen:
+                seen.add(key)
+                passages.append(passage)
+        if passages:
+            sections.append(f"## {name}\n" + "\n\n".join(passages))
+
+    if not sections:
+        return f"No results found for: {query}"
+    return "\n\n".join(sections)
+
+
+# Directory of an index built with `python -m services.wiki_index build`; when
+# set, the wikipedia tool reads from it instead of the Wikipedia API
+WIKIPEDIA_INDEX_PATH = os.getenv("WIKIPEDIA_INDEX_PATH", "")
+
+
+def _build_wiki_tool():
+    api_wrapper = CachedWikipediaAPIWrapper(
+        top_k_results=3, doc_content_chars_max=2000, load_all_available_meta=False
+    )
+    if WIKIPEDIA_INDEX_PATH:
+        from services.wiki_index import LocalWikipediaClient
+
+        api_wrapper.wiki_client = LocalWikipediaClient(WIKIPEDIA_INDEX_PATH)
+    else:
+        _share_wikipedia_session()
+    return WikipediaQueryRun(
+        api_wrapper=api_wrapper,
+        name="wikipedia",
+        description="Search Wikipedia for encyclopedic information. Input should be a search query string. Use this for historical facts, scientific concepts, geography, and general knowledge about cities, countries, and places.",
+    )
+
+
+# Tools are built on first use rather than at import time
+TOOL_BUILDERS = {
+    "combined_research": lambda: Tool(
+        name="combined_research",
+        func=combined_research,
+        description="Search the web and Wikipedia at the same time and return the merged, de-duplicated results. Input should be a search query string. Prefer this when you need both current and encyclopedic information.",
+    ),
+    "web_search": lambda: Tool(
+        name="web_search",
+        func=safe_search,
+        description="Search the web for current information. Input should be a search query string. Use this for recent events, statistics, cities, countries, and up-to-date information.",
+    ),
+    "wikipedia": _build_wiki_tool,
+    "save_text_to_file": lambda: Tool(
+        name="save_text_to_file",
+        func=save_to_txt,
+        description="Saves structured research data to a text file. Input should be the text content to save.",
+    ),
+}
+
+# Module attributes kept for existing imports such as `from tools import wiki_tool`
+_TOOL_ALIASES = {
+    "research_tool": "combined_research",
+    "search_tool": "web_search",
+    "wiki_tool": "wikipedia",
+    "save_tool": "save_text_to_file",
+}
+
+_tools = {}
+_tools_lock = threading.Lock()
+
+
+def get_tool(name: str):
+    """Return the shared instance of a tool, building it on first use"""
+    with _tools_lock:
+        if name not in _tools:
+            _tools[name] = TOOL_BUILDERS[name]()
+        return _tools[name]
+
+
+def __getattr__(name):
+    if name in _TOOL_ALIASES:
+        return get_tool(_TOOL_ALIASES[name])
+    if name == "all_tools":
+        return [get_tool(tool_name) for tool_name in TOOL_BUILDERS]
+    if name == "api_wrapper":
+        return get_tool("wikipedia").api_wrapper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")